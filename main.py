@@ -1,19 +1,18 @@
 import asyncio
 import json
+import math
 import os
 import random
 import re
 import time
 #from datetime import datetime
 from datetime import datetime, timedelta
+from typing import Hashable
 
 import astrbot.api.message_components as Comp
 from astrbot.api import AstrBotConfig, logger
 from astrbot.api.event import AstrMessageEvent, filter
 from astrbot.api.star import Context, Star
-from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
-    AiocqhttpMessageEvent,
-)
 from astrbot.core.star.filter.permission import PermissionTypeFilter
 from astrbot.core.star.star_handler import star_handlers_registry
 from astrbot.core.utils.astrbot_path import get_astrbot_plugin_data_path
@@ -24,16 +23,29 @@ from .waifu_relations import maybe_add_other_half_record
 
 from .src.constants import _DEFAULT_KEYWORD_ROUTES
 from .src.utils import (
-    load_json, 
-    save_json, 
     normalize_user_id_set, 
     extract_target_id_from_message,
     is_mentioning_self,
     is_allowed_group,           # 新增
-    resolve_member_name,        # 新增
 )
 
+from .src.activity_stats import GroupActivity, activity_report
+from .src.archive import DrawArchive
+from .src.record_store import FLAG_BATCH, FLAG_FORCED, ActivityTable, GroupRecords, WifeRecord
+from .src.sampling import WeightedPool
+from .src.storage import DailyRecords, ShardedStore
+from .src.render_queue import CircuitBreaker, RenderScheduler
+from .src.dedup import EventDeduper
+from .src.http_api import StatsServer
+from .src.recorder import EventRecorder
 from .src.debug_utils import run_debug_graph
+from .src.metrics import metrics
+from .src.profiling import (
+    MAX_PROFILE_SECONDS,
+    MIN_PROFILE_SECONDS,
+    ProfileBusyError,
+    run_profile,
+)
 # 新增：导入 core helpers
 from .src.core import (
     send_onebot_message,
@@ -49,7 +61,49 @@ from .src.core import (
     auto_withdraw_delay_seconds,
     can_onebot_withdraw,
     cleanup_inactive,
+    call_onebot_action,
+    group_member_names,
+    scope_member_names,
+    pick_wife,
+    recent_wives,
+    remember_wife,
+    render_html,
+    render_image,
+    record_event,
+    http_api_port,
+    rbq_counts,
+    is_duplicate_event,
+    guarded_render,
+    send_late_image,
+    render_late_image_enabled,
+    graph_fallback_text,
+    graph_render_args,
+    ranking_fallback_text,
+    collect_state_metrics,
+    metrics_export_loop,
+    iter_group_history,
+    current_date,
+    current_day,
+    ACTIVE_WINDOW_SECONDS,
 )
+from .src.federation import group_key, merge_federation_state, scope_key
+from .src.transfer import TransferOptions, import_file, iter_export_rows, write_export
+from .src.matching import random_assignment, random_derangement
+from .src.maintenance import flush_state, maintenance_loop, state_flush_loop
+from .src.digest import digest_enabled, digest_loop, load_digest_origins, remember_origin
+from .src.rate_limit import build_rate_limiters, check_rate_limit
+from .src.deterministic import (
+    canonical_order,
+    deterministic_pick,
+    draw_secret,
+    recompute_draws,
+    seeded_rng,
+)
+
+# 全员分配结果超过这么多行时转成图片发送
+BATCH_DRAW_TEXT_LINES = 30
+# 全员分配时遇到最近抽到过的人，最多重抽的次数
+BATCH_NO_REPEAT_RETRIES = 8
 
 class RandomWifePlugin(Star):
     def __init__(self, context: Context, config: AstrBotConfig = None):
@@ -59,21 +113,97 @@ class RandomWifePlugin(Star):
         self.curr_dir = os.path.dirname(__file__)
 
         self._withdraw_tasks: set[asyncio.Task] = set()
+        self._background_tasks: set[asyncio.Task] = set()
+        self._profiling = False
+        # 下一次换日时刻（时间戳），由维护任务更新；热路径只做一次比较
+        self._next_rollover_ts = 0.0
+        self._next_maintenance_ts = 0.0
         
         # 数据存储相对路径
         self.data_dir = os.path.join(get_astrbot_plugin_data_path(), "random_wife")
+        # 旧版单文件数据，仅用于首次启动时迁移为按群分片
         self.records_file = os.path.join(self.data_dir, "wife_records.json")
         self.active_file = os.path.join(self.data_dir, "active_users.json") 
         self.forced_file = os.path.join(self.data_dir, "forced_marriage.json")
         self.rbq_stats_file = os.path.join(self.data_dir, "rbq_stats.json")
+        self.state_dir = os.path.join(self.data_dir, "state")
+        self.archive = DrawArchive(os.path.join(self.data_dir, "archive"))
         
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir, exist_ok=True)
-            
-        self.records = load_json(self.records_file, {"date": "", "groups": {}})
-        self.active_users = load_json(self.active_file, {})
-        self.forced_records = load_json(self.forced_file, {})
-        self.rbq_stats = load_json(self.rbq_stats_file, {})
+
+        # 每个群一个分片，首次访问时才加载，只重写有改动的群
+        compress = bool(self.config.get("state_compress", False))
+        self.records = DailyRecords(
+            os.path.join(self.state_dir, "wife_records"),
+            os.path.join(self.state_dir, "wife_records_meta.json"),
+            compress=compress,
+        )
+        self.active_users = ShardedStore(
+            os.path.join(self.state_dir, "active_users"),
+            compress=compress,
+            decode=ActivityTable.from_dict,
+            encode=ActivityTable.to_dict,
+        )
+        self.forced_records = ShardedStore(
+            os.path.join(self.state_dir, "forced_marriage"), compress=compress
+        )
+        self.rbq_stats = ShardedStore(
+            os.path.join(self.state_dir, "rbq_stats"), compress=compress
+        )
+        # 活跃窗口内的发言次数，用于按活跃度加权抽取
+        self.message_counts = ShardedStore(
+            os.path.join(self.state_dir, "message_counts"), compress=compress
+        )
+        # 每人最近抽到的老婆（环形，{gid: {uid: [[日期序号, 老婆id], ...]}}），用于不重复抽取
+        self.recent_wives = ShardedStore(
+            os.path.join(self.state_dir, "recent_wives"), compress=compress
+        )
+        # 群活跃度：每群固定大小的按小时计数环 + 每天的去重发言人数估计
+        self.activity_stats = ShardedStore(
+            os.path.join(self.state_dir, "activity_stats"),
+            compress=compress,
+            decode=GroupActivity.from_dict,
+            encode=GroupActivity.to_dict,
+        )
+        # 各群的加权抽样池（仅内存），第一次加权抽取时构建
+        self._draw_pools: dict[str, WeightedPool] = {}
+        # 接入的机器人账号（收到事件时登记），自动从老婆池 / 强娶目标中排除
+        self._bot_ids: set[str] = set()
+        # 群成员缓存：{群号: (过期时刻, {QQ号: 名字})}，联盟合集也放在这里
+        self._member_cache: dict[str, tuple] = {}
+        # 事件去重：同一条消息在同一处理路径上只处理一次
+        self._event_dedup = EventDeduper(self.config.get("event_dedup_seconds", 120))
+        # 各记录范围最近一次渲染的关系图路径（仅内存），由本地 HTTP 接口提供
+        self._graph_images: dict[str, str] = {}
+        # 每日日报的发送目标：{记录范围: {群号: (会话标识, 协议端)}}，会话标识落盘
+        self.digest_origins_file = os.path.join(self.data_dir, "digest_origins.json")
+        self._digest_origins = load_digest_origins(self)
+        self._http_api: StatsServer | None = None
+        # 匿名事件录制（用于回放压测，见 tools/replay.py），默认关闭
+        self._event_recorder = (
+            EventRecorder(os.path.join(self.data_dir, "recordings"))
+            if self.config.get("event_record_enabled", False)
+            else None
+        )
+        # 各模板最终输出的每像素字节数估计（仅内存），用于选择缩放档位
+        self._render_bytes_per_pixel: dict[str, float] = {}
+        # 全局渲染并发上限 + 相同请求合并（关系图 / rbq 排行等）
+        self.render_scheduler = RenderScheduler(
+            self.config.get("render_max_concurrency", 2)
+        )
+        # 每人 / 每群的指令令牌桶（仅内存），防止刷屏挤占渲染
+        self._rate_limiters = build_rate_limiters(self)
+        # 连续渲染失败 / 超时后暂停渲染一段时间，期间直接回复文字版
+        self.render_breaker = CircuitBreaker(
+            self.config.get("render_breaker_failures", 3),
+            self.config.get("render_breaker_cooldown_seconds", 60),
+        )
+        self.records.migrate_from(self.records_file)
+        self.active_users.migrate_from(self.active_file)
+        self.forced_records.migrate_from(self.forced_file)
+        self.rbq_stats.migrate_from(self.rbq_stats_file)
+        merge_federation_state(self)
 
         self._keyword_router = KeywordRouter(routes=_DEFAULT_KEYWORD_ROUTES)
         self._keyword_handlers = {
@@ -81,24 +211,98 @@ class RandomWifePlugin(Star):
             "show_history": self._cmd_show_history,
             "force_marry": self._cmd_force_marry,
             "show_graph": self._cmd_show_graph,
-            "rbq_ranking": self.rbq_ranking,
+            "graph_stats": self._cmd_graph_stats,
+            "rbq_ranking": self._cmd_rbq_ranking,
             "show_help": self._cmd_show_help,
+            "monthly_wife": self._cmd_monthly_wife,
+            "group_monthly": self._cmd_group_monthly,
             "reset_records": self._cmd_reset_records,
             "reset_force_cd": self._cmd_reset_force_cd,
+            "batch_draw": self._cmd_batch_draw,
+            "group_activity": self._cmd_group_activity,
+            "verify_draws": self._cmd_verify_draws,
         }
         self._keyword_action_to_command_handler = {
             "draw_wife": "draw_wife",
             "show_history": "show_history",
             "force_marry": "force_marry",
             "show_graph": "show_graph",
+            "graph_stats": "graph_stats",
             "rbq_ranking": "rbq_ranking",
             "show_help": "show_help",
+            "monthly_wife": "monthly_wife",
+            "group_monthly": "group_monthly",
             "reset_records": "reset_records",
             "reset_force_cd": "reset_force_cd",
+            "batch_draw": "batch_draw",
+            "group_activity": "group_activity",
+            "verify_draws": "verify_draws",
         }
         self._keyword_trigger_block_prefixes = ("/", "!", "！")
+
+        # 指标采集：仪表盘只在导出/查看时计算
+        self._metrics_collector = lambda registry: collect_state_metrics(self, registry)
+        metrics.add_collector(self._metrics_collector)
         logger.info(f"抽老婆插件已加载。数据目录: {self.data_dir}")
 
+    async def initialize(self):
+        self._start_background_task(metrics_export_loop(self))
+        self._start_background_task(maintenance_loop(self))
+        self._start_background_task(state_flush_loop(self))
+        if digest_enabled(self):
+            self._start_background_task(digest_loop(self))
+        port = http_api_port(self)
+        if port:
+            self._http_api = StatsServer(
+                self, str(self.config.get("http_api_host", "127.0.0.1")), port
+            )
+            await self._http_api.start()
+
+    def _state_stores(self) -> dict:
+        return {
+            "wife_records": self.records.groups,
+            "active_users": self.active_users,
+            "forced_marriage": self.forced_records,
+            "rbq_stats": self.rbq_stats,
+            "message_counts": self.message_counts,
+            "recent_wives": self.recent_wives,
+            "activity_stats": self.activity_stats,
+        }
+
+    def _start_background_task(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _run_action(self, action: str, event: AstrMessageEvent):
+        """所有指令（含关键词触发）的统一入口，负责去重和按指令统计耗时。"""
+        # 同一条消息可能同时命中关键词和 @filter.command，协议端重连也会重投事件
+        if self._is_duplicate_event(event):
+            return
+        wait = check_rate_limit(self, action, event)
+        if wait:
+            yield self._rate_limited_result(action, event, wait)
+            return
+        if digest_enabled(self):
+            remember_origin(self, event)
+        handler = self._keyword_handlers[action]
+        async for result in metrics.timed_iter(
+            "command_seconds", handler(event), command=action
+        ):
+            yield result
+
+    def _rate_limited_result(self, action: str, event: AstrMessageEvent, wait: float):
+        """被限流时的回复：关系图有最近渲染的图片就直接发那张，否则提示稍后再试。"""
+        if action == "show_graph":
+            scope = scope_key(self, str(event.get_group_id()), str(event.get_self_id()))
+            path = self._graph_images.get(scope)
+            if path and os.path.exists(path):
+                return event.image_result(path)
+        return event.plain_result(f"操作太频繁啦，请 {math.ceil(wait)} 秒后再试~")
+
+    def _is_duplicate_event(self, event: AstrMessageEvent, path: str = "command") -> bool:
+        return is_duplicate_event(self, event, path)
+
     def _get_keyword_trigger_mode(self) -> MatchMode:
         """从配置中获取匹配模式，默认为包含匹配"""
         # 这里的 config.get 会读取插件配置，建议在控制面板设置里加上这个 key
@@ -120,7 +324,7 @@ class RandomWifePlugin(Star):
     def _ensure_today_records(self) -> None:
         return ensure_today_records(self)
 
-    def _get_group_records(self, group_id: str) -> list[dict]:
+    def _get_group_records(self, group_id: str) -> GroupRecords:
         return get_group_records(self, group_id)
 
     def _auto_set_other_half_enabled(self) -> bool:
@@ -135,6 +339,29 @@ class RandomWifePlugin(Star):
     def _can_onebot_withdraw(self, event: AstrMessageEvent) -> bool:
         return can_onebot_withdraw(self, event)
 
+    async def _html_render(
+        self,
+        name: str,
+        tmpl: str,
+        data: dict,
+        options: dict | None = None,
+        *,
+        key: Hashable | None = None,
+    ) -> str:
+        return await render_html(self, name, tmpl, data, options=options, key=key)
+
+    async def _render_image(
+        self,
+        name: str,
+        tmpl: str,
+        data: dict,
+        *,
+        width: int,
+        height: int,
+        key: Hashable | None = None,
+    ) -> str:
+        return await render_image(self, name, tmpl, data, width=width, height=height, key=key)
+
     async def _send_onebot_message(
         self, event: AstrMessageEvent, *, message: list[dict]
     ) -> object:
@@ -177,14 +404,16 @@ class RandomWifePlugin(Star):
         # 兼容模式：如果没有精准匹配，尝试命令式匹配
         if route is None:
             route = self._keyword_router.match_command_route(message_str)
+        # 管理员关键词（重置记录、全员分配等）与对应指令一样只允许管理员触发
+        if route and route.permission == PermissionLevel.ADMIN and not event.is_admin():
+            route = None
         if route:
             # 记录活跃（既然说话了就要进池子）
             self._record_active(event)
             # 找到对应的函数，比如 _cmd_draw_wife
-            handler = self._keyword_handlers.get(route.action)
-            if handler:
+            if route.action in self._keyword_handlers:
                 # 核心：手动运行你的函数并获取结果
-                async for result in handler(event):
+                async for result in self._run_action(route.action, event):
                     yield result
                 
                 # 处理完了，停止事件，防止再触发别的
@@ -192,6 +421,8 @@ class RandomWifePlugin(Star):
    
     @filter.event_message_type(filter.EventMessageType.ALL)
     async def track_active(self, event: AstrMessageEvent):
+        if self._event_recorder is not None:
+            record_event(self, event)
         self._record_active(event)
 
     def _cleanup_inactive(self, group_id: str):
@@ -199,7 +430,7 @@ class RandomWifePlugin(Star):
 
     @filter.command("今日老婆", alias={"抽老婆"})
     async def draw_wife(self, event: AstrMessageEvent):
-        async for result in self._cmd_draw_wife(event):
+        async for result in self._run_action("draw_wife", event):
             yield result
 
     async def _cmd_draw_wife(self, event: AstrMessageEvent):
@@ -210,22 +441,22 @@ class RandomWifePlugin(Star):
             return
 
         group_id = str(event.get_group_id())
-        save_json(self.active_file, self.active_users, self.active_file, self.config)
         if not is_allowed_group(group_id, self.config):
             return
 
+        # 过期清理与 max_records 裁剪由维护任务在空闲时段统一执行
         user_id, bot_id = str(event.get_sender_id()), str(event.get_self_id())
-        self._cleanup_inactive(group_id)
 
         daily_limit = self.config.get("daily_limit", 1)
-        group_records = self._get_group_records(group_id)
-        user_recs = [r for r in group_records if r["user_id"] == user_id]
-        today_count = len(user_recs)
+        # 加入群联盟时，活跃池 / 每日上限 / 关系图都按联盟共享；开启按账号分区时各机器人独立
+        scope = scope_key(self, group_id, bot_id)
+        group_records = self._get_group_records(scope)
+        today_count = group_records.count_for(user_id)
 
         if today_count >= daily_limit:
             if daily_limit == 1:
-                wife_record = user_recs[0]
-                wife_name, wife_id = wife_record["wife_name"], wife_record["wife_id"]
+                wife_record = group_records.for_user(user_id)[0]
+                wife_name, wife_id = wife_record.wife_name, wife_record.wife_id
                 wife_avatar = (
                     f"https://q4.qlogo.cn/headimg_dl?dst_uin={wife_id}&spec=640"
                 )
@@ -266,77 +497,57 @@ class RandomWifePlugin(Star):
                 yield event.plain_result(text)
             return
 
-        # --- 增强：获取最新的群成员列表以过滤退群者 ---
-        current_member_ids: list[str] = []
-        members = []
-        try:
-            if event.get_platform_name() == "aiocqhttp":
-                assert isinstance(event, AiocqhttpMessageEvent)
-                members = await event.bot.api.call_action(
-                    "get_group_member_list", group_id=int(group_id)
-                )
-                if (
-                    isinstance(members, dict)
-                    and "data" in members
-                    and isinstance(members["data"], list)
-                ):
-                    members = members["data"]
-                current_member_ids = [str(m.get("user_id")) for m in members]
-        except Exception as e:
-            logger.error(f"获取群成员列表失败，将使用缓存池: {e}")
+        # --- 增强：获取群成员（带缓存，联盟内为所有群的合集）以过滤退群者 ---
+        member_names, members_complete = await scope_member_names(self, event, group_id)
 
-        active_pool = self.active_users.get(group_id, {})
         excluded = self._draw_excluded_users()
         excluded.update([bot_id, user_id, "0"])
 
-        # 核心逻辑：如果在 aiocqhttp 平台，只从【当前还在群里】的人中抽取
-        if current_member_ids:
-            pool = [
-                uid
-                for uid in active_pool.keys()
-                if uid not in excluded and uid in current_member_ids
-            ]
+        # 核心逻辑：如果在 aiocqhttp 平台，只从【当前还在群里】的人中抽取；
+        # 联盟里有群没拿到成员列表时合集不全，不按成员过滤，免得把那个群的人全排除掉
+        check_members = bool(member_names) and members_complete
+
+        def accept(uid: str) -> bool:
+            return uid not in excluded and (not check_members or uid in member_names)
 
+        if check_members:
             # 同时顺便清理一下 active_users，把不在群里的人删掉
-            removed_uids = [
-                uid for uid in active_pool.keys() if uid not in current_member_ids
-            ]
+            group_active = self.active_users.get(scope, {})
+            removed_uids = [uid for uid in group_active if uid not in member_names]
             if removed_uids:
                 for r_uid in removed_uids:
-                    del self.active_users[group_id][r_uid]
-                save_json(self.active_file, self.active_users)
+                    del group_active[r_uid]
+                self.active_users.mark_dirty(scope)
+
+        # 按配置的权重曲线抽取（默认等概率）；开启不重复时先排除最近抽到过的人，
+        # 排除后没人可抽则放宽限制
+        # 配置了确定性抽取密钥时，结果由 (密钥, 日期, 范围, 抽取者, 第几次) 决定，记录只是缓存
+        if draw_secret(self):
+            def pick(acc):
+                return deterministic_pick(self, scope, user_id, today_count, acc)
         else:
-            pool = [uid for uid in active_pool.keys() if uid not in excluded]
-
-        if not pool:
+            def pick(acc):
+                return pick_wife(self, scope, acc)
+
+        recent = recent_wives(self, scope, user_id)
+        wife_id = None
+        if recent:
+            wife_id = pick(lambda uid: uid not in recent and accept(uid))
+        if wife_id is None:
+            wife_id = pick(accept)
+        if wife_id is None:
             yield event.plain_result("老婆池为空（需有人在30天内发言）。")
             return
 
-        wife_id = random.choice(pool)
-        wife_name = f"用户({wife_id})"
-        user_name = event.get_sender_name() or f"用户({user_id})"
-
-        try:
-            if event.get_platform_name() == "aiocqhttp":
-                wife_name = resolve_member_name(
-                    members, user_id=wife_id, fallback=wife_name
-                )
-                user_name = resolve_member_name(
-                    members, user_id=user_id, fallback=user_name
-                )
-        except Exception:
-            pass
-
-        timestamp = datetime.now().isoformat()
-        group_records.append(
-            {
-                "user_id": user_id,
-                "wife_id": wife_id,
-                "wife_name": wife_name,
-                "timestamp": timestamp,
-            }
+        wife_name = member_names.get(wife_id) or f"用户({wife_id})"
+        user_name = (
+            member_names.get(user_id) or event.get_sender_name() or f"用户({user_id})"
         )
 
+        timestamp = int(time.time())
+        group_records.append(WifeRecord(user_id, wife_id, wife_name, timestamp))
+        remember_wife(self, scope, user_id, wife_id)
+
         maybe_add_other_half_record(
             records=group_records,
             user_id=user_id,
@@ -347,7 +558,8 @@ class RandomWifePlugin(Star):
             timestamp=timestamp,
         )
 
-        save_json(self.records_file, self.records, self.records_file, self.config)
+        self.records.commit(scope)
+        self.recent_wives.flush()
 
         avatar_url = f"https://q4.qlogo.cn/headimg_dl?dst_uin={wife_id}&spec=640"
         suffix_text = (
@@ -381,7 +593,7 @@ class RandomWifePlugin(Star):
 
     @filter.command("我的老婆", alias={"抽取历史"})
     async def show_history(self, event: AstrMessageEvent):
-        async for result in self._cmd_show_history(event):
+        async for result in self._run_action("show_history", event):
             yield result
 
     async def _cmd_show_history(self, event: AstrMessageEvent):
@@ -390,13 +602,11 @@ class RandomWifePlugin(Star):
             return
 
         user_id = str(event.get_sender_id())
-        today = datetime.now().strftime("%Y-%m-%d")
-        if self.records.get("date") != today:
-            yield event.plain_result("你今天还没有抽过老婆哦~")
-            return
+        self._ensure_today_records()
 
-        group_recs = self.records.get("groups", {}).get(group_id, {}).get("records", [])
-        user_recs = [r for r in group_recs if r["user_id"] == user_id]
+        user_recs = self.records.group_records(
+            scope_key(self, group_id, str(event.get_self_id()))
+        ).for_user(user_id)
         if not user_recs:
             yield event.plain_result("你今天还没有抽过老婆哦~")
             return
@@ -404,14 +614,13 @@ class RandomWifePlugin(Star):
         daily_limit = self.config.get("daily_limit", 3)
         res = [f"🌸 你今日的老婆记录 ({len(user_recs)}/{daily_limit})："]
         for i, r in enumerate(user_recs, 1):
-            time_str = datetime.fromisoformat(r["timestamp"]).strftime("%H:%M")
-            res.append(f"{i}. 【{r['wife_name']}】 ({time_str})")
+            res.append(f"{i}. 【{r.wife_name}】 ({r.time():%H:%M})")
         res.append(f"\n剩余次数：{max(0, daily_limit - len(user_recs))}次")
         yield event.plain_result("\n".join(res))
 
     @filter.command("强娶")
     async def force_marry(self, event: AstrMessageEvent):
-        async for result in self._cmd_force_marry(event):
+        async for result in self._run_action("force_marry", event):
             yield result
 
     async def _cmd_force_marry(self, event: AstrMessageEvent):
@@ -427,9 +636,10 @@ class RandomWifePlugin(Star):
             return
 
         now = time.time()
-        
+        state_key = group_key(self, group_id, bot_id)
+
         # 获取上次强娶的时间戳和日期
-        last_time = self.forced_records.setdefault(group_id, {}).get(user_id, 0)
+        last_time = self.forced_records.setdefault(state_key, {}).get(user_id, 0)
         last_dt = datetime.fromtimestamp(last_time)
         
         # 从配置读取 CD 天数
@@ -474,57 +684,33 @@ class RandomWifePlugin(Star):
             yield event.plain_result("该用户在强娶排除列表中，无法被强娶。")
             return
 
-        # 获取名字
-        target_name = f"用户({target_id})"
-        user_name = event.get_sender_name() or f"用户({user_id})"
-        members = []
-        try:
-            if event.get_platform_name() == "aiocqhttp":
-                assert isinstance(event, AiocqhttpMessageEvent)
-                members = await event.bot.api.call_action(
-                    "get_group_member_list", group_id=int(group_id)
-                )
-                if (
-                    isinstance(members, dict)
-                    and "data" in members
-                    and isinstance(members["data"], list)
-                ):
-                    members = members["data"]
-
-                target_name = resolve_member_name(
-                    members, user_id=target_id, fallback=target_name
-                )
-                user_name = resolve_member_name(
-                    members, user_id=user_id, fallback=user_name
-                )
-        except Exception:
-            pass
+        # 获取名字（群成员列表带缓存）
+        member_names = await group_member_names(self, event, group_id) or {}
+        target_name = member_names.get(target_id) or f"用户({target_id})"
+        user_name = (
+            member_names.get(user_id) or event.get_sender_name() or f"用户({user_id})"
+        )
 
-        group_records = self._get_group_records(group_id)
+        scope = scope_key(self, group_id, bot_id)
+        group_records = self._get_group_records(scope)
 
         # 记录被强娶者的信息（rbq 统计）
-        if group_id not in self.rbq_stats:
-            self.rbq_stats[group_id] = {}
-        if target_id not in self.rbq_stats[group_id]:
-            self.rbq_stats[group_id][target_id] = []
+        if state_key not in self.rbq_stats:
+            self.rbq_stats[state_key] = {}
+        if target_id not in self.rbq_stats[state_key]:
+            self.rbq_stats[state_key][target_id] = []
 
-        self.rbq_stats[group_id][target_id].append(time.time())
-        self._clean_rbq_stats()  # 记录时顺便清理
-        save_json(self.rbq_stats_file, self.rbq_stats)
+        self.rbq_stats[state_key][target_id].append(time.time())
+        self.rbq_stats.mark_dirty(state_key)
+        self.rbq_stats.flush()
 
         # 移除该群该用户今日的其他老婆记录
-        group_records[:] = [r for r in group_records if r["user_id"] != user_id]
+        group_records.remove_user(user_id)
 
         # 插入强娶记录
-        timestamp = datetime.now().isoformat()
+        timestamp = int(time.time())
         group_records.append(
-            {
-                "user_id": user_id,
-                "wife_id": target_id,
-                "wife_name": target_name,
-                "timestamp": timestamp,
-                "forced": True,
-            }
+            WifeRecord(user_id, target_id, target_name, timestamp, FLAG_FORCED)
         )
 
         maybe_add_other_half_record(
@@ -538,10 +724,11 @@ class RandomWifePlugin(Star):
         )
 
         # --- 更新该群的强娶冷却时间 ---
-        self.forced_records[group_id][user_id] = now
+        self.forced_records[state_key][user_id] = now
+        self.forced_records.mark_dirty(state_key)
 
-        save_json(self.records_file, self.records)
-        save_json(self.forced_file, self.forced_records)
+        self.records.commit(scope)
+        self.forced_records.flush()
 
         avatar_url = f"https://q4.qlogo.cn/headimg_dl?dst_uin={target_id}&spec=640"
         text = f" 你今天强娶了【{target_name}】哦❤️~\n请对她好一点哦~。\n"
@@ -567,7 +754,7 @@ class RandomWifePlugin(Star):
 
     @filter.command("关系图")
     async def show_graph(self, event: AstrMessageEvent):
-        async for result in self._cmd_show_graph(event):
+        async for result in self._run_action("show_graph", event):
             yield result
 
     async def _cmd_show_graph(self, event: AstrMessageEvent):
@@ -575,139 +762,145 @@ class RandomWifePlugin(Star):
         if not is_allowed_group(group_id, self.config):
             return
 
-        iter_count = self.config.get("iterations", 140)
-
-        # --- 新增：读取 JS 文件内容 ---
-        vis_js_path = os.path.join(self.curr_dir, "vis-network.min.js")
-        vis_js_content = ""
-        if os.path.exists(vis_js_path):
-            with open(vis_js_path, "r", encoding="utf-8") as f:
-                vis_js_content = f.read()
-        else:
-            logger.error(f"找不到 JS 文件: {vis_js_path}")
-        # ---------------------------
-
-        # 1. 读取模板文件内容
-        template_path = os.path.join(self.curr_dir, "graph_template.html")
-        if not os.path.exists(template_path):
-            yield event.plain_result(f"错误：找不到模板文件 {template_path}")
-            return
-
-        with open(template_path, "r", encoding="utf-8") as f:
-            graph_html = f.read()
-
-        # 2. 获取数据 (假设你已经从 self.records 获取了 group_data)
-        group_data = self.records.get("groups", {}).get(group_id, {}).get("records", [])
+        # 1. 获取数据
+        scope = scope_key(self, group_id, str(event.get_self_id()))
+        group_data = self.records.group_records(scope)
 
         group_name = "未命名群聊"
         user_map = {}
         try:
             if event.get_platform_name() == "aiocqhttp":
                 # 获取群信息
-                info = await event.bot.api.call_action(
-                    "get_group_info", group_id=int(group_id)
+                info = await call_onebot_action(
+                    event.bot, "get_group_info", group_id=int(group_id)
                 )
                 if isinstance(info, dict) and "data" in info and isinstance(info["data"], dict):
                     info = info["data"]
                 group_name = info.get("group_name", "未命名群聊")
 
-                # 获取群成员列表构建映射
-                members = await event.bot.api.call_action(
-                    "get_group_member_list", group_id=int(group_id)
-                )
-                if isinstance(members, dict) and "data" in members and isinstance(members["data"], list):
-                    members = members["data"]
-
-                if isinstance(members, list):
-                    for m in members:
-                        uid = str(m.get("user_id"))
-                        name = m.get("card") or m.get("nickname") or uid
-                        user_map[uid] = name
+                # 群成员映射（带缓存；群联盟时包含所有联盟群的成员）
+                user_map, _complete = await scope_member_names(self, event, group_id)
 
         except Exception as e:
             logger.warning(f"获取群信息失败: {e}")
 
-        # 3. 渲染图片
-        # 根据节点数量动态计算高度，避免拥挤
-        # 动态计算你想要裁剪的区域大小
-        unique_nodes = set()
-        for r in group_data:
-            unique_nodes.add(str(r.get("user_id")))
-            unique_nodes.add(str(r.get("wife_id")))
-        node_count = len(unique_nodes)
-
-        # 假设我们想要从左上角 (0,0) 开始，裁剪一个动态高度的区域
-        clip_width = 1920
-        clip_height = 1080 + (max(0, node_count - 10) * 60)
-
+        # 2. 渲染图片
         try:
-            url = await self.html_render(
+            graph_html, data, clip_width, clip_height = graph_render_args(
+                self, group_id, group_name, user_map, group_data
+            )
+        except FileNotFoundError as e:
+            yield event.plain_result(f"错误：找不到模板文件 {e.filename}")
+            return
+
+        # 同一群同一版本的记录只渲染一次，同时发起的请求共享结果
+        # 缩放档位、格式和裁剪由输出策略决定（见 render_image_format 等配置）
+        async def render_graph() -> str:
+            path = await self._render_image(
+                "show_graph",
                 graph_html,
-                {
-                    "vis_js_content": vis_js_content,
-                    "group_id": group_id,
-                    "group_name": group_name,
-                    "user_map": user_map,
-                    "records": group_data,
-                    "iterations": iter_count,
-                },
-                options={
-                    "type": "png",
-                    "quality": None,
-                    "scale": "device",
-                    # 必须传齐这四个参数，且必须是 int 或 float，不能是字符串
-                    "clip": {
-                        "x": 0,
-                        "y": 0,
-                        "width": clip_width,
-                        "height": clip_height,
-                    },
-                    # 注意：使用 clip 时通常建议将 full_page 设为 False
-                    "full_page": False,
-                    "device_scale_factor_level": "ultra",
-                },
+                data,
+                width=clip_width,
+                height=clip_height,
+                # 按账号分区时同一个群有多份记录，用分区键区分
+                key=("show_graph", scope, group_data.version),
             )
+            # 本地 HTTP 接口提供各记录范围最近一次的关系图（联盟内的群共用一张）
+            self._graph_images[scope] = path
+            return path
+
+        url, pending = await guarded_render(self, "show_graph", render_graph)
+        if url:
             yield event.image_result(url)
-        except Exception as e:
-            logger.error(f"渲染失败: {e}")
+            return
+        # 渲染繁忙 / 超时 / 失败时先回复文字版
+        text = graph_fallback_text(group_name, group_data, user_map, BATCH_DRAW_TEXT_LINES)
+        if pending and render_late_image_enabled(self):
+            text += "\n（图片生成较慢，稍后补发）"
+            send_late_image(self, event, pending)
+        yield event.plain_result(text)
+
+    @filter.command("今日关系", alias={"关系分析"})
+    async def graph_stats(self, event: AstrMessageEvent):
+        async for result in self._run_action("graph_stats", event):
+            yield result
+
+    async def _cmd_graph_stats(self, event: AstrMessageEvent):
+        if event.is_private_chat():
+            yield event.plain_result("此功能仅在群聊中可用哦~")
+            return
+
+        group_id = str(event.get_group_id())
+        if not is_allowed_group(group_id, self.config):
+            return
+
+        self._ensure_today_records()
+        # 关系分析随抽取 / 强娶增量维护，这里只读结果，不渲染图片也不请求群成员列表
+        graph = self.records.group_records(
+            scope_key(self, group_id, str(event.get_self_id()))
+        ).graph
+        if not graph.node_count:
+            yield event.plain_result("本群今天还没有人抽过老婆哦~")
+            return
+
+        name = graph.name
+        res = ["💞 本群今日关系速览"]
+        most_wanted = graph.most_wanted()
+        if most_wanted:
+            res.append("👑 今日万人迷：")
+            for wife_id, count in most_wanted:
+                res.append(f"  【{name(wife_id)}】被 {count} 人抽中")
+        mutual = graph.mutual_pairs()
+        if mutual:
+            res.append(f"💕 双向奔赴（{len(mutual)} 对）：")
+            for a, b in mutual[:5]:
+                res.append(f"  【{name(a)}】❤【{name(b)}】")
+        triangles = graph.cycles(3)
+        if triangles:
+            res.append(f"🔺 三角恋（{len(triangles)} 组）：")
+            for cycle in triangles[:3]:
+                res.append("  " + " → ".join(f"【{name(u)}】" for u in cycle + cycle[:1]))
+        longer = [c for c in graph.cycles() if len(c) > 3]
+        if longer:
+            res.append(f"🔁 更长的爱情链（{len(longer)} 条）：")
+            for cycle in longer[:3]:
+                res.append("  " + " → ".join(f"【{name(u)}】" for u in cycle + cycle[:1]))
+        components = graph.components()
+        if components:
+            res.append(
+                f"🫂 共 {len(components)} 个小圈子，最大的有 {components[0]} 人"
+            )
+        yield event.plain_result("\n".join(res))
 
     @filter.command("rbq排行")
     async def rbq_ranking(self, event: AstrMessageEvent):
+        async for result in self._run_action("rbq_ranking", event):
+            yield result
+
+    async def _cmd_rbq_ranking(self, event: AstrMessageEvent):
         if event.is_private_chat():
             yield event.plain_result("私聊看不了榜单哦~")
             return
             
         group_id = str(event.get_group_id())
-        self._clean_rbq_stats() # 渲染前强制清理一次过期数据
-        
-        group_data = self.rbq_stats.get(group_id, {})
-        if not group_data:
+
+        # 全量清理由维护任务执行，这里只过滤本群 30 天外的记录
+        state_key = group_key(self, group_id, str(event.get_self_id()))
+        counts = rbq_counts(self.rbq_stats.get(state_key, {}), time.time())
+        if not counts:
             yield event.plain_result("本群近30天还没有人被强娶过，大家都很有礼貌呢。")
             return
 
-        # 获取群成员名字映射 (仿照关系图逻辑)
+        # 获取群成员名字映射（带缓存，多人同时看榜只请求一次）
         user_map = {}
-        try:
-            if event.get_platform_name() == "aiocqhttp":
-                members = await event.bot.api.call_action('get_group_member_list', group_id=int(group_id))
-                for m in members:
-                    uid = str(m.get("user_id"))
-                    user_map[uid] = m.get("card") or m.get("nickname") or uid
-        except Exception:
-            pass
-
-        # 构造排序数据
-        sorted_list = []
-        for uid, ts_list in group_data.items():
-            sorted_list.append({
-                "uid": uid,
-                "name": user_map.get(uid, f"用户({uid})"),
-                "count": len(ts_list)
-            })
-        
+        if event.get_platform_name() == "aiocqhttp":
+            user_map = await group_member_names(self, event, group_id) or {}
+
         # 按次数从大到小排，取前10
-        sorted_list.sort(key=lambda x: x["count"], reverse=True)
-        top_10 = sorted_list[:10]
+        top_10 = [
+            {"uid": uid, "name": user_map.get(uid, f"用户({uid})"), "count": count}
+            for uid, count in counts[:10]
+        ]
 
         current_rank = 1
         for i, user in enumerate(top_10):
@@ -724,72 +917,338 @@ class RandomWifePlugin(Star):
         with open(template_path, "r", encoding="utf-8") as f:
             template_content = f.read()
 
-        try:
-            # 计算数据行数，动态调整高度（10人大约550px就够了）
-            #dynamic_height = 160 + (len(top_10) * 85) 
-            
-            header_h = 100 
-            item_h = 60 
-            footer_h = 50
-            rank_width = 400
-
-            dynamic_height = header_h + (len(top_10) * item_h) + footer_h
-            # 渲染图片
-            url = await self.html_render(template_content, {
-                "group_id": group_id,
-                "ranking": top_10,
-                "title": "❤️ 群rbq月榜 ❤️"
-            }, 
-            options={
-                "type": "png",
-                "quality": None,
-                "full_page": False, # 关闭全页面，配合 clip 使用
-                "clip": {
-                    "x": 0,
-                    "y": 0,
-                    "width": rank_width,
-                    "height": dynamic_height # 裁切的高度
-                },
-                "scale": "device",
-                "device_scale_factor_level": "ultra"
-            }
-            )
+        # 计算数据行数，动态调整高度（10人大约550px就够了）
+        header_h = 100
+        item_h = 60
+        footer_h = 50
+        rank_width = 400
+
+        dynamic_height = header_h + (len(top_10) * item_h) + footer_h
+        title = "❤️ 群rbq月榜 ❤️"
+        url, pending = await guarded_render(
+            self,
+            "rbq_ranking",
+            lambda: self._render_image(
+                "rbq_ranking",
+                template_content,
+                {"group_id": group_id, "ranking": top_10, "title": title},
+                width=rank_width,
+                height=dynamic_height,
+                # 榜单内容相同的请求合并为一次渲染
+                key=("rbq_ranking", group_id, tuple((u["uid"], u["name"], u["count"]) for u in top_10)),
+            ),
+        )
+        if url:
             yield event.image_result(url)
-        except Exception as e:
-            logger.error(f"渲染RBQ排行失败: {e}")
+            return
+        text = ranking_fallback_text(title, top_10)
+        if pending and render_late_image_enabled(self):
+            text += "\n（图片生成较慢，稍后补发）"
+            send_late_image(self, event, pending)
+        yield event.plain_result(text)
+
+    @filter.command("本月老婆")
+    async def monthly_wife(self, event: AstrMessageEvent):
+        async for result in self._run_action("monthly_wife", event):
+            yield result
+
+    async def _cmd_monthly_wife(self, event: AstrMessageEvent):
+        if event.is_private_chat():
+            yield event.plain_result("此功能仅在群聊中可用哦~")
+            return
+
+        group_id = str(event.get_group_id())
+        if not is_allowed_group(group_id, self.config):
+            return
+
+        user_id = str(event.get_sender_id())
+        today = current_date(self)
+        counter: dict[str, int] = {}
+        names: dict[str, str] = {}
+        forced_count = 0
+        scope = scope_key(self, group_id, str(event.get_self_id()))
+        for r in iter_group_history(self, scope, today.replace(day=1), today):
+            if str(r["user_id"]) != user_id:
+                continue
+            wife_id = str(r["wife_id"])
+            counter[wife_id] = counter.get(wife_id, 0) + 1
+            names[wife_id] = r.get("wife_name") or f"用户({wife_id})"
+            if r.get("forced"):
+                forced_count += 1
+
+        if not counter:
+            yield event.plain_result("你这个月还没有抽过老婆哦~")
+            return
+
+        top = sorted(counter.items(), key=lambda kv: kv[1], reverse=True)[:5]
+        res = [
+            f"🌸 你{today.month}月共有 {sum(counter.values())} 条老婆记录"
+            f"（{len(counter)} 位不同的老婆，强娶 {forced_count} 次）",
+            f"本月最常见的老婆是：【{names[top[0][0]]}】（{top[0][1]}次）",
+        ]
+        if len(top) > 1:
+            res.append("其余排行：")
+            for i, (wife_id, count) in enumerate(top[1:], 2):
+                res.append(f"{i}. 【{names[wife_id]}】 {count}次")
+        yield event.plain_result("\n".join(res))
+
+    @filter.command("本群月报")
+    async def group_monthly(self, event: AstrMessageEvent):
+        async for result in self._run_action("group_monthly", event):
+            yield result
+
+    async def _cmd_group_monthly(self, event: AstrMessageEvent):
+        if event.is_private_chat():
+            yield event.plain_result("此功能仅在群聊中可用哦~")
+            return
+
+        group_id = str(event.get_group_id())
+        if not is_allowed_group(group_id, self.config):
+            return
+
+        today = current_date(self)
+        draw_count = forced_count = 0
+        drawers: set[str] = set()
+        wife_counter: dict[str, int] = {}
+        forced_counter: dict[str, int] = {}
+        names: dict[str, str] = {}
+        scope = scope_key(self, group_id, str(event.get_self_id()))
+        for r in iter_group_history(self, scope, today.replace(day=1), today):
+            if r.get("auto_set"):
+                continue
+            wife_id = str(r["wife_id"])
+            names[wife_id] = r.get("wife_name") or f"用户({wife_id})"
+            drawers.add(str(r["user_id"]))
+            if r.get("forced"):
+                forced_count += 1
+                forced_counter[wife_id] = forced_counter.get(wife_id, 0) + 1
+            else:
+                draw_count += 1
+                wife_counter[wife_id] = wife_counter.get(wife_id, 0) + 1
+
+        if not drawers:
+            yield event.plain_result("本群这个月还没有人抽过老婆哦~")
+            return
+
+        res = [
+            f"📅 本群{today.month}月老婆月报",
+            f"参与人数：{len(drawers)} 人",
+            f"抽老婆次数：{draw_count} 次",
+            f"强娶次数：{forced_count} 次",
+        ]
+        if wife_counter:
+            res.append("🌟 本月最常被抽到：")
+            for wife_id, count in sorted(wife_counter.items(), key=lambda kv: kv[1], reverse=True)[:3]:
+                res.append(f"  【{names[wife_id]}】 {count}次")
+        if forced_counter:
+            res.append("💢 本月最常被强娶：")
+            for wife_id, count in sorted(forced_counter.items(), key=lambda kv: kv[1], reverse=True)[:3]:
+                res.append(f"  【{names[wife_id]}】 {count}次")
+        yield event.plain_result("\n".join(res))
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.command("重置记录")
     async def reset_records(self, event: AstrMessageEvent):
-        async for result in self._cmd_reset_records(event):
+        async for result in self._run_action("reset_records", event):
             yield result
 
     async def _cmd_reset_records(self, event: AstrMessageEvent):
-        self.records = {"date": datetime.now().strftime("%Y-%m-%d"), "groups": {}}
-        save_json(self.records_file, self.records)
+        self.records.reset(current_day(self))
         yield event.plain_result("今日抽取记录已重置！")
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("验证抽取")
+    async def verify_draws(self, event: AstrMessageEvent):
+        async for result in self._run_action("verify_draws", event):
+            yield result
+
+    async def _cmd_verify_draws(self, event: AstrMessageEvent):
+        if event.is_private_chat():
+            yield event.plain_result("此功能仅在群聊中可用哦~")
+            return
+
+        group_id = str(event.get_group_id())
+        if not is_allowed_group(group_id, self.config):
+            return
+        if not draw_secret(self):
+            yield event.plain_result("未开启确定性抽取（deterministic_draw_secret 为空），无法复算。")
+            return
+
+        bot_id = str(event.get_self_id())
+        scope = scope_key(self, group_id, bot_id)
+        group_records = self._get_group_records(scope)
+        if not len(group_records):
+            yield event.plain_result("本群今天还没有抽取记录哦~")
+            return
+
+        # 候选池的过滤条件与抽老婆时一致
+        member_names, _complete = await scope_member_names(self, event, group_id)
+        excluded = self._draw_excluded_users()
+        excluded.update([bot_id, "0"])
+
+        def accept(uid: str) -> bool:
+            return uid not in excluded and (not member_names or uid in member_names)
+
+        checked, mismatches = recompute_draws(self, scope, group_records, accept)
+        graph = group_records.graph
+
+        def name(uid: str) -> str:
+            return member_names.get(uid) or graph.name(uid)
+
+        lines = [
+            f"🔍 今日抽取复算：{checked} 条普通抽取，"
+            f"一致 {checked - len(mismatches)} 条，不一致 {len(mismatches)} 条"
+        ]
+        for user_id, recorded, expected in mismatches[:10]:
+            lines.append(f"【{name(user_id)}】记录为【{name(recorded)}】，复算为【{name(expected)}】")
+        if len(mismatches) > 10:
+            lines.append(f"……等共 {len(mismatches)} 条")
+        batch = sum(1 for r in group_records if r.batch)
+        if batch:
+            lines.append(f"另有全员分配 {batch} 条，按整批播种，不逐条复算。")
+        if mismatches:
+            lines.append("不一致通常是抽取后活跃池或群成员有变化，或抽取时还没开启确定性抽取。")
+        yield event.plain_result("\n".join(lines))
+
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.command("重置强娶时间")
     async def reset_force_cd(self, event: AstrMessageEvent):
-        async for result in self._cmd_reset_force_cd(event):
+        async for result in self._run_action("reset_force_cd", event):
             yield result
 
     async def _cmd_reset_force_cd(self, event: AstrMessageEvent):
         group_id = str(event.get_group_id())
+        state_key = group_key(self, group_id, str(event.get_self_id()))
 
-        if hasattr(self, "forced_records") and group_id in self.forced_records:
-            self.forced_records[group_id] = {}
-            save_json(self.forced_file, self.forced_records)
+        if hasattr(self, "forced_records") and state_key in self.forced_records:
+            self.forced_records[state_key] = {}
+            self.forced_records.flush()
 
             logger.info(f"[Wife] 已重置群 {group_id} 的强娶冷却时间")
             yield event.plain_result("✅ 本群强娶冷却时间已重置！现在大家可以再次强娶了。")
         else:
             yield event.plain_result("💡 本群目前没有人在冷却期内。")
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("全员分配")
+    async def batch_draw(self, event: AstrMessageEvent):
+        '''
+        为全群活跃成员一次性分配今日老婆（管理员），加上“一对一”则每人只会被一人抽到
+        '''
+        async for result in self._run_action("batch_draw", event):
+            yield result
+
+    async def _cmd_batch_draw(self, event: AstrMessageEvent):
+        if event.is_private_chat():
+            yield event.plain_result("此功能仅在群聊中可用哦~")
+            return
+
+        group_id = str(event.get_group_id())
+        if not is_allowed_group(group_id, self.config):
+            return
+
+        one_to_one = "一对一" in (event.message_str or "")
+        daily_limit = self.config.get("daily_limit", 1)
+        scope = scope_key(self, group_id, str(event.get_self_id()))
+        group_records = self._get_group_records(scope)
+
+        # 成员列表带缓存（联盟内为所有群的合集），名字查找用字典，避免逐人线性扫描
+        member_names, members_complete = await scope_member_names(self, event, group_id)
+
+        active_cutoff = time.time() - ACTIVE_WINDOW_SECONDS
+        group_active = self.active_users.get(scope, {})
+        excluded = self._draw_excluded_users()
+        excluded.update([str(event.get_self_id()), "0"])
+        if member_names and members_complete:
+            departed = [uid for uid in group_active if uid not in member_names]
+            for uid in departed:
+                del group_active[uid]
+            if departed:
+                self.active_users.mark_dirty(scope)
+        eligible = [
+            uid
+            for uid, ts in group_active.items()
+            if ts >= active_cutoff and uid not in excluded
+        ]
+
+        # 确定性模式下按规范顺序 + 当天已有记录数播种，同样的状态重跑得到同样的分配
+        if draw_secret(self):
+            eligible = canonical_order(eligible)
+            rng = seeded_rng(self, scope, "batch_draw", len(group_records))
+        else:
+            rng = random
+
+        if one_to_one:
+            # 今天还没抽过、也没被抽过的人之间做随机错排
+            drawers = [
+                uid
+                for uid in eligible
+                if not group_records.has_user(uid) and not group_records.drawers_of(uid)
+            ]
+            assignment = random_derangement(drawers, rng)
+        else:
+            drawers = [uid for uid in eligible if group_records.count_for(uid) < daily_limit]
+            rng.shuffle(drawers)
+            assignment = random_assignment(drawers, eligible, rng)
+
+        if not assignment:
+            yield event.plain_result("没有可以分配的群友（需至少两名今天还能抽取的活跃群友）。")
+            return
+
+        def display_name(uid: str) -> str:
+            return member_names.get(uid) or f"用户({uid})"
+
+        timestamp = int(time.time())
+        # 一对一模式下 A→B 的反向记录 B→A 会破坏错排（B 本该抽到别人），不自动设置
+        auto_set = self._auto_set_other_half_enabled() and not one_to_one
+        lines = []
+        for user_id in drawers:
+            wife_id = assignment.get(user_id)
+            # 前面的人“自动设置对方老婆”后，后面的人可能已经没有次数了
+            if wife_id is None or group_records.count_for(user_id) >= daily_limit:
+                continue
+            if not one_to_one:
+                # 可重复模式下避开最近抽到过的人（重抽几次，仍不行就保留）；
+                # 一对一模式为保持错排不做调整
+                recent = recent_wives(self, scope, user_id)
+                if wife_id in recent:
+                    for _ in range(BATCH_NO_REPEAT_RETRIES):
+                        candidate = rng.choice(eligible)
+                        if candidate != user_id and candidate not in recent:
+                            wife_id = candidate
+                            break
+            wife_name = display_name(wife_id)
+            group_records.append(WifeRecord(user_id, wife_id, wife_name, timestamp, FLAG_BATCH))
+            remember_wife(self, scope, user_id, wife_id)
+            maybe_add_other_half_record(
+                records=group_records,
+                user_id=user_id,
+                user_name=display_name(user_id),
+                wife_id=wife_id,
+                wife_name=wife_name,
+                enabled=auto_set,
+                timestamp=timestamp,
+            )
+            lines.append(f"【{display_name(user_id)}】 → 【{wife_name}】")
+
+        # 所有记录一次性落盘
+        self.records.commit(scope)
+        self.recent_wives.flush()
+        logger.info(f"[Wife] 群 {group_id} 全员分配 {len(lines)} 人（一对一：{one_to_one}）")
+
+        title = f"💘 全员分配完成{'（一对一）' if one_to_one else ''}，共 {len(lines)} 人："
+        text = "\n".join([title, *lines])
+        if len(lines) > BATCH_DRAW_TEXT_LINES:
+            try:
+                yield event.image_result(await self.text_to_image(text))
+                return
+            except Exception as e:
+                logger.warning(f"全员分配结果转图片失败，改为发送文字: {e}")
+        yield event.plain_result(text)
+
     @filter.command("抽老婆帮助", alias={"老婆插件帮助"})
     async def show_help(self, event: AstrMessageEvent):
-        async for result in self._cmd_show_help(event):
+        async for result in self._run_action("show_help", event):
             yield result
 
     async def _cmd_show_help(self, event: AstrMessageEvent):
@@ -802,8 +1261,13 @@ class RandomWifePlugin(Star):
             "2. 【强娶@某人】或【强娶 @某人】：强行更换今日老婆（有冷却期）\n"
             "3. 【我的老婆】：查看今日历史与次数\n"
             "4. 【重置记录】：(管理员) 清空数据（强娶记录不会清除）\n"
-            "5. 【关系图】：查看群友老婆的关系\n"
+            "   【全员分配 [一对一]】：(管理员) 一次性为全群活跃成员分配今日老婆\n"
+            "   【验证抽取】：(管理员) 开启确定性抽取后，复算今天的抽取结果\n"
+            "5. 【关系图】：查看群友老婆的关系（【今日关系】可查看文字版统计）\n"
             "6. 【rbq排行】：展示近30天被强娶的次数排行\n"
+            "7. 【本月老婆】：查看你本月最常抽到的老婆\n"
+            "8. 【本群月报】：查看本群本月抽取与强娶统计\n"
+            "9. 【群活跃度】：查看本群最近 7 天每小时发言热力图与发言人数\n"
             f"当前每日上限：{daily_limit}次\n"
             "提示：可在配置开启“关键词触发”，直接发送关键词无需 / 前缀。\n"
             "提示：可在配置开启“自动设置对方老婆 / 定时自动撤回”。\n"
@@ -811,20 +1275,171 @@ class RandomWifePlugin(Star):
         )
         yield event.plain_result(help_text)
 
+    @filter.command("群活跃度")
+    async def group_activity(self, event: AstrMessageEvent):
+        async for result in self._run_action("group_activity", event):
+            yield result
+
+    async def _cmd_group_activity(self, event: AstrMessageEvent):
+        if event.is_private_chat():
+            yield event.plain_result("此功能仅在群聊中可用哦~")
+            return
+
+        group_id = str(event.get_group_id())
+        if not is_allowed_group(group_id, self.config):
+            return
+
+        # 统计随发言增量维护，这里只读一个固定大小的分片
+        stats = self.activity_stats.get(
+            group_key(self, group_id, str(event.get_self_id()))
+        )
+        if stats is None:
+            yield event.plain_result("本群最近 7 天还没有发言记录哦~")
+            return
+        yield event.plain_result(activity_report(stats, time.time()))
+
     @filter.command("debug_graph")
     async def debug_graph(self, event: AstrMessageEvent):
         '''
         调试关系图渲染
         '''
         # 直接调用外部函数，将 self (插件实例) 和 event 传进去
-        async for result in run_debug_graph(self, event):
+        if self._is_duplicate_event(event):
+            return
+        wait = check_rate_limit(self, "debug_graph", event)
+        if wait:
+            yield self._rate_limited_result("debug_graph", event, wait)
+            return
+        async for result in metrics.timed_iter(
+            "command_seconds", run_debug_graph(self, event), command="debug_graph"
+        ):
             yield result
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("老婆插件统计")
+    async def show_metrics(self, event: AstrMessageEvent):
+        '''
+        查看插件运行指标（管理员）
+        '''
+        if self._is_duplicate_event(event):
+            return
+        uptime = int(time.time() - metrics.started_at)
+        lines = [f"📊 抽老婆插件运行指标（已运行 {uptime // 3600}小时{uptime % 3600 // 60}分）"]
+        lines.extend(metrics.summary_lines() or ["暂无数据"])
+        yield event.plain_result("\n".join(lines))
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("老婆插件导出")
+    async def export_data(self, event: AstrMessageEvent):
+        '''
+        流式导出插件数据（管理员），如 /老婆插件导出 records,rbq group=123 from=2026-10-01 to=2026-10-19 csv gz
+        '''
+        if self._is_duplicate_event(event):
+            return
+        try:
+            opts = TransferOptions.parse(event.message_str.split()[1:])
+        except ValueError as e:
+            yield event.plain_result(f"参数错误：{e}")
+            return
+
+        export_dir = os.path.join(self.data_dir, "exports")
+        os.makedirs(export_dir, exist_ok=True)
+        stem = f"export-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        suffix = f".{opts.fmt}" + (".gz" if opts.compress else "")
+        path = os.path.join(export_dir, stem + suffix)
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(export_dir, f"{stem}-{n}{suffix}")
+            n += 1
+
+        start = time.perf_counter()
+        try:
+            # 分片快照在这里（事件循环）取好；读磁盘分片、解压归档、写文件在线程里完成
+            count = await asyncio.to_thread(
+                write_export,
+                iter_export_rows(self, opts),
+                path,
+                fmt=opts.fmt,
+                compress=opts.compress,
+            )
+        except Exception as e:
+            logger.error(f"导出失败: {e}")
+            yield event.plain_result(f"导出失败: {e}")
+            return
+        yield event.plain_result(
+            f"✅ 已导出 {count} 行（{', '.join(opts.kinds)}），"
+            f"用时 {time.perf_counter() - start:.1f}s\n文件：{path}"
+        )
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("老婆插件导入")
+    async def import_data(self, event: AstrMessageEvent):
+        '''
+        从数据目录 exports/ 下的 JSONL / CSV（可 gzip）文件导入数据（管理员），如 /老婆插件导入 export-xxx.jsonl.gz
+        '''
+        if self._is_duplicate_event(event):
+            return
+        args = event.message_str.split()[1:]
+        if not args:
+            yield event.plain_result("请指定 exports 目录下要导入的文件名。")
+            return
+        # 只允许导入 exports 目录下的文件
+        path = os.path.join(self.data_dir, "exports", os.path.basename(args[0]))
+        if not os.path.isfile(path):
+            yield event.plain_result(f"找不到文件：{path}")
+            return
+
+        start = time.perf_counter()
+        try:
+            counts = await import_file(self, path)
+        except Exception as e:
+            logger.error(f"导入失败: {e}")
+            yield event.plain_result(f"导入失败（已导入的批次会保留）: {e}")
+            return
+        # 活跃数据变化后，加权抽样池下次抽取时重建
+        self._draw_pools.clear()
+        summary = "，".join(f"{k} {v} 行" for k, v in counts.items()) or "没有可导入的数据"
+        yield event.plain_result(
+            f"✅ 导入完成（用时 {time.perf_counter() - start:.1f}s）：{summary}"
+        )
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("老婆插件profile")
+    async def profile(self, event: AstrMessageEvent, seconds: int = 30):
+        '''
+        在线采样 CPU / 内存热点（管理员），如 /老婆插件profile 30
+        '''
+        if self._is_duplicate_event(event):
+            return
+        seconds = max(MIN_PROFILE_SECONDS, min(MAX_PROFILE_SECONDS, int(seconds)))
+        if self._profiling:
+            yield event.plain_result("已有剖析任务在进行中，请稍后再试。")
+            return
+
+        yield event.plain_result(f"🔍 开始采样 {seconds} 秒，期间的指令处理都会被记录……")
+        try:
+            report_path, summary = await run_profile(self, seconds)
+        except ProfileBusyError:
+            yield event.plain_result("当前已有其他 profiler 挂载在事件循环上，无法开始采样。")
+            return
+        except Exception as e:
+            logger.error(f"剖析失败: {e}")
+            yield event.plain_result(f"剖析失败: {e}")
+            return
+
+        summary.append(f"完整报告：{report_path}")
+        yield event.plain_result("\n".join(summary))
+
     async def terminate(self):
-        save_json(self.records_file, self.records)
-        save_json(self.active_file, self.active_users)
-        save_json(self.forced_file, self.forced_records)
-        save_json(self.rbq_stats_file, self.rbq_stats)
+        metrics.remove_collector(self._metrics_collector)
+        for task in tuple(self._background_tasks):
+            task.cancel()
+        self._background_tasks.clear()
+        self.render_scheduler.cancel_all()
+        if self._http_api is not None:
+            await self._http_api.stop()
+
+        flush_state(self)
 
         # 取消尚未执行的撤回任务，避免插件卸载后仍调用协议端。
         for task in tuple(self._withdraw_tasks):
@@ -0,0 +1,186 @@
+import base64
+import hashlib
+import math
+from array import array
+from datetime import datetime, timedelta
+
+# 按小时计数的环形数组覆盖最近 7 天
+RING_HOURS = 7 * 24
+# 每天一个 HyperLogLog，保留最近 7 天，周去重人数由 7 个合并得到
+SKETCH_DAYS = 7
+# HyperLogLog 精度：2^10 个寄存器，每个 1 字节，标准误差约 3.3%
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+_HLL_RANK_BITS = 64 - HLL_PRECISION
+_HLL_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+
+HEAT_LEVELS = "·▁▂▃▄▅▆▇█"
+_WEEKDAYS = "一二三四五六日"
+
+
+class HyperLogLog:
+    """定长的基数估计：去重人数只占 1KB，与发言人数无关。
+
+    哈希用 blake2b 而不是内置 hash()，保证重启后同一个人落在同一个寄存器。
+    """
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: bytes | bytearray | None = None):
+        self.registers = bytearray(registers) if registers else bytearray(HLL_REGISTERS)
+
+    def add(self, value: str) -> None:
+        x = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        index = x >> _HLL_RANK_BITS
+        rank = _HLL_RANK_BITS - (x & ((1 << _HLL_RANK_BITS) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        registers = self.registers
+        zeros = registers.count(0)
+        if zeros == HLL_REGISTERS:
+            return 0
+        estimate = _HLL_ALPHA * HLL_REGISTERS * HLL_REGISTERS / sum(2.0 ** -r for r in registers)
+        # 小基数时用线性计数修正
+        if estimate <= 2.5 * HLL_REGISTERS and zeros:
+            estimate = HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)
+        return round(estimate)
+
+
+def _local_day(hour: int) -> int:
+    return datetime.fromtimestamp(hour * 3600).toordinal()
+
+
+class GroupActivity:
+    """单个群的活跃度统计，大小固定（约 8KB），与消息量无关。
+
+    - ``hours``：最近 168 小时的消息数，按 ``纪元小时 % 168`` 放在环里，
+      跨过的小时在下一次写入时清零；
+    - ``sketches``：最近 7 天每天一个 HyperLogLog，按 ``日期序号 % 7`` 复用。
+
+    ``record`` 只在换小时时做一次日期换算，其余是几次数组下标操作。
+    """
+
+    __slots__ = ("hours", "last_hour", "sketches", "sketch_days", "_day_hour", "_day")
+
+    def __init__(self):
+        self.hours = array("I", bytes(4 * RING_HOURS))
+        self.last_hour = 0
+        self.sketches = [HyperLogLog() for _ in range(SKETCH_DAYS)]
+        self.sketch_days = array("i", bytes(4 * SKETCH_DAYS))
+        self._day_hour = -1
+        self._day = 0
+
+    # ---------- 写入 ----------
+    def _advance(self, hour: int) -> None:
+        if hour <= self.last_hour:
+            return
+        hours = self.hours
+        # 最多清零一整圈
+        for h in range(max(self.last_hour + 1, hour - RING_HOURS + 1), hour + 1):
+            hours[h % RING_HOURS] = 0
+        self.last_hour = hour
+
+    def _sketch(self, day: int) -> HyperLogLog | None:
+        slot = day % SKETCH_DAYS
+        current = self.sketch_days[slot]
+        if current > day:
+            # 比槽里那天还早 7 天以上的旧消息，不能覆盖较新的一天
+            return None
+        if current != day:
+            self.sketches[slot] = HyperLogLog()
+            self.sketch_days[slot] = day
+        return self.sketches[slot]
+
+    def record(self, user_id: str, now: float) -> None:
+        hour = int(now // 3600)
+        self._advance(hour)
+        # 乱序到达的旧消息（超出环的范围）只计入去重人数
+        if hour > self.last_hour - RING_HOURS:
+            self.hours[hour % RING_HOURS] += 1
+        if hour != self._day_hour:
+            self._day_hour, self._day = hour, _local_day(hour)
+        sketch = self._sketch(self._day)
+        if sketch is not None:
+            sketch.add(user_id)
+
+    # ---------- 查询 ----------
+    def messages_at(self, hour: int) -> int:
+        if hour > self.last_hour or hour <= self.last_hour - RING_HOURS:
+            return 0
+        return self.hours[hour % RING_HOURS]
+
+    def unique_users(self, first_day: int, last_day: int) -> int:
+        merged = HyperLogLog()
+        for slot, day in enumerate(self.sketch_days):
+            if first_day <= day <= last_day:
+                merged.merge(self.sketches[slot])
+        return merged.count()
+
+    def is_stale(self, now: float) -> bool:
+        """最近 7 天没有任何消息。"""
+        return self.last_hour <= int(now // 3600) - RING_HOURS
+
+    # ---------- 持久化 ----------
+    @classmethod
+    def from_dict(cls, raw: dict) -> "GroupActivity":
+        stats = cls()
+        stats.last_hour = int(raw.get("last_hour", 0))
+        hours = raw.get("hours") or []
+        if len(hours) == RING_HOURS:
+            stats.hours = array("I", hours)
+        for day, registers in raw.get("days", []):
+            registers = base64.b64decode(registers)
+            if len(registers) == HLL_REGISTERS:
+                stats.sketch_days[int(day) % SKETCH_DAYS] = int(day)
+                stats.sketches[int(day) % SKETCH_DAYS] = HyperLogLog(registers)
+        return stats
+
+    def to_dict(self) -> dict:
+        return {
+            "last_hour": self.last_hour,
+            "hours": self.hours.tolist(),
+            "days": [
+                [day, base64.b64encode(sketch.registers).decode("ascii")]
+                for day, sketch in zip(self.sketch_days, self.sketches)
+                if day
+            ],
+        }
+
+
+def activity_report(stats: GroupActivity, now: float) -> str:
+    """“群活跃度”的文字版：最近 7 天 × 24 小时的热力图和去重发言人数。"""
+    today = datetime.fromtimestamp(now).date()
+    days = [today - timedelta(days=i) for i in range(SKETCH_DAYS - 1, -1, -1)]
+    grid = []
+    for day in days:
+        first = int(datetime.combine(day, datetime.min.time()).timestamp() // 3600)
+        grid.append([stats.messages_at(first + h) for h in range(24)])
+    peak = max(max(row) for row in grid)
+    if not peak:
+        return "本群最近 7 天还没有发言记录哦~"
+
+    def cell(n: int) -> str:
+        if not n:
+            return HEAT_LEVELS[0]
+        return HEAT_LEVELS[1 + min(len(HEAT_LEVELS) - 2, (n * (len(HEAT_LEVELS) - 1) - 1) // peak)]
+
+    by_hour = [sum(row[h] for row in grid) for h in range(24)]
+    busiest = max(range(24), key=by_hour.__getitem__)
+    today_ord = today.toordinal()
+    lines = [
+        "📊 本群最近 7 天活跃度（每格一小时）",
+        "        0     6     12    18",
+    ]
+    for day, row in zip(days, grid):
+        lines.append(f"{day:%m-%d}{_WEEKDAYS[day.weekday()]} " + "".join(cell(n) for n in row))
+    lines += [
+        f"今日：{sum(grid[-1])} 条消息，约 {stats.unique_users(today_ord, today_ord)} 人发言",
+        f"近 7 天：{sum(map(sum, grid))} 条消息，约 {stats.unique_users(today_ord - SKETCH_DAYS + 1, today_ord)} 人发言",
+        f"最热闹的时段：{busiest:02d}:00 - {busiest + 1:02d}:00（单小时最多 {peak} 条）",
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,321 @@
+import gzip
+import json
+import os
+import time
+from datetime import date, timedelta
+from typing import Iterable, Iterator
+
+from astrbot.api import logger
+
+from .metrics import observe_write
+# 记录标志位（列式存储里的 f 列）与内存记录共用
+from .record_store import FLAG_AUTO_SET, FLAG_BATCH, FLAG_FORCED, WifeRecord, to_epoch
+
+# 每天的归档按群号哈希分成若干个分区文件，查询单个群只需要读对应分区
+ARCHIVE_BUCKETS = 16
+
+
+def group_bucket(group_id: str) -> int:
+    gid = str(group_id)
+    if gid.isdigit():
+        return int(gid) % ARCHIVE_BUCKETS
+    return sum(gid.encode("utf-8")) % ARCHIVE_BUCKETS
+
+
+def encode_group_day(group_id: str, records: list[dict]) -> dict:
+    """把一个群一天的记录转成列式结构，重复的键名只存一次。"""
+    cols = {"g": str(group_id), "u": [], "w": [], "n": [], "t": [], "f": []}
+    for r in records:
+        if isinstance(r, WifeRecord):
+            cols["u"].append(str(r.user_id))
+            cols["w"].append(str(r.wife_id))
+            cols["n"].append(r.wife_name)
+            cols["t"].append(r.timestamp)
+            cols["f"].append(r.flags)
+            continue
+        flags = 0
+        if r.get("forced"):
+            flags |= FLAG_FORCED
+        if r.get("auto_set"):
+            flags |= FLAG_AUTO_SET
+        if r.get("batch"):
+            flags |= FLAG_BATCH
+        cols["u"].append(str(r.get("user_id")))
+        cols["w"].append(str(r.get("wife_id")))
+        cols["n"].append(str(r.get("wife_name", "")))
+        cols["t"].append(to_epoch(r.get("timestamp")))
+        cols["f"].append(flags)
+    return cols
+
+
+def decode_group_day(day: str, cols: dict) -> Iterator[dict]:
+    for uid, wid, name, ts, flags in zip(
+        cols["u"], cols["w"], cols["n"], cols["t"], cols["f"]
+    ):
+        record = {
+            "date": day,
+            "group_id": cols["g"],
+            "user_id": uid,
+            "wife_id": wid,
+            "wife_name": name,
+            "timestamp": ts,
+            "forced": bool(flags & FLAG_FORCED),
+            "auto_set": bool(flags & FLAG_AUTO_SET),
+        }
+        if flags & FLAG_BATCH:
+            record["batch"] = True
+        yield record
+
+
+def iter_dates(start: date, end: date) -> Iterator[date]:
+    d = start
+    while d <= end:
+        yield d
+        d += timedelta(days=1)
+
+
+class DrawArchive:
+    """按天、按群分区的历史抽取归档。
+
+    目录结构::
+
+        archive/
+          2026-10/
+            index.json          # {"groups": {gid: {"days": [1, 2, ...], "count": n}}}
+            01/b00.jsonl.gz     # 每行 "<gid>\\t<列式 JSON>"
+            01/b01.jsonl.gz
+            ...
+
+    查询时先读当月 index 找出该群有数据的日期，再只解压这些日期里对应分区的文件，
+    并且按行首群号跳过不相关的行，不做 JSON 解析。
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._index_cache: dict[str, tuple[float, dict]] = {}
+
+    # ---------- 路径 ----------
+    def _month_dir(self, month: str) -> str:
+        return os.path.join(self.root, month)
+
+    def _index_path(self, month: str) -> str:
+        return os.path.join(self._month_dir(month), "index.json")
+
+    def _partition_path(self, day: str, bucket: int) -> str:
+        return os.path.join(self._month_dir(day[:7]), day[8:10], f"b{bucket:02d}.jsonl.gz")
+
+    # ---------- 索引 ----------
+    def load_month_index(self, month: str) -> dict:
+        path = self._index_path(month)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return {"groups": {}}
+        cached = self._index_cache.get(month)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取归档索引失败 {path}: {e}")
+            return {"groups": {}}
+        self._index_cache[month] = (mtime, index)
+        return index
+
+    def _save_month_index(self, month: str, index: dict) -> None:
+        start = time.perf_counter()
+        path = self._index_path(month)
+        payload = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._index_cache.pop(month, None)
+        observe_write("archive_index", time.perf_counter() - start, len(payload))
+
+    def months(self) -> list[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if len(name) == 7 and name[4] == "-" and os.path.isdir(self._month_dir(name))
+        )
+
+    # ---------- 写入 ----------
+    def archive_day(self, day: str, groups: dict) -> int:
+        """归档某一天所有群的记录，返回写入的记录条数。
+
+        groups 为 {gid: 记录序列}，记录序列可以是 GroupRecords 或旧版的 {"records": [...]}。
+        同一天重复归档时以追加方式写入，查询时会合并同群的多行。
+        """
+        by_bucket: dict[int, list[str]] = {}
+        counts: dict[str, int] = {}
+        for gid, group in groups.items():
+            records = group.get("records", []) if isinstance(group, dict) else group
+            if not records:
+                continue
+            cols = encode_group_day(gid, records)
+            line = f"{gid}\t{json.dumps(cols, ensure_ascii=False, separators=(',', ':'))}\n"
+            by_bucket.setdefault(group_bucket(gid), []).append(line)
+            counts[str(gid)] = len(records)
+
+        if not counts:
+            return 0
+
+        start = time.perf_counter()
+        os.makedirs(os.path.dirname(self._partition_path(day, 0)), exist_ok=True)
+        appended = False
+        written = 0
+        for bucket, lines in by_bucket.items():
+            path = self._partition_path(day, bucket)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            appended = appended or bool(size)
+            # gzip 支持多 member 拼接，追加写不需要重写旧数据
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.writelines(lines)
+            written += os.path.getsize(path) - size
+        observe_write("archive", time.perf_counter() - start, written)
+
+        month = day[:7]
+        day_num = int(day[8:10])
+        index = self.load_month_index(month)
+        index = {
+            "groups": dict(index.get("groups", {})),
+            "dirty_days": list(index.get("dirty_days", [])),
+        }
+        if appended and day_num not in index["dirty_days"]:
+            # 追加写过的分区留给维护任务合并
+            index["dirty_days"].append(day_num)
+        for gid, n in counts.items():
+            entry = dict(index["groups"].get(gid, {"days": [], "count": 0}))
+            if day_num not in entry["days"]:
+                entry["days"] = sorted(entry["days"] + [day_num])
+            entry["count"] = entry.get("count", 0) + n
+            index["groups"][gid] = entry
+        self._save_month_index(month, index)
+        return sum(counts.values())
+
+    # ---------- 维护 ----------
+    def compact(self) -> int:
+        """合并被追加写过的分区（同群多行合为一行、多 gzip member 合为一个），返回重写的文件数。"""
+        rewritten = 0
+        for month in self.months():
+            index = self.load_month_index(month)
+            dirty = index.get("dirty_days") or []
+            if not dirty:
+                continue
+            for day_num in dirty:
+                day = f"{month}-{day_num:02d}"
+                for bucket in range(ARCHIVE_BUCKETS):
+                    if self._compact_partition(day, bucket):
+                        rewritten += 1
+            index = dict(index)
+            index["dirty_days"] = []
+            self._save_month_index(month, index)
+        return rewritten
+
+    def _compact_partition(self, day: str, bucket: int) -> bool:
+        path = self._partition_path(day, bucket)
+        if not os.path.exists(path):
+            return False
+        merged: dict[str, dict] = {}
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                gid, sep, payload = line.partition("\t")
+                if not sep:
+                    continue
+                cols = json.loads(payload)
+                if gid not in merged:
+                    merged[gid] = cols
+                    continue
+                for key in ("u", "w", "n", "t", "f"):
+                    merged[gid][key].extend(cols[key])
+        start = time.perf_counter()
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for gid, cols in merged.items():
+                f.write(f"{gid}\t{json.dumps(cols, ensure_ascii=False, separators=(',', ':'))}\n")
+        written = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        observe_write("archive", time.perf_counter() - start, written)
+        return True
+
+    def prune_before(self, cutoff: date) -> int:
+        """删除 cutoff 之前的归档天目录，返回删除的分区文件数。"""
+        removed = 0
+        for month in self.months():
+            if month > cutoff.strftime("%Y-%m"):
+                break
+            month_dir = self._month_dir(month)
+            index = self.load_month_index(month)
+            changed = False
+            for name in sorted(os.listdir(month_dir)):
+                if not name.isdigit():
+                    continue
+                if date.fromisoformat(f"{month}-{name}") >= cutoff:
+                    continue
+                day_dir = os.path.join(month_dir, name)
+                for fname in os.listdir(day_dir):
+                    os.remove(os.path.join(day_dir, fname))
+                    removed += 1
+                os.rmdir(day_dir)
+                day_num = int(name)
+                for entry in index.get("groups", {}).values():
+                    if day_num in entry.get("days", []):
+                        entry["days"].remove(day_num)
+                        changed = True
+            # 是否删整个月份目录看目录里还有没有天目录，不看索引（索引可能为空或已损坏）
+            entries = os.listdir(month_dir)
+            if not any(os.path.isdir(os.path.join(month_dir, name)) for name in entries):
+                for fname in entries:
+                    os.remove(os.path.join(month_dir, fname))
+                os.rmdir(month_dir)
+                self._index_cache.pop(month, None)
+            elif changed:
+                groups = {g: e for g, e in index.get("groups", {}).items() if e.get("days")}
+                self._save_month_index(month, {**index, "groups": groups})
+        return removed
+
+    # ---------- 读取 ----------
+    def _read_partition(self, day: str, bucket: int, group_ids: set[str] | None) -> Iterator[dict]:
+        path = self._partition_path(day, bucket)
+        if not os.path.exists(path):
+            return
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    gid, sep, payload = line.partition("\t")
+                    if not sep or (group_ids is not None and gid not in group_ids):
+                        continue
+                    yield from decode_group_day(day, json.loads(payload))
+        except Exception as e:
+            logger.warning(f"读取归档分区失败 {path}: {e}")
+
+    def iter_group_records(
+        self, group_id: str, start: date, end: date
+    ) -> Iterator[dict]:
+        """按时间顺序产出某群 [start, end] 内的历史记录，只读取相关分区。"""
+        gid = str(group_id)
+        bucket = group_bucket(gid)
+        wanted = {gid}
+        month = None
+        days: set[int] = set()
+        for d in iter_dates(start, end):
+            m = d.strftime("%Y-%m")
+            if m != month:
+                month = m
+                entry = self.load_month_index(m).get("groups", {}).get(gid)
+                days = set(entry["days"]) if entry else set()
+            if d.day in days:
+                yield from self._read_partition(d.isoformat(), bucket, wanted)
+
+    def iter_day(self, day: str, group_ids: Iterable[str] | None = None) -> Iterator[dict]:
+        """产出某一天的归档记录，group_ids 为空时读取全部分区。"""
+        if group_ids is None:
+            for bucket in range(ARCHIVE_BUCKETS):
+                yield from self._read_partition(day, bucket, None)
+            return
+        wanted = {str(g) for g in group_ids}
+        for bucket in sorted({group_bucket(g) for g in wanted}):
+            yield from self._read_partition(day, bucket, wanted)
@@ -9,9 +9,14 @@ _DEFAULT_KEYWORD_ROUTES: tuple[KeywordRoute, ...] = (
     KeywordRoute(keyword="强娶", action="force_marry"),
     KeywordRoute(keyword="关系图", action="show_graph"),
     KeywordRoute(keyword="羁绊图谱", action="show_graph"),
+    KeywordRoute(keyword="今日关系", action="graph_stats"),
+    KeywordRoute(keyword="关系分析", action="graph_stats"),
     KeywordRoute(keyword="rbq排行", action="rbq_ranking"),
     KeywordRoute(keyword="抽老婆帮助", action="show_help"),
     KeywordRoute(keyword="老婆插件帮助", action="show_help"),
+    KeywordRoute(keyword="本月老婆", action="monthly_wife"),
+    KeywordRoute(keyword="本群月报", action="group_monthly"),
+    KeywordRoute(keyword="群活跃度", action="group_activity"),
     KeywordRoute(
         keyword="重置记录",
         action="reset_records",
@@ -22,4 +27,14 @@ _DEFAULT_KEYWORD_ROUTES: tuple[KeywordRoute, ...] = (
         action="reset_force_cd",
         permission=PermissionLevel.ADMIN,
     ),
+    KeywordRoute(
+        keyword="全员分配",
+        action="batch_draw",
+        permission=PermissionLevel.ADMIN,
+    ),
+    KeywordRoute(
+        keyword="验证抽取",
+        action="verify_draws",
+        permission=PermissionLevel.ADMIN,
+    ),
 )
\ No newline at end of file
@@ -1,32 +1,372 @@
 import asyncio
+import random
 import time
 import os
-from datetime import datetime, timedelta
-from typing import Set
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import Awaitable, Callable, Hashable, Set
 
+from astrbot.api import logger
 from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
     AiocqhttpMessageEvent,
 )
 
 from ..onebot_api import extract_message_id
+from .metrics import metrics
+from .federation import group_key, scope_groups, scope_key, split_group_key
+from .activity_stats import GroupActivity
+from .record_store import ActivityTable, GroupRecords
+from .render_policy import (
+    BPP_SMOOTHING,
+    DEFAULT_BYTES_PER_PIXEL,
+    RenderPolicy,
+    process_image,
+)
+from .render_queue import PRIORITY_INTERACTIVE
+from .sampling import DrawWeighting, WeightedPool
 from .utils import (
-    save_json,
+    extract_target_id_from_message,
     normalize_user_id_set,
     is_allowed_group,
     resolve_member_name,
 )
 
+# 活跃池窗口：30 天内发言过的人才会进入老婆池
+ACTIVE_WINDOW_SECONDS = 30 * 24 * 3600
+# 加权抽取时拒绝采样的最大次数，超过后退回 O(n) 的全量加权抽取
+MAX_DRAW_REJECTIONS = 32
+# 每人最多记住的最近老婆条数（环形），同时限制了“不重复天数”的实际效果上限
+MAX_RECENT_WIVES = 64
+
+
+async def call_onebot_action(client, action: str, **params) -> object:
+    """带耗时统计的 call_action，按 action 名记录延迟与成功/失败。"""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        return await client.api.call_action(action, **params)
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        metrics.observe(
+            "onebot_call_seconds",
+            time.perf_counter() - start,
+            action=action,
+            status=status,
+        )
+
+
+async def fetch_group_members(event, group_id: str) -> list[dict]:
+    """获取群成员列表（仅 aiocqhttp），失败或其他平台时返回空列表。"""
+    if event.get_platform_name() != "aiocqhttp":
+        return []
+    try:
+        members = await call_onebot_action(
+            event.bot, "get_group_member_list", group_id=int(group_id)
+        )
+    except Exception as e:
+        logger.error(f"获取群成员列表失败，将使用缓存池: {e}")
+        return []
+    if isinstance(members, dict) and isinstance(members.get("data"), list):
+        members = members["data"]
+    return members if isinstance(members, list) else []
+
+
+def member_cache_seconds(plugin) -> int:
+    raw = plugin.config.get("member_cache_seconds", 300)
+    try:
+        return max(0, int(raw))
+    except Exception:
+        return 300
+
+
+async def group_member_names(plugin, event, group_id: str) -> dict[str, str] | None:
+    """带 TTL 缓存的群成员 {QQ号: 名片/昵称}；拿不到成员列表时返回 None。"""
+    now = time.monotonic()
+    cached = plugin._member_cache.get(group_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    members = await fetch_group_members(event, group_id)
+    if not members:
+        return None
+    names = {
+        str(m.get("user_id")): m.get("card") or m.get("nickname") or str(m.get("user_id"))
+        for m in members
+    }
+    plugin._member_cache[group_id] = (now + member_cache_seconds(plugin), names)
+    return names
+
+
+async def scope_member_names(plugin, event, group_id: str) -> tuple[dict[str, str], bool]:
+    """抽取范围内所有群的成员合集，返回 (成员 {QQ号: 名字}, 是否所有群都拿到了)。
+
+    未加入联盟时就是本群成员。合集只在某个群的缓存刷新后重建，
+    成员判断是一次字典查找，与联盟里有多少个群无关。
+    """
+    groups = scope_groups(plugin, group_id)
+    parts = [await group_member_names(plugin, event, gid) for gid in groups]
+    complete = all(p is not None for p in parts)
+    if len(groups) == 1:
+        return parts[0] or {}, complete
+
+    key = scope_key(plugin, group_id)
+    # 各群缓存的过期时刻作为版本号，任一群刷新后重建合集
+    versions = tuple(
+        plugin._member_cache[gid][0] if gid in plugin._member_cache else None for gid in groups
+    )
+    cached = plugin._member_cache.get(key)
+    if cached and cached[0] == versions:
+        return cached[1], complete
+    merged: dict[str, str] = {}
+    # 当前群放在最后，同一个人优先显示在本群的名片
+    for gid, part in sorted(zip(groups, parts), key=lambda gp: gp[0] == str(group_id)):
+        if part:
+            merged.update(part)
+    plugin._member_cache[key] = (versions, merged)
+    return merged, complete
+
+
+async def _timed_html_render(
+    plugin, name: str, tmpl: str, data: dict, options: dict | None, return_url: bool = True
+) -> str:
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        return await plugin.html_render(tmpl, data, return_url=return_url, options=options)
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        metrics.observe(
+            "html_render_seconds",
+            time.perf_counter() - start,
+            template=name,
+            status=status,
+        )
+
+
+async def render_html(
+    plugin,
+    name: str,
+    tmpl: str,
+    data: dict,
+    options: dict | None = None,
+    *,
+    key: Hashable | None = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> str:
+    """经渲染调度器执行的 html_render，name 用于区分模板（关系图 / rbq 排行 / 调试）。
+
+    key 相同的请求在执行期间只渲染一次，所有请求者拿到同一张图；不传 key 则不合并。
+    """
+
+    async def run() -> str:
+        return await _timed_html_render(plugin, name, tmpl, data, options)
+
+    if key is None:
+        key = object()
+    return await plugin.render_scheduler.submit(key, run, name=name, priority=priority)
+
+
+async def render_image(
+    plugin,
+    name: str,
+    tmpl: str,
+    data: dict,
+    *,
+    width: int,
+    height: int,
+    key: Hashable | None = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> str:
+    """按输出策略渲染图片，返回本地文件路径。
+
+    缩放档位按模板的历史每像素字节数和字节预算选择；渲染出的 PNG 先裁掉空白，
+    再按策略转成 PNG / JPEG / WebP。裁剪和编码在线程里完成，也在调度器的同一个任务里，
+    合并的请求共享最终文件。
+    """
+    policy = RenderPolicy.from_config(plugin.config)
+    bpp = plugin._render_bytes_per_pixel.get(name, DEFAULT_BYTES_PER_PIXEL)
+    level, factor = policy.choose_scale(bpp, width, height)
+    options = policy.screenshot_options(level, width, height)
+
+    async def run() -> str:
+        start = time.perf_counter()
+        raw_path = await _timed_html_render(plugin, name, tmpl, data, options, return_url=False)
+        render_seconds = time.perf_counter() - start
+        path, info = await asyncio.to_thread(process_image, raw_path, policy)
+
+        # 第一次直接采用实测值，之后做指数平均
+        observed = info["bytes"] / (width * height * factor * factor)
+        estimates = plugin._render_bytes_per_pixel
+        estimates[name] = bpp + BPP_SMOOTHING * (observed - bpp) if name in estimates else observed
+        metrics.observe("render_encode_seconds", info["encode_seconds"], template=name)
+        metrics.inc("render_output_bytes_total", info["bytes"], template=name, format=info["format"])
+        metrics.set_gauge("render_output_last_bytes", info["bytes"], template=name)
+        size = info.get("size") or info.get("rendered_size") or ("?", "?")
+        logger.info(
+            f"[抽老婆] 渲染 {name}: {level} 档 {size[0]}x{size[1]} {info['format']}"
+            f"{'' if info['quality'] is None else ' q' + str(info['quality'])} "
+            f"{info['bytes'] / 1024:.0f}KB（原图 {info['raw_bytes'] / 1024:.0f}KB），"
+            f"渲染 {render_seconds:.2f}s，裁剪编码 {info['encode_seconds']:.2f}s"
+        )
+        return path
+
+    if key is None:
+        key = object()
+    return await plugin.render_scheduler.submit(key, run, name=name, priority=priority)
+
+
+def render_deadline_seconds(plugin) -> float:
+    try:
+        return max(0.0, float(plugin.config.get("render_deadline_seconds", 8)))
+    except Exception:
+        return 8.0
+
+
+def render_max_queue(plugin) -> int:
+    try:
+        return max(0, int(plugin.config.get("render_max_queue", 6)))
+    except Exception:
+        return 6
+
+
+def render_late_image_enabled(plugin) -> bool:
+    return bool(plugin.config.get("render_late_image", True))
+
+
+def _record_late_success(breaker, task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is None:
+        breaker.record_success()
+
+
+async def guarded_render(
+    plugin, name: str, render: Callable[[], Awaitable[str]]
+) -> tuple[str | None, asyncio.Task | None]:
+    """带降级的渲染，返回 (图片, 未完成的渲染任务)。
+
+    - 渲染队列过深或熔断打开时不发起渲染，直接返回 (None, None)；
+    - 超过时限返回 (None, 任务)，任务继续在后台执行，调用方可选择稍后补发图片；
+    - 渲染出错返回 (None, None)。
+    调用方拿不到图片时应回复文字版本。
+    """
+    scheduler, breaker = plugin.render_scheduler, plugin.render_breaker
+    max_queue = render_max_queue(plugin)
+    if max_queue and scheduler.queue_depth >= max_queue:
+        metrics.inc("render_shed_total", template=name, reason="queue")
+        return None, None
+    if not breaker.allow():
+        metrics.inc("render_shed_total", template=name, reason="breaker")
+        return None, None
+
+    task = asyncio.create_task(render())
+    deadline = render_deadline_seconds(plugin)
+    try:
+        path = await asyncio.wait_for(asyncio.shield(task), deadline or None)
+    except asyncio.TimeoutError:
+        # 超时算一次失败；之后这次渲染成功完成会把熔断计数清零
+        breaker.record_failure()
+        task.add_done_callback(partial(_record_late_success, breaker))
+        metrics.inc("render_shed_total", template=name, reason="deadline")
+        logger.warning(f"渲染 {name} 超过 {deadline:g}s，先回复文字版")
+        return None, task
+    except Exception as e:
+        breaker.record_failure()
+        metrics.inc("render_shed_total", template=name, reason="error")
+        logger.error(f"渲染 {name} 失败: {e}")
+        return None, None
+    breaker.record_success()
+    return path, None
+
+
+def send_late_image(plugin, event, task: asyncio.Task) -> None:
+    """超时的渲染完成后补发图片（失败则放弃，文字版已经回复过了）。"""
+
+    async def _runner():
+        try:
+            path = await task
+            await event.send(event.image_result(path))
+        except Exception as e:
+            logger.warning(f"补发图片失败: {e}")
+
+    plugin._start_background_task(_runner())
+
+
+def graph_render_args(
+    plugin, group_id: str, group_name: str, user_map: dict, records: GroupRecords
+) -> tuple[str, dict, int, int]:
+    """关系图的 (模板, 渲染数据, 宽, 高)，供“关系图”指令和每日日报共用。
+
+    模板文件缺失时抛出 FileNotFoundError；vis-network 脚本缺失只记录错误。
+    """
+    vis_js_path = os.path.join(plugin.curr_dir, "vis-network.min.js")
+    vis_js_content = ""
+    if os.path.exists(vis_js_path):
+        with open(vis_js_path, "r", encoding="utf-8") as f:
+            vis_js_content = f.read()
+    else:
+        logger.error(f"找不到 JS 文件: {vis_js_path}")
+
+    template_path = os.path.join(plugin.curr_dir, "graph_template.html")
+    if not os.path.exists(template_path):
+        raise FileNotFoundError(2, "graph template not found", template_path)
+    with open(template_path, "r", encoding="utf-8") as f:
+        graph_html = f.read()
+
+    # 根据节点数量动态计算高度，避免拥挤（从左上角开始裁剪）
+    node_count = len({r.user_id for r in records} | {r.wife_id for r in records})
+    height = 1080 + (max(0, node_count - 10) * 60)
+    data = {
+        "vis_js_content": vis_js_content,
+        "group_id": group_id,
+        "group_name": group_name,
+        "user_map": user_map,
+        "records": records.to_list(),
+        "iterations": plugin.config.get("iterations", 140),
+    }
+    return graph_html, data, 1920, height
+
+
+def graph_fallback_text(group_name: str, records: GroupRecords, user_map: dict, limit: int) -> str:
+    """关系图的文字版：按抽取者列出今天的老婆，互相抽中的标 ❤。"""
+    wives: dict[str, list[str]] = {}
+    for r in records:
+        wives.setdefault(str(r.user_id), []).append(str(r.wife_id))
+    graph = records.graph
+
+    def name(uid: str) -> str:
+        return user_map.get(uid) or graph.name(uid)
+
+    lines = [f"🌸 群 {group_name} 今日老婆关系（文字版）"]
+    for uid, wife_ids in wives.items():
+        targets = "、".join(
+            f"【{name(w)}】" + ("❤" if uid in wives.get(w, ()) else "") for w in wife_ids
+        )
+        lines.append(f"【{name(uid)}】→ {targets}")
+    if len(lines) > limit + 1:
+        lines = lines[: limit + 1] + [f"……等共 {len(wives)} 人"]
+    return "\n".join(lines)
+
+
+def ranking_fallback_text(title: str, ranking: list[dict]) -> str:
+    lines = [f"{title}（文字版）"]
+    for user in ranking:
+        lines.append(f"{user['rank']}. {user['name']} —— {user['count']} 次")
+    return "\n".join(lines)
+
 
 async def send_onebot_message(plugin, event, *, message: list[dict]) -> object:
     assert isinstance(event, AiocqhttpMessageEvent)
 
     group_id = event.get_group_id()
     if group_id:
-        resp = await event.bot.api.call_action(
-            "send_group_msg", group_id=int(group_id), message=message
+        resp = await call_onebot_action(
+            event.bot, "send_group_msg", group_id=int(group_id), message=message
         )
     else:
-        resp = await event.bot.api.call_action(
+        resp = await call_onebot_action(
+            event.bot,
             "send_private_msg",
             user_id=int(event.get_sender_id()),
             message=message,
@@ -46,7 +386,7 @@ def schedule_onebot_delete_msg(plugin, client, *, message_id: object) -> None:
     async def _runner():
         await asyncio.sleep(delay)
         try:
-            await client.api.call_action("delete_msg", message_id=message_id)
+            await call_onebot_action(client, "delete_msg", message_id=message_id)
         except Exception as e:
             plugin.logger = getattr(plugin, "logger", None)
             if plugin.logger:
@@ -57,38 +397,143 @@ def schedule_onebot_delete_msg(plugin, client, *, message_id: object) -> None:
     task.add_done_callback(plugin._withdraw_tasks.discard)
 
 
+def is_duplicate_event(plugin, event, path: str) -> bool:
+    """同一条消息（按 bot、群、消息 id）在同一处理路径上是否已经处理过。
+
+    path 区分处理路径：记录活跃与执行指令各自去重，同一条消息两者都会执行一次；
+    关键词触发和 @filter.command 共用 "command"，同一条消息只执行一次指令。
+    拿不到消息 id 时不去重。
+    """
+    message_id = getattr(getattr(event, "message_obj", None), "message_id", None)
+    if not message_id:
+        return False
+    key = (path, str(event.get_self_id()), str(event.get_group_id() or ""), str(message_id))
+    if plugin._event_dedup.seen(key):
+        metrics.inc("event_dedup_hits_total", path=path)
+        return True
+    return False
+
+
+def record_event(plugin, event) -> None:
+    """录制一条消息的匿名元数据（开启 event_record_enabled 时），动作按指令 / 关键词路由分类。"""
+    # 协议端重投的同一条消息只录一次，否则回放会高估负载
+    if is_duplicate_event(plugin, event, "record"):
+        return
+    message = event.message_str or ""
+    wake = bool(getattr(event, "is_at_or_wake_command", False))
+    router = plugin._keyword_router
+    if wake:
+        route = router.match_command_route(message)
+    elif plugin.config.get("keyword_trigger_enabled", False):
+        route = router.match_route(
+            message, mode=plugin._get_keyword_trigger_mode()
+        ) or router.match_command_route(message)
+    else:
+        route = None
+    action = route.action if route else ""
+    at = extract_target_id_from_message(event) if action == "force_marry" else None
+    plugin._event_recorder.record(
+        str(event.get_group_id() or ""),
+        str(event.get_sender_id()),
+        action,
+        at or "",
+        admin=event.is_admin(),
+        wake=wake,
+    )
+
+
+def register_bot(plugin, bot_id: str) -> None:
+    """登记接入的机器人账号；第一次见到时把它从已加载的活跃池中移除（可能先被其他账号记为群友）。"""
+    if not bot_id or bot_id in plugin._bot_ids:
+        return
+    plugin._bot_ids.add(bot_id)
+    for key, active in plugin.active_users.loaded_items():
+        if active.pop(bot_id, None) is not None:
+            plugin.active_users.mark_dirty(key)
+
+
 def record_active(plugin, event) -> None:
+    # 多账号接入时每个账号都会收到事件，借此登记所有机器人账号
+    bot_id = str(event.get_self_id() or "")
+    register_bot(plugin, bot_id)
     group_id = event.get_group_id()
     if not group_id or not is_allowed_group(str(group_id), plugin.config):
         return
-
-    user_id, bot_id = str(event.get_sender_id()), str(event.get_self_id())
-    if user_id == bot_id or user_id == "0":
+    # keyword_trigger 与 track_active 都会记录活跃，协议端重连也可能重投同一条消息
+    if is_duplicate_event(plugin, event, "active"):
         return
 
-    group_key = str(group_id)
-    if group_key not in plugin.active_users:
-        plugin.active_users[group_key] = {}
-    plugin.active_users[group_key][user_id] = time.time()
-    # preserve original save_json call as-is
-    save_json(plugin.active_file, plugin.active_users, plugin.records_file, plugin.config)
-
+    user_id = str(event.get_sender_id())
+    # 同一群里的其他机器人账号发言也不计入活跃
+    if user_id in plugin._bot_ids or user_id == "0":
+        return
 
-def clean_rbq_stats(plugin) -> None:
+    # 加入群联盟的群共用一个活跃池，写入时直接记到联盟键下，抽取时无需合并
+    scope = scope_key(plugin, str(group_id), bot_id)
     now = time.time()
+    active = plugin.active_users.get(scope)
+    if active is None:
+        active = plugin.active_users[scope] = ActivityTable()
+    active[user_id] = now
+    counts = plugin.message_counts.setdefault(scope, {})
+    counts[user_id] = counts.get(user_id, 0) + 1
+    # 只标记脏分片，由定时 flush 批量落盘，避免每条消息都写文件
+    plugin.active_users.mark_dirty(scope)
+    plugin.message_counts.mark_dirty(scope)
+
+    # 群活跃度按实际的群统计，不合并联盟
+    stats_key = group_key(plugin, str(group_id), bot_id)
+    stats = plugin.activity_stats.get(stats_key)
+    if stats is None:
+        stats = plugin.activity_stats[stats_key] = GroupActivity()
+    stats.record(user_id, now)
+    plugin.activity_stats.mark_dirty(stats_key)
+
+    # 该群已有加权抽样池时 O(log n) 更新发言者的权重
+    pool = plugin._draw_pools.get(scope)
+    if pool is not None:
+        if pool.weighting.needs_rebase(now, pool.origin):
+            del plugin._draw_pools[scope]
+        else:
+            pool.set(user_id, pool.weighting.weight(now, counts[user_id], pool.origin))
+
+
+# rbq 排行统计的时间窗口
+RBQ_WINDOW_SECONDS = 30 * 24 * 3600
+
+
+def rbq_counts(users: dict, now: float) -> list[tuple[str, int]]:
+    """某群近 30 天被强娶次数，按次数从大到小排序（全量清理由维护任务执行，这里只过滤）。"""
+    cutoff = now - RBQ_WINDOW_SECONDS
+    counts = []
+    for uid, ts_list in users.items():
+        n = sum(1 for ts in ts_list if ts >= cutoff)
+        if n:
+            counts.append((uid, n))
+    counts.sort(key=lambda item: item[1], reverse=True)
+    return counts
+
+
+def clean_rbq_stats(plugin) -> int:
+    """清理过期 / 已沉寂用户的被强娶记录，返回删除的记录条数。"""
+    now = time.time()
+    removed = 0
     thirty_days = 30 * 24 * 3600
     seven_days = 7 * 24 * 3600
     five_days = 5 * 24 * 3600 # 新增 5 天逻辑
 
-    new_stats = {}
-    for gid, users in plugin.rbq_stats.items():
+    for gid in list(plugin.rbq_stats.keys()):
+        users = plugin.rbq_stats[gid]
         new_users = {}
-        active_group = plugin.active_users.get(gid, {})
+        # rbq 统计按群（带账号前缀）存储，活跃池按抽取范围存储（联盟共用一个）
+        self_id, group_id = split_group_key(gid)
+        active_group = plugin.active_users.get(scope_key(plugin, group_id, self_id), {})
 
         for uid, timestamps in users.items():
             # 1. 只保留 30 天内的强娶记录
             valid_ts = [ts for ts in timestamps if now - ts < thirty_days]
             count = len(valid_ts)
+            removed += len(timestamps) - count
 
             if count == 0:
                 continue # 没有记录直接跳过，不加入 new_users
@@ -117,33 +562,211 @@ def clean_rbq_stats(plugin) -> None:
 
             if should_keep:
                 new_users[uid] = valid_ts
+            else:
+                removed += count
 
-        if new_users:
-            new_stats[gid] = new_users
+        if not new_users:
+            del plugin.rbq_stats[gid]
+        elif new_users != users:
+            plugin.rbq_stats[gid] = new_users
 
-    plugin.rbq_stats = new_stats
-    save_json(plugin.rbq_stats_file, plugin.rbq_stats)
+    plugin.rbq_stats.flush()
+    return removed
 
 
 def draw_excluded_users(plugin) -> Set[str]:
-    return normalize_user_id_set(plugin.config.get("excluded_users", []))
+    # 接入的所有机器人账号都自动排除，不必手动写进配置
+    return normalize_user_id_set(plugin.config.get("excluded_users", [])) | plugin._bot_ids
 
 
 def force_marry_excluded_users(plugin) -> Set[str]:
-    return normalize_user_id_set(plugin.config.get("force_marry_excluded_users", []))
+    return normalize_user_id_set(plugin.config.get("force_marry_excluded_users", [])) | plugin._bot_ids
+
+
+def draw_weighting(plugin) -> DrawWeighting:
+    try:
+        return DrawWeighting(
+            str(plugin.config.get("draw_weight_mode", "uniform")),
+            float(plugin.config.get("draw_recency_half_life_hours", 72)),
+            float(plugin.config.get("draw_activity_exponent", 0.5)),
+        )
+    except Exception:
+        return DrawWeighting()
+
+
+def get_draw_pool(plugin, group_id: str, weighting: DrawWeighting) -> WeightedPool:
+    """取该群的加权抽样池，不存在或权重配置变化时按当前活跃数据重建（O(n)）。"""
+    pool = plugin._draw_pools.get(group_id)
+    if pool is not None and pool.weighting.key == weighting.key:
+        return pool
+
+    cutoff = time.time() - ACTIVE_WINDOW_SECONDS
+    active = {
+        uid: ts for uid, ts in plugin.active_users.get(group_id, {}).items() if ts >= cutoff
+    }
+    counts = plugin.message_counts.get(group_id, {})
+    # 以最近一次发言为基准，已有权重都落在 (0, 1]
+    origin = max(active.values(), default=time.time())
+    pool = WeightedPool(
+        {
+            uid: weighting.weight(ts, counts.get(uid, 0), origin)
+            for uid, ts in active.items()
+        },
+        weighting=weighting,
+        origin=origin,
+    )
+    plugin._draw_pools[group_id] = pool
+    return pool
+
+
+def pick_wife(plugin, group_id: str, accept: Callable[[str], bool]) -> str | None:
+    """按配置的权重曲线从该群活跃池中抽一人，accept 决定候选人是否可被抽中。
+
+    加权模式下先在树状数组上做 O(log n) 抽样并拒绝不可选的人，
+    多次失败（可选的人很少）时退回对可选候选人做一次 O(n) 的加权抽取，分布不变。
+    """
+    weighting = draw_weighting(plugin)
+    cutoff = time.time() - ACTIVE_WINDOW_SECONDS
+    active = plugin.active_users.get(group_id, {})
+
+    if weighting.mode == "uniform":
+        pool = [uid for uid, ts in active.items() if ts >= cutoff and accept(uid)]
+        return random.choice(pool) if pool else None
+
+    pool = get_draw_pool(plugin, group_id, weighting)
+    for _ in range(MAX_DRAW_REJECTIONS):
+        uid = pool.sample()
+        if uid is None:
+            break
+        ts = active.get(uid)
+        if ts is None or ts < cutoff:
+            # 已过期或被清理的人顺手移出抽样池
+            pool.discard(uid)
+            continue
+        if accept(uid):
+            return uid
+
+    counts = plugin.message_counts.get(group_id, {})
+    candidates = [uid for uid, ts in active.items() if ts >= cutoff and accept(uid)]
+    if not candidates:
+        return None
+    weights = [
+        weighting.weight(active[uid], counts.get(uid, 0), pool.origin) for uid in candidates
+    ]
+    return random.choices(candidates, weights)[0]
+
+
+def no_repeat_days(plugin) -> int:
+    raw = plugin.config.get("no_repeat_days", 0)
+    try:
+        return max(0, int(raw))
+    except Exception:
+        return 0
+
+
+def recent_wives(plugin, group_id: str, user_id: str) -> set[str]:
+    """该用户在“不重复天数”内抽到过的老婆；未开启时返回空集合（不加载分片）。"""
+    days = no_repeat_days(plugin)
+    if not days:
+        return set()
+    ring = plugin.recent_wives.get(group_id, {}).get(user_id)
+    if not ring:
+        return set()
+    first_day = current_date(plugin).toordinal() - days
+    return {wife_id for day, wife_id in ring if day > first_day}
+
+
+def remember_wife(plugin, group_id: str, user_id: str, wife_id: str) -> None:
+    """把抽到的老婆写入该用户的最近老婆环，超出容量时丢弃最旧的一条。"""
+    days = no_repeat_days(plugin)
+    if not days:
+        return
+    capacity = min(MAX_RECENT_WIVES, days * max(1, int(plugin.config.get("daily_limit", 1))))
+    ring = plugin.recent_wives.setdefault(group_id, {}).setdefault(user_id, [])
+    ring.append([current_date(plugin).toordinal(), wife_id])
+    if len(ring) > capacity:
+        del ring[: len(ring) - capacity]
+    # 与当天记录一起在下次 flush 时落盘
+    plugin.recent_wives.mark_dirty(group_id)
+
+
+def archive_records(plugin) -> int:
+    """把 plugin.records 中（非今天的）整天记录写入历史归档。"""
+    day = plugin.records.date
+    groups = plugin.records.groups
+    if not day or not groups:
+        return 0
+    try:
+        count = plugin.archive.archive_day(day, groups)
+    except Exception as e:
+        logger.error(f"归档 {day} 的抽取记录失败: {e}")
+        return 0
+    logger.info(f"已归档 {day} 的抽取记录 {count} 条（{len(groups)} 个群）")
+    return count
+
+
+def day_rollover_hour(plugin) -> int:
+    raw = plugin.config.get("day_rollover_hour", 0)
+    try:
+        return min(23, max(0, int(raw)))
+    except Exception:
+        return 0
+
+
+def current_date(plugin, now: float | None = None) -> date:
+    """插件意义上的“今天”：本地时间减去换日时刻偏移后的日期。"""
+    dt = datetime.fromtimestamp(time.time() if now is None else now)
+    return (dt - timedelta(hours=day_rollover_hour(plugin))).date()
+
+
+def current_day(plugin, now: float | None = None) -> str:
+    return current_date(plugin, now).isoformat()
+
+
+def next_rollover_ts(plugin, now: float | None = None) -> float:
+    next_day = current_date(plugin, now) + timedelta(days=1)
+    boundary = datetime.combine(next_day, datetime.min.time()) + timedelta(
+        hours=day_rollover_hour(plugin)
+    )
+    return boundary.timestamp()
+
+
+def rollover_records(plugin) -> int:
+    """换日：归档旧记录并原子地换成今天的空记录，返回归档条数。
+
+    整个过程没有 await，对事件循环内的其他处理器来说是原子的。
+    """
+    today = current_day(plugin)
+    archived = 0
+    if plugin.records.date != today:
+        archived = archive_records(plugin)
+        # 立即落盘，避免重启后把已归档的旧记录再归档一次
+        plugin.records.reset(today)
+    plugin._next_rollover_ts = next_rollover_ts(plugin)
+    return archived
 
 
 def ensure_today_records(plugin) -> None:
-    today = datetime.now().strftime("%Y-%m-%d")
-    if plugin.records.get("date") != today:
-        plugin.records = {"date": today, "groups": {}}
+    # 正常情况下换日由维护任务在换日时刻完成，这里只做一次浮点比较兜底
+    if time.time() >= plugin._next_rollover_ts:
+        rollover_records(plugin)
 
 
-def get_group_records(plugin, group_id: str) -> list:
+def get_group_records(plugin, group_id: str) -> GroupRecords:
     ensure_today_records(plugin)
-    if group_id not in plugin.records["groups"]:
-        plugin.records["groups"][group_id] = {"records": []}
-    return plugin.records["groups"][group_id]["records"]
+    return plugin.records.ensure_group(group_id)
+
+
+def iter_group_history(plugin, group_id: str, start: date, end: date):
+    """按时间顺序产出某群 [start, end] 的记录：历史部分读归档，今天的读内存。"""
+    today = current_date(plugin)
+    if start < today:
+        yield from plugin.archive.iter_group_records(
+            group_id, start, min(end, today - timedelta(days=1))
+        )
+    if start <= today <= end and plugin.records.date == today.isoformat():
+        for r in plugin.records.group_records(group_id):
+            yield {"date": today.isoformat(), "group_id": group_id, **r.to_dict()}
 
 
 def auto_set_other_half_enabled(plugin) -> bool:
@@ -167,12 +790,98 @@ def can_onebot_withdraw(plugin, event) -> bool:
     return auto_withdraw_enabled(plugin) and event.get_platform_name() == "aiocqhttp"
 
 
-def cleanup_inactive(plugin, group_id: str):
+def cleanup_inactive(plugin, group_id: str, save: bool = True) -> int:
+    """移除该群 30 天未发言的用户，返回移除人数。"""
     if group_id not in plugin.active_users:
-        return
-    now, limit = time.time(), 30 * 24 * 3600
+        return 0
     active_group = plugin.active_users[group_id]
-    new_active = {uid: ts for uid, ts in active_group.items() if (now - ts < limit) and uid != "0"}
-    if len(active_group) != len(new_active):
-        plugin.active_users[group_id] = new_active
-        save_json(plugin.active_file, plugin.active_users)
+    removed = active_group.prune(time.time() - ACTIVE_WINDOW_SECONDS)
+    if active_group.pop("0", None) is not None:
+        removed += 1
+    if removed:
+        plugin.active_users.mark_dirty(group_id)
+        if save:
+            plugin.active_users.flush()
+    return removed
+
+
+def collect_state_metrics(plugin, registry) -> None:
+    """导出前采集仪表盘：各群活跃池大小、待撤回任务数、各类状态规模。
+
+    只统计已加载到内存的分片，采集本身不会触发磁盘读取。
+    """
+    registry.clear_gauge("active_pool_size")
+    for gid, users in plugin.active_users.loaded_items():
+        registry.set_gauge("active_pool_size", len(users), group=gid)
+
+    registry.set_gauge("withdraw_tasks_pending", len(plugin._withdraw_tasks))
+
+    registry.set_gauge(
+        "state_entries",
+        sum(len(g) for _, g in plugin.records.groups.loaded_items()),
+        kind="records",
+    )
+    registry.set_gauge(
+        "state_entries",
+        sum(len(users) for _, users in plugin.active_users.loaded_items()),
+        kind="active_users",
+    )
+    registry.set_gauge(
+        "state_entries",
+        sum(len(users) for _, users in plugin.forced_records.loaded_items()),
+        kind="forced_records",
+    )
+    registry.set_gauge(
+        "state_entries",
+        sum(len(ts) for _, users in plugin.rbq_stats.loaded_items() for ts in users.values()),
+        kind="rbq_stats",
+    )
+    registry.set_gauge(
+        "state_entries",
+        sum(len(users) for _, users in plugin.message_counts.loaded_items()),
+        kind="message_counts",
+    )
+    registry.set_gauge(
+        "state_entries",
+        sum(len(ring) for _, users in plugin.recent_wives.loaded_items() for ring in users.values()),
+        kind="recent_wives",
+    )
+    registry.set_gauge("event_dedup_entries", len(plugin._event_dedup))
+    for level, limiter in zip(("user", "group"), plugin._rate_limiters):
+        registry.set_gauge("rate_limit_buckets", len(limiter), level=level)
+    registry.set_gauge("render_queue", plugin.render_scheduler.queue_depth, state="queued")
+    registry.set_gauge("render_queue", plugin.render_scheduler.in_flight, state="running")
+    for name, store in plugin._state_stores().items():
+        registry.set_gauge("state_shards", len(store), kind=name, state="total")
+        registry.set_gauge("state_shards", len(store.loaded_items()), kind=name, state="loaded")
+        registry.set_gauge("state_shards", store.dirty_count, kind=name, state="dirty")
+
+
+def metrics_export_interval_seconds(plugin) -> int:
+    raw = plugin.config.get("metrics_export_interval_seconds", 60)
+    try:
+        return max(0, int(raw))
+    except Exception:
+        return 60
+
+
+def http_api_port(plugin) -> int:
+    try:
+        port = int(plugin.config.get("http_api_port", 0))
+    except Exception:
+        return 0
+    return port if 0 < port < 65536 else 0
+
+
+async def metrics_export_loop(plugin) -> None:
+    """周期性把指标写入数据目录下的 Prometheus textfile。"""
+    interval = metrics_export_interval_seconds(plugin)
+    if interval <= 0:
+        return
+    path = os.path.join(plugin.data_dir, "metrics.prom")
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            metrics.write_textfile(path)
+        except Exception as e:
+            logger.warning(f"写入指标文件失败: {e}")
@@ -112,7 +112,7 @@ async def run_debug_graph(plugin_instance, event):
 
     # 3. 调用插件实例的渲染 API
     try:
-        url = await plugin_instance.html_render(template_content, {
+        url = await plugin_instance._html_render("debug_graph", template_content, {
             "group_name": "Debug Group",
             "records": mock_records,
             "user_map": mock_user_map,
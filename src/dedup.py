@@ -0,0 +1,46 @@
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+# 最多记住的事件数，超出时淘汰最早的
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class EventDeduper:
+    """有界的 TTL + LRU 去重集合：同一个键在 ttl 秒内第二次出现即视为重复。
+
+    插入顺序即时间顺序，过期项总在队头，``seen`` 均摊 O(1)。
+    """
+
+    __slots__ = ("ttl", "max_entries", "_entries", "hits", "misses")
+
+    def __init__(self, ttl_seconds: float = 120.0, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = max(0.0, float(ttl_seconds))
+        self.max_entries = max(1, int(max_entries))
+        self._entries: OrderedDict[Hashable, float] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def seen(self, key: Hashable) -> bool:
+        """记录 key；返回 True 表示 ttl 内已经出现过（重复事件）。"""
+        if not self.ttl:
+            return False
+        now = time.monotonic()
+        entries = self._entries
+        while entries:
+            oldest_key, oldest_ts = next(iter(entries.items()))
+            if now - oldest_ts < self.ttl:
+                break
+            entries.popitem(last=False)
+
+        if key in entries:
+            self.hits += 1
+            return True
+        self.misses += 1
+        entries[key] = now
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return False
+
+    def __len__(self) -> int:
+        return len(self._entries)
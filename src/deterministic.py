@@ -0,0 +1,94 @@
+import hashlib
+import hmac
+import random
+import time
+from typing import Callable, Iterable
+
+from .core import ACTIVE_WINDOW_SECONDS, current_date, current_day, no_repeat_days
+
+
+def draw_secret(plugin) -> bytes:
+    """确定性抽取的密钥，未配置时返回空（使用普通随机抽取）。"""
+    return str(plugin.config.get("deterministic_draw_secret", "") or "").strip().encode("utf-8")
+
+
+def _digest(secret: bytes, *parts: object) -> bytes:
+    message = "\x1f".join(str(p) for p in parts).encode("utf-8")
+    return hmac.new(secret, message, hashlib.sha256).digest()
+
+
+def canonical_order(user_ids: Iterable[str]) -> list[str]:
+    """与存储顺序无关的规范顺序：按 QQ 号数值排序，非数字 ID 排在后面。"""
+    return sorted(
+        {str(uid) for uid in user_ids},
+        key=lambda uid: (0, len(uid), uid) if uid.isdigit() else (1, 0, uid),
+    )
+
+
+def eligible_pool(plugin, scope: str, accept: Callable[[str], bool]) -> list[str]:
+    cutoff = time.time() - ACTIVE_WINDOW_SECONDS
+    active = plugin.active_users.get(scope, {})
+    return canonical_order(uid for uid, ts in active.items() if ts >= cutoff and accept(uid))
+
+
+def deterministic_pick(
+    plugin, scope: str, user_id: str, index: int, accept: Callable[[str], bool]
+) -> str | None:
+    """第 index 次抽取 = HMAC(密钥, 日期 | 范围 | 抽取者 | 次序) 在规范顺序的候选池里取模。
+
+    不依赖进程内随机状态：同一天、同一候选池下任何实例都能算出同一个结果。
+    按时间衰减的权重在复算时无法还原，确定性模式下总是等概率抽取。
+    """
+    pool = eligible_pool(plugin, scope, accept)
+    if not pool:
+        return None
+    digest = _digest(draw_secret(plugin), current_day(plugin), scope, user_id, index)
+    # 64 位取模，候选池远小于 2^64，偏差可以忽略
+    return pool[int.from_bytes(digest[:8], "big") % len(pool)]
+
+
+def seeded_rng(plugin, scope: str, purpose: str, *parts: object) -> random.Random:
+    """全员分配等批量操作用的可复现随机数发生器。"""
+    digest = _digest(draw_secret(plugin), current_day(plugin), scope, purpose, *parts)
+    return random.Random(int.from_bytes(digest, "big"))
+
+
+def recompute_draws(
+    plugin, scope: str, records, accept: Callable[[str], bool]
+) -> tuple[int, list[tuple[str, str, str]]]:
+    """按今天的记录逐条复算普通抽取，返回 (复算条数, [(抽取者, 记录的老婆, 复算的老婆)])。
+
+    强娶、“自动设置对方老婆”和全员分配（整批播种）的记录不参与逐条复算；
+    候选池按当前活跃池和群成员计算，期间有人新发言 / 退群也会导致不一致。
+    """
+    days = no_repeat_days(plugin)
+    today = current_date(plugin).toordinal()
+    first_day = today - days
+    checked = 0
+    mismatches = []
+    drawers = {str(r.user_id) for r in records}
+    for user_id in canonical_order(drawers):
+
+        def base(uid: str, user_id: str = user_id) -> bool:
+            return uid != user_id and accept(uid)
+
+        ring = plugin.recent_wives.get(scope, {}).get(user_id, []) if days else []
+        # 抽取时的“最近老婆”= 之前几天的 + 今天更早抽到的
+        recent = {str(w) for day, w in ring if first_day < day < today}
+        for index, record in enumerate(records.for_user(user_id)):
+            if record.forced or record.auto_set or record.batch:
+                continue
+            expected = None
+            if recent:
+                blocked = set(recent)
+                expected = deterministic_pick(
+                    plugin, scope, user_id, index, lambda uid: uid not in blocked and base(uid)
+                )
+            if expected is None:
+                expected = deterministic_pick(plugin, scope, user_id, index, base)
+            checked += 1
+            if expected != str(record.wife_id):
+                mismatches.append((user_id, str(record.wife_id), expected or "-"))
+            if days:
+                recent.add(str(record.wife_id))
+    return checked, mismatches
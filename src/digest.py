@@ -0,0 +1,262 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import astrbot.api.message_components as Comp
+from astrbot.api import logger
+from astrbot.api.event import MessageChain
+
+from .core import call_onebot_action, graph_render_args, render_image
+from .federation import scope_key
+from .maintenance import MAX_SLEEP_SECONDS
+from .metrics import metrics
+from .render_queue import PRIORITY_BACKGROUND
+from .utils import load_json, save_json
+
+# 日报里列出的“最抢手”人数
+DIGEST_TOP_WIVES = 5
+
+
+def digest_enabled(plugin) -> bool:
+    return bool(plugin.config.get("digest_enabled", False))
+
+
+def digest_start(plugin) -> tuple[int, int]:
+    raw = str(plugin.config.get("digest_time", "23:30")).replace("：", ":")
+    try:
+        hour, _, minute = raw.partition(":")
+        return min(23, max(0, int(hour))), min(59, max(0, int(minute or 0)))
+    except Exception:
+        return 23, 30
+
+
+def digest_window_seconds(plugin) -> int:
+    raw = plugin.config.get("digest_window_minutes", 20)
+    try:
+        return max(1, int(raw)) * 60
+    except Exception:
+        return 20 * 60
+
+
+def digest_send_interval_seconds(plugin) -> int:
+    raw = plugin.config.get("digest_send_interval_seconds", 15)
+    try:
+        return max(1, int(raw))
+    except Exception:
+        return 15
+
+
+def next_digest_ts(plugin, now: float | None = None) -> float:
+    now = time.time() if now is None else now
+    hour, minute = digest_start(plugin)
+    target = datetime.fromtimestamp(now).replace(
+        hour=hour, minute=minute, second=0, microsecond=0
+    )
+    if target.timestamp() <= now:
+        target += timedelta(days=1)
+    return target.timestamp()
+
+
+def load_digest_origins(plugin) -> dict[str, dict[str, tuple]]:
+    """读取保存的发送目标 {范围: {群号: (会话标识, None)}}，协议端在发送时再按会话标识查找。"""
+    raw = load_json(plugin.digest_origins_file, {})
+    origins: dict[str, dict[str, tuple]] = {}
+    if isinstance(raw, dict):
+        for scope, groups in raw.items():
+            if isinstance(groups, dict):
+                origins[str(scope)] = {str(gid): (str(umo), None) for gid, umo in groups.items()}
+    return origins
+
+
+def remember_origin(plugin, event) -> None:
+    """记下群会话的发送目标；有新群或会话标识变化时落盘，重启后日报照常发送。"""
+    group_id = str(event.get_group_id() or "")
+    if not group_id:
+        return
+    self_id = str(event.get_self_id())
+    bot = event.bot if event.get_platform_name() == "aiocqhttp" else None
+    scope = scope_key(plugin, group_id, self_id)
+    groups = plugin._digest_origins.setdefault(scope, {})
+    umo = event.unified_msg_origin
+    known = groups.get(group_id)
+    groups[group_id] = (umo, bot)
+    if known is None or known[0] != umo:
+        save_json(
+            plugin.digest_origins_file,
+            {
+                key: {gid: origin[0] for gid, origin in targets.items()}
+                for key, targets in plugin._digest_origins.items()
+            },
+        )
+
+
+def _origin_bot(plugin, umo: str, bot):
+    """发送目标的协议端：优先用记下的，重启后按会话标识里的平台 ID 找 aiocqhttp 适配器。"""
+    if bot is not None:
+        return bot
+    try:
+        platform = plugin.context.get_platform_inst(str(umo).split(":", 1)[0])
+        if platform is not None and platform.meta().name == "aiocqhttp":
+            return platform.get_client()
+    except Exception:
+        pass
+    return None
+
+
+def digest_text(plugin, group_name: str, records, user_map: dict) -> str:
+    graph = records.graph
+
+    def name(uid: str) -> str:
+        return user_map.get(uid) or graph.name(uid)
+
+    drawers = {str(r.user_id) for r in records}
+    forced = sum(1 for r in records if r.forced)
+    lines = [
+        f"📰 群 {group_name} 抽老婆日报（{plugin.records.date}）",
+        f"今日 {len(drawers)} 人抽取 {len(records)} 次，其中强娶 {forced} 次，"
+        f"互相抽中 {len(graph.mutual_pairs())} 对",
+    ]
+    wanted = graph.most_wanted(DIGEST_TOP_WIVES)
+    if wanted:
+        lines.append("最抢手：" + "、".join(f"【{name(uid)}】×{n}" for uid, n in wanted))
+    return "\n".join(lines)
+
+
+async def _group_name(bot, group_id: str) -> str:
+    if bot is None:
+        return group_id
+    try:
+        info = await call_onebot_action(bot, "get_group_info", group_id=int(group_id))
+        if isinstance(info, dict) and isinstance(info.get("data"), dict):
+            info = info["data"]
+        return info.get("group_name") or group_id
+    except Exception as e:
+        logger.warning(f"[抽老婆日报] 获取群 {group_id} 信息失败: {e}")
+        return group_id
+
+
+async def build_digest(plugin, scope: str, groups: dict) -> float:
+    """渲染并发送一个范围（群 / 联盟 / 账号分区）的日报，返回渲染耗时（秒）。
+
+    同一范围的多个群共用一张图，逐个群间隔发送。渲染失败时只发文字。
+    """
+    records = plugin.records.group_records(scope)
+    first_gid, (first_umo, first_bot) = next(iter(groups.items()))
+    group_name = await _group_name(_origin_bot(plugin, first_umo, first_bot), first_gid)
+    # 只用已缓存的群成员名字（过期也照用），日报不为此再拉成员列表
+    user_map = plugin._member_cache.get(scope, plugin._member_cache.get(first_gid, (0, {})))[1]
+
+    path = None
+    breaker = plugin.render_breaker
+    start = time.perf_counter()
+    try:
+        # 熔断打开说明渲染服务不可用，日报只发文字；这里只看状态不调用 allow()，
+        # 冷却结束后的试探名额留给交互指令，后台任务不占用
+        if breaker.is_open:
+            raise RuntimeError("渲染熔断中")
+        tmpl, data, width, height = graph_render_args(
+            plugin, first_gid, group_name, user_map, records
+        )
+        path = await render_image(
+            plugin,
+            "digest",
+            tmpl,
+            data,
+            width=width,
+            height=height,
+            key=("digest", scope, records.version),
+            priority=PRIORITY_BACKGROUND,
+        )
+        breaker.record_success()
+        status = "ok"
+    except Exception as e:
+        if not breaker.is_open:
+            breaker.record_failure()
+        status = "error"
+        logger.warning(f"[抽老婆日报] {scope} 渲染失败，只发送文字: {e}")
+    render_seconds = time.perf_counter() - start
+    metrics.observe("digest_render_seconds", render_seconds, status=status)
+
+    text = digest_text(plugin, group_name, records, user_map)
+    interval = digest_send_interval_seconds(plugin)
+    for i, (gid, (umo, _bot)) in enumerate(groups.items()):
+        if i:
+            await asyncio.sleep(interval)
+        chain = [Comp.Plain(text)]
+        if path:
+            chain.append(Comp.Image.fromFileSystem(path))
+        try:
+            await plugin.context.send_message(umo, MessageChain(chain))
+            metrics.inc("digest_sent_total", result="ok")
+        except Exception as e:
+            metrics.inc("digest_sent_total", result="error")
+            logger.warning(f"[抽老婆日报] 发送到群 {gid} 失败: {e}")
+    return render_seconds
+
+
+async def run_digests(plugin, window_seconds: float) -> int:
+    """在窗口内逐个范围生成日报，返回处理的范围数。
+
+    一次只渲染一个（低优先级，不与交互渲染抢并发位），范围之间均匀错开，
+    间隔至少为发送间隔；跨过换日时停止，避免把新一天的空记录当成日报。
+    """
+    date = plugin.records.date
+    targets = [
+        (scope, dict(groups))
+        for scope, groups in plugin._digest_origins.items()
+        if groups and len(plugin.records.group_records(scope))
+    ]
+    if not targets:
+        logger.info("[抽老婆日报] 今天没有需要发送日报的群")
+        return 0
+
+    spacing = max(digest_send_interval_seconds(plugin), window_seconds / len(targets))
+    logger.info(
+        f"[抽老婆日报] 开始生成 {len(targets)} 份日报，每份间隔 {spacing:.1f}s"
+    )
+    start = time.perf_counter()
+    total_render = 0.0
+    done = 0
+    for i, (scope, groups) in enumerate(targets):
+        if plugin.records.date != date:
+            logger.info(f"[抽老婆日报] 已换日，剩余 {len(targets) - i} 份日报取消")
+            break
+        slot_start = time.monotonic()
+        try:
+            render_seconds = await build_digest(plugin, scope, groups)
+        except Exception as e:
+            logger.error(f"[抽老婆日报] {scope} 日报失败: {e}")
+        else:
+            done += 1
+            total_render += render_seconds
+            logger.info(
+                f"[抽老婆日报] ({i + 1}/{len(targets)}) {scope} 发送 {len(groups)} 个群，"
+                f"渲染 {render_seconds * 1000:.0f}ms"
+            )
+        if i + 1 < len(targets):
+            await asyncio.sleep(max(0.0, spacing - (time.monotonic() - slot_start)))
+    logger.info(
+        f"[抽老婆日报] 完成 {done}/{len(targets)} 份，渲染合计 {total_render:.1f}s，"
+        f"总用时 {time.perf_counter() - start:.0f}s"
+    )
+    return done
+
+
+async def digest_loop(plugin) -> None:
+    """每天在日报时段开始时生成各群日报。"""
+    next_ts = next_digest_ts(plugin)
+    while True:
+        await asyncio.sleep(min(MAX_SLEEP_SECONDS, max(1.0, next_ts - time.time())))
+        now = time.time()
+        if now < next_ts:
+            continue
+        # 错过窗口（如休眠 / 系统时间跳变）就等到第二天
+        window = digest_window_seconds(plugin)
+        late = now - next_ts
+        next_ts = next_digest_ts(plugin, now)
+        if late > window:
+            continue
+        try:
+            await run_digests(plugin, window - late)
+        except Exception as e:
+            logger.error(f"[抽老婆日报] 生成日报失败: {e}")
@@ -0,0 +1,152 @@
+from astrbot.api import logger
+
+from .record_store import ActivityTable
+
+FEDERATION_PREFIX = "fed:"
+BOT_PREFIX = "bot:"
+
+
+def _parse_federations(raw: object) -> dict[str, tuple[str, tuple[str, ...]]]:
+    """把配置解析成 {群号: (联盟键, 联盟内所有群号)}。
+
+    每项格式为 ``群号1,群号2,...``，可选加名称前缀 ``名称:群号1,群号2``；
+    没有名称时以第一个群号命名，后续往联盟里追加群不会改变联盟键。
+    """
+    mapping: dict[str, tuple[str, tuple[str, ...]]] = {}
+    if not isinstance(raw, list):
+        return mapping
+    for entry in raw:
+        text = str(entry).replace("，", ",").strip()
+        name, sep, rest = text.partition(":")
+        if not sep:
+            name, rest = "", text
+        groups = tuple(dict.fromkeys(g.strip() for g in rest.split(",") if g.strip()))
+        if len(groups) < 2:
+            continue
+        key = FEDERATION_PREFIX + (name.strip() or groups[0])
+        for gid in groups:
+            if gid in mapping:
+                logger.warning(f"群 {gid} 同时出现在多个群联盟中，只使用第一个")
+                continue
+            mapping[gid] = (key, groups)
+    return mapping
+
+
+def federation_map(plugin) -> dict[str, tuple[str, tuple[str, ...]]]:
+    raw = plugin.config.get("group_federations", [])
+    cache_key = repr(raw)
+    cached = getattr(plugin, "_federation_cache", None)
+    if cached is None or cached[0] != cache_key:
+        cached = (cache_key, _parse_federations(raw))
+        plugin._federation_cache = cached
+    return cached[1]
+
+
+def _bot_partition_settings(plugin) -> tuple[bool, frozenset[str]]:
+    enabled = bool(plugin.config.get("bot_state_partition", False))
+    raw = plugin.config.get("bot_shared_groups", [])
+    cache_key = (enabled, repr(raw))
+    cached = getattr(plugin, "_bot_partition_cache", None)
+    if cached is None or cached[0] != cache_key:
+        shared = frozenset(str(g).strip() for g in raw or () if str(g).strip())
+        cached = (cache_key, (enabled, shared))
+        plugin._bot_partition_cache = cached
+    return cached[1]
+
+
+def bot_prefix(plugin, group_id: str, self_id: str = "") -> str:
+    """多账号分区前缀：开启按账号分区且该群不在共享名单里时为 ``bot:<账号>:``，否则为空。"""
+    if not self_id:
+        return ""
+    enabled, shared = _bot_partition_settings(plugin)
+    if not enabled or str(group_id) in shared:
+        return ""
+    return f"{BOT_PREFIX}{self_id}:"
+
+
+def group_key(plugin, group_id: str, self_id: str = "") -> str:
+    """按群存储的状态（强娶冷却、rbq 统计）的键，开启按账号分区时带上账号前缀。"""
+    return bot_prefix(plugin, group_id, self_id) + str(group_id)
+
+
+def split_group_key(key: str) -> tuple[str, str]:
+    """把 ``group_key`` 生成的键拆回 (账号, 群号)，没有账号前缀时账号为空。"""
+    key = str(key)
+    if key.startswith(BOT_PREFIX):
+        self_id, sep, group_id = key[len(BOT_PREFIX):].partition(":")
+        if sep:
+            return self_id, group_id
+    return "", key
+
+
+def scope_key(plugin, group_id: str, self_id: str = "") -> str:
+    """群所属的抽取范围：加入了联盟的群返回联盟键，否则就是群号本身。
+
+    活跃池、当日记录（每日上限 / 关系图）、发言次数、不重复记录都按这个键存储。
+    开启按账号分区时再加上 ``bot:<账号>:`` 前缀，同一个群里的几个机器人各自独立。
+    """
+    entry = federation_map(plugin).get(str(group_id))
+    return bot_prefix(plugin, group_id, self_id) + (entry[0] if entry else str(group_id))
+
+
+def scope_groups(plugin, group_id: str) -> tuple[str, ...]:
+    entry = federation_map(plugin).get(str(group_id))
+    return entry[1] if entry else (str(group_id),)
+
+
+def _merge_group_state(plugin, source: str, target_key: str) -> bool:
+    """把 source 键下的各类状态并入 target_key 并删除 source，返回是否有数据。"""
+    touched = False
+    if source in plugin.active_users:
+        target = plugin.active_users.setdefault(target_key, ActivityTable())
+        for uid, ts in plugin.active_users.pop(source).items():
+            target[uid] = max(ts, target.get(uid, 0))
+        plugin.active_users.mark_dirty(target_key)
+        touched = True
+    if source in plugin.message_counts:
+        target = plugin.message_counts.setdefault(target_key, {})
+        for uid, n in plugin.message_counts.pop(source).items():
+            target[uid] = target.get(uid, 0) + n
+        plugin.message_counts.mark_dirty(target_key)
+        touched = True
+    if source in plugin.recent_wives:
+        target = plugin.recent_wives.setdefault(target_key, {})
+        for uid, ring in plugin.recent_wives.pop(source).items():
+            target[uid] = sorted(target.get(uid, []) + ring)
+        plugin.recent_wives.mark_dirty(target_key)
+        touched = True
+    if source in plugin.records.groups:
+        group = plugin.records.groups.pop(source)
+        target = plugin.records.ensure_group(target_key)
+        for record in group:
+            target.add(record)
+        plugin.records.groups.mark_dirty(target_key)
+        touched = True
+    return touched
+
+
+def merge_federation_state(plugin) -> int:
+    """把已加入联盟的群原有的按群数据合并进联盟，返回合并的群数。
+
+    群号键并入联盟键，按账号分区的 ``bot:<账号>:群号`` 并入 ``bot:<账号>:联盟键``。
+    只在旧键仍存在时做一次（合并后删除旧键），之后启动几乎没有开销。
+    """
+    fed_map = federation_map(plugin)
+    moves = [(gid, key) for gid, (key, _groups) in fed_map.items()]
+    prefixed = set()
+    for store in (plugin.active_users, plugin.message_counts, plugin.recent_wives, plugin.records.groups):
+        prefixed.update(k for k in store.keys() if k.startswith(BOT_PREFIX))
+    for source in sorted(prefixed):
+        self_id, gid = split_group_key(source)
+        if gid in fed_map:
+            moves.append((source, scope_key(plugin, gid, self_id)))
+
+    merged = 0
+    for source, key in moves:
+        if _merge_group_state(plugin, source, key):
+            merged += 1
+            logger.info(f"已将群 {source} 的数据并入群联盟 {key}")
+    if merged:
+        for store in plugin._state_stores().values():
+            store.flush()
+    return merged
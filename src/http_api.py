@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from aiohttp import web
+
+from astrbot.api import logger
+
+from .core import rbq_counts
+from .federation import group_key, scope_key
+from .metrics import metrics
+from .utils import is_allowed_group
+
+# 最多记住多少个响应的 (ETag, Last-Modified)，超出时淘汰最久没被请求的
+MAX_TRACKED_RESPONSES = 4096
+
+
+def _etag(body: bytes) -> str:
+    digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def _json_bytes(data: object) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+async def _read_shard(store, key: str, default=None):
+    """已加载的分片直接读内存；未加载的放到线程里读盘，且不放进缓存。"""
+    if store.is_loaded(key):
+        return store.get(key, default)
+    if key not in store:
+        return default
+    return await asyncio.to_thread(store.peek, key, default)
+
+
+class StatsServer:
+    """只读的本地 HTTP 接口，供仪表盘 / 其他机器人轮询，不走指令流程。
+
+    - ``GET /api/groups/{群号}/records``：今天的抽取记录
+    - ``GET /api/groups/{群号}/rbq``：近 30 天被强娶排行
+    - ``GET /api/groups/{群号}/graph``：最近一次渲染的关系图
+    - ``GET /api/pools``：内存中各群的活跃池大小
+    - ``GET /api/metrics``（JSON）、``GET /metrics``（Prometheus 文本）
+
+    开启按账号分区时，群接口用 ``?self_id=机器人账号`` 选择分区。
+    所有响应都带 ETag / Last-Modified，数据没变时返回 304。
+    """
+
+    def __init__(self, plugin, host: str, port: int):
+        self.plugin = plugin
+        self.host = host
+        self.port = port
+        self._runner: web.AppRunner | None = None
+        # {(请求路径, 记录范围): (ETag, 首次出现该 ETag 的时间)}，用作 Last-Modified；按最近请求排序
+        self._modified: OrderedDict[tuple[str, str], tuple[str, int]] = OrderedDict()
+
+    def _app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/groups/{group_id}/records", self.group_records)
+        app.router.add_get("/api/groups/{group_id}/rbq", self.group_rbq)
+        app.router.add_get("/api/groups/{group_id}/graph", self.group_graph)
+        app.router.add_get("/api/pools", self.pools)
+        app.router.add_get("/api/metrics", self.metrics_json)
+        app.router.add_get("/metrics", self.metrics_text)
+        return app
+
+    async def start(self) -> None:
+        runner = web.AppRunner(self._app(), access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+        except OSError as e:
+            await runner.cleanup()
+            logger.error(f"[抽老婆] 本地 HTTP 接口启动失败 {self.host}:{self.port}: {e}")
+            return
+        self._runner = runner
+        logger.info(f"[抽老婆] 本地 HTTP 接口已启动: http://{self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # ---------- 条件请求 ----------
+    def _respond(
+        self,
+        request: web.Request,
+        body: bytes,
+        content_type: str = "application/json",
+        scope: str = "",
+    ) -> web.Response:
+        """按响应体算 ETag；与请求带来的 ETag / 时间一致时返回不带响应体的 304。
+
+        Last-Modified 按 (路径, 记录范围) 记录，同一个群的不同账号分区各算各的。
+        """
+        etag = _etag(body)
+        key = (request.path, scope)
+        known = self._modified.get(key)
+        if known is None or known[0] != etag:
+            # Last-Modified 精度只有秒，同一秒内再次变化时往后推一秒，保证 If-Modified-Since 能看出变化
+            modified = int(time.time())
+            if known is not None and modified <= known[1]:
+                modified = known[1] + 1
+            known = (etag, modified)
+            self._modified[key] = known
+        self._modified.move_to_end(key)
+        if len(self._modified) > MAX_TRACKED_RESPONSES:
+            self._modified.popitem(last=False)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(known[1], usegmt=True),
+            "Cache-Control": "no-cache",
+        }
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = {t.strip() for t in if_none_match.split(",")}
+            not_modified = etag in tags or "*" in tags
+        else:
+            not_modified = False
+            since = request.headers.get("If-Modified-Since")
+            if since:
+                try:
+                    not_modified = known[1] <= parsedate_to_datetime(since).timestamp()
+                except (TypeError, ValueError):
+                    pass
+        result = "not_modified" if not_modified else "ok"
+        metrics.inc("http_api_requests_total", route=request.match_info.route.resource.canonical, result=result)
+        if not_modified:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, content_type=content_type, headers=headers)
+
+    def _group_id(self, request: web.Request) -> str:
+        group_id = request.match_info["group_id"]
+        if not is_allowed_group(group_id, self.plugin.config):
+            raise web.HTTPNotFound()
+        return group_id
+
+    # ---------- 接口 ----------
+    async def group_records(self, request: web.Request) -> web.Response:
+        group_id = self._group_id(request)
+        plugin = self.plugin
+        scope = scope_key(plugin, group_id, request.query.get("self_id", ""))
+        group = await _read_shard(plugin.records.groups, scope)
+        body = _json_bytes({
+            "group_id": group_id,
+            "scope": scope,
+            "date": plugin.records.date,
+            "records": group.to_list() if group is not None else [],
+        })
+        return self._respond(request, body, scope=scope)
+
+    async def group_rbq(self, request: web.Request) -> web.Response:
+        group_id = self._group_id(request)
+        key = group_key(self.plugin, group_id, request.query.get("self_id", ""))
+        users = await _read_shard(self.plugin.rbq_stats, key, {})
+        ranking = rbq_counts(users, time.time())
+        names = self.plugin._member_cache.get(group_id, (0, {}))[1]
+        body = _json_bytes({
+            "group_id": group_id,
+            "ranking": [
+                {"user_id": uid, "name": names.get(uid), "count": count} for uid, count in ranking
+            ],
+        })
+        return self._respond(request, body, scope=key)
+
+    async def group_graph(self, request: web.Request) -> web.StreamResponse:
+        group_id = self._group_id(request)
+        scope = scope_key(self.plugin, group_id, request.query.get("self_id", ""))
+        path = self.plugin._graph_images.get(scope)
+        if not path or not os.path.exists(path):
+            raise web.HTTPNotFound(text="该群还没有渲染过关系图")
+        metrics.inc("http_api_requests_total", route="/api/groups/{group_id}/graph", result="file")
+        # FileResponse 自带 ETag / Last-Modified 和 304 处理，并用 sendfile 发送，不阻塞事件循环
+        return web.FileResponse(path, headers={"Cache-Control": "no-cache"})
+
+    async def pools(self, request: web.Request) -> web.Response:
+        # 只统计已加载的分片，不触发磁盘读取
+        sizes = {gid: len(users) for gid, users in self.plugin.active_users.loaded_items()}
+        body = _json_bytes({"pools": dict(sorted(sizes.items()))})
+        return self._respond(request, body)
+
+    async def metrics_json(self, request: web.Request) -> web.Response:
+        snapshot = metrics.snapshot()
+        body = _json_bytes(snapshot)
+        return self._respond(request, body)
+
+    async def metrics_text(self, request: web.Request) -> web.Response:
+        body = metrics.render_prometheus().encode("utf-8")
+        return self._respond(request, body, content_type="text/plain")
@@ -0,0 +1,219 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from astrbot.api import logger
+
+from .core import (
+    cleanup_inactive,
+    clean_rbq_stats,
+    current_date,
+    no_repeat_days,
+    rollover_records,
+)
+
+# 维护任务单次最长睡眠时间，便于感知系统时间跳变和配置修改
+MAX_SLEEP_SECONDS = 600
+# 超过这么久没被访问的分片会在维护时移出内存
+IDLE_SHARD_SECONDS = 6 * 3600
+
+
+def maintenance_hour(plugin) -> int:
+    raw = plugin.config.get("maintenance_hour", 4)
+    try:
+        return min(23, max(0, int(raw)))
+    except Exception:
+        return 4
+
+
+def archive_retention_days(plugin) -> int:
+    raw = plugin.config.get("archive_retention_days", 0)
+    try:
+        return max(0, int(raw))
+    except Exception:
+        return 0
+
+
+def next_maintenance_ts(plugin, now: float | None = None) -> float:
+    now = time.time() if now is None else now
+    target = datetime.fromtimestamp(now).replace(
+        hour=maintenance_hour(plugin), minute=0, second=0, microsecond=0
+    )
+    if target.timestamp() <= now:
+        target += timedelta(days=1)
+    return target.timestamp()
+
+
+def state_flush_interval_seconds(plugin) -> int:
+    raw = plugin.config.get("state_flush_interval_seconds", 30)
+    try:
+        return max(1, int(raw))
+    except Exception:
+        return 30
+
+
+def trim_active_users(plugin) -> int:
+    """跨群活跃记录总数超过 max_records 时，只保留最近发言的那部分，返回移除人数。"""
+    max_total = plugin.config.get("max_records", 500)
+    all_actives = []
+    for gid, users in plugin.active_users.items():
+        for uid, ts in users.items():
+            all_actives.append((ts, gid, uid))
+    if len(all_actives) <= max_total:
+        return 0
+
+    all_actives.sort()
+    drop = all_actives[: len(all_actives) - max_total]
+    for _ts, gid, uid in drop:
+        plugin.active_users[gid].pop(uid, None)
+        plugin.active_users.mark_dirty(gid)
+    return len(drop)
+
+
+def sweep_inactive(plugin) -> int:
+    """清理所有群的不活跃用户，并执行一次全局条数上限裁剪，返回移除人数。"""
+    removed = 0
+    for gid in list(plugin.active_users.keys()):
+        removed += cleanup_inactive(plugin, gid, save=False)
+        if not plugin.active_users.get(gid):
+            plugin.active_users.pop(gid, None)
+
+    # max_records 裁剪原先每次抽老婆都会做一遍
+    removed += trim_active_users(plugin)
+
+    # 发言次数只保留仍在活跃池里的人，离开活跃窗口后重新计数
+    for gid in list(plugin.message_counts.keys()):
+        active = plugin.active_users.get(gid, {})
+        counts = plugin.message_counts[gid]
+        kept = {uid: n for uid, n in counts.items() if uid in active}
+        if not kept:
+            del plugin.message_counts[gid]
+        elif len(kept) != len(counts):
+            plugin.message_counts[gid] = kept
+    # 活跃池变化后加权抽样池下次抽取时重建
+    plugin._draw_pools.clear()
+
+    plugin.active_users.flush()
+    plugin.message_counts.flush()
+    return removed
+
+
+def prune_recent_wives(plugin) -> int:
+    """删除超出“不重复天数”的最近老婆记录及离开活跃池的用户，返回删除条数。"""
+    days = no_repeat_days(plugin)
+    first_day = current_date(plugin).toordinal() - days
+    removed = 0
+    for gid in list(plugin.recent_wives.keys()):
+        users = plugin.recent_wives[gid]
+        active = plugin.active_users.get(gid, {})
+        kept = {}
+        for uid, ring in users.items():
+            fresh = [entry for entry in ring if entry[0] > first_day] if days and uid in active else []
+            removed += len(ring) - len(fresh)
+            if fresh:
+                kept[uid] = fresh
+        if not kept:
+            del plugin.recent_wives[gid]
+        elif kept != users:
+            plugin.recent_wives[gid] = kept
+    plugin.recent_wives.flush()
+    return removed
+
+
+def prune_activity_stats(plugin, now: float | None = None) -> int:
+    """删除最近 7 天没有任何发言的群的活跃度统计，返回删除的群数。"""
+    now = time.time() if now is None else now
+    removed = 0
+    for key in list(plugin.activity_stats.keys()):
+        if plugin.activity_stats[key].is_stale(now):
+            del plugin.activity_stats[key]
+            removed += 1
+    plugin.activity_stats.flush()
+    return removed
+
+
+def flush_state(plugin) -> int:
+    """把所有状态的脏分片写回磁盘，返回写入字节数。"""
+    written = 0
+    for store in plugin._state_stores().values():
+        written += store.flush()
+    if plugin._event_recorder is not None:
+        plugin._event_recorder.flush()
+    return written
+
+
+def run_rollover(plugin) -> None:
+    start = time.perf_counter()
+    archived = rollover_records(plugin)
+    logger.info(
+        f"[抽老婆维护] 换日完成：归档 {archived} 条记录，"
+        f"用时 {(time.perf_counter() - start) * 1000:.1f}ms"
+    )
+
+
+async def run_maintenance(plugin) -> None:
+    """空闲时段的维护：过期清理、归档合并与保留期裁剪。"""
+    start = time.perf_counter()
+    stores = plugin._state_stores()
+    # 先把长时间没用的分片移出内存；下面的清理要遍历所有群，会刷新分片的访问时间
+    evicted = sum(store.evict_idle(IDLE_SHARD_SECONDS) for store in stores.values())
+    resident = {name: {key for key, _ in store.loaded_items()} for name, store in stores.items()}
+
+    inactive = sweep_inactive(plugin)
+    rbq_removed = clean_rbq_stats(plugin)
+    recent_removed = prune_recent_wives(plugin)
+    stale_stats = prune_activity_stats(plugin)
+
+    # 清理时才临时加载的分片（均已落盘）不留在内存里
+    evicted += sum(
+        store.evict([key for key, _ in store.loaded_items() if key not in resident[name]])
+        for name, store in stores.items()
+    )
+
+    # 归档文件与内存状态无关，放到线程里执行避免阻塞事件循环
+    compacted = await asyncio.to_thread(plugin.archive.compact)
+    pruned = 0
+    retention = archive_retention_days(plugin)
+    if retention > 0:
+        cutoff = current_date(plugin) - timedelta(days=retention)
+        pruned = await asyncio.to_thread(plugin.archive.prune_before, cutoff)
+
+    logger.info(
+        f"[抽老婆维护] 日常维护完成，用时 {(time.perf_counter() - start) * 1000:.1f}ms："
+        f"清理不活跃用户 {inactive} 人，过期强娶记录 {rbq_removed} 条，"
+        f"过期不重复记录 {recent_removed} 条，过期活跃度统计 {stale_stats} 个群，"
+        f"合并归档分区 {compacted} 个，删除过期归档 {pruned} 个，释放分片 {evicted} 个"
+    )
+
+
+async def maintenance_loop(plugin) -> None:
+    """按换日时刻执行换日，按维护时段执行日常维护。"""
+    run_rollover(plugin)
+    plugin._next_maintenance_ts = next_maintenance_ts(plugin)
+    while True:
+        wake_at = min(plugin._next_rollover_ts, plugin._next_maintenance_ts)
+        await asyncio.sleep(min(MAX_SLEEP_SECONDS, max(1.0, wake_at - time.time())))
+
+        now = time.time()
+        if now >= plugin._next_rollover_ts:
+            try:
+                run_rollover(plugin)
+            except Exception as e:
+                logger.error(f"[抽老婆维护] 换日失败: {e}")
+        if now >= plugin._next_maintenance_ts:
+            plugin._next_maintenance_ts = next_maintenance_ts(plugin, now)
+            try:
+                await run_maintenance(plugin)
+            except Exception as e:
+                logger.error(f"[抽老婆维护] 日常维护失败: {e}")
+
+
+async def state_flush_loop(plugin) -> None:
+    """定时把活跃度等高频修改的脏分片批量落盘。"""
+    interval = state_flush_interval_seconds(plugin)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            flush_state(plugin)
+        except Exception as e:
+            logger.error(f"[抽老婆维护] 保存状态失败: {e}")
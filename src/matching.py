@@ -0,0 +1,54 @@
+import random
+from typing import Sequence
+
+# 均匀随机错排的拒绝采样次数上限（每次成功概率约 1/e，20 次仍失败的概率可以忽略）
+MAX_DERANGEMENT_TRIES = 20
+
+
+def random_derangement(ids: Sequence[str], rng: random.Random | None = None) -> dict[str, str]:
+    """一对一分配：返回 {抽取者: 老婆}，每人恰好抽到一人、也恰好被一人抽到，且不会抽到自己。
+
+    先对打乱后的排列做拒绝采样（得到均匀分布的错排，期望约 e 次、每次 O(n)），
+    极小概率连续失败时退回 Sattolo 算法（单个大环，同样 O(n)）。
+    少于 2 人时无法错排，返回空字典。
+    """
+    rng = rng or random
+    n = len(ids)
+    if n < 2:
+        return {}
+    perm = list(range(n))
+    for _ in range(MAX_DERANGEMENT_TRIES):
+        rng.shuffle(perm)
+        if all(i != p for i, p in enumerate(perm)):
+            return {ids[i]: ids[p] for i, p in enumerate(perm)}
+
+    # Sattolo：生成随机的 n 循环排列，必然没有不动点
+    perm = list(range(n))
+    for i in range(n - 1, 0, -1):
+        j = rng.randrange(i)
+        perm[i], perm[j] = perm[j], perm[i]
+    return {ids[i]: ids[p] for i, p in enumerate(perm)}
+
+
+def random_assignment(
+    drawers: Sequence[str], pool: Sequence[str], rng: random.Random | None = None
+) -> dict[str, str]:
+    """可重复分配：每个抽取者从 pool 中（排除自己）等概率抽一人，多人可能抽到同一人。
+
+    抽取者在 pool 里时，从去掉自己后的 m-1 个位置中取随机下标，不需要重试，整体 O(n)。
+    """
+    rng = rng or random
+    index = {uid: i for i, uid in enumerate(pool)}
+    m = len(pool)
+    result: dict[str, str] = {}
+    for uid in drawers:
+        own = index.get(uid)
+        if own is None:
+            if m:
+                result[uid] = pool[rng.randrange(m)]
+            continue
+        if m < 2:
+            continue
+        k = rng.randrange(m - 1)
+        result[uid] = pool[k + 1 if k >= own else k]
+    return result
@@ -0,0 +1,326 @@
+import bisect
+import os
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable
+
+# 延迟直方图的默认分桶（秒），覆盖从毫秒级 JSON 保存到数十秒的浏览器渲染
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _summary_label(key: LabelKey) -> str:
+    if not key:
+        return "-"
+    if len(key) == 1:
+        return key[0][1]
+    return ",".join(f"{k}={v}" for k, v in key)
+
+
+class Histogram:
+    """固定分桶的直方图，observe 为 O(log 桶数)。"""
+
+    __slots__ = ("buckets", "counts", "total", "count", "max")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """按分桶上界估算分位数（与 Prometheus histogram_quantile 同口径的粗略版）。"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+
+class MetricsRegistry:
+    """进程内指标注册表：直方图 / 计数器 / 仪表盘。
+
+    所有写操作都是纯内存的 O(1) 字典更新；仪表盘类数据（池大小、状态规模等）
+    通过 collector 在导出时才计算，不占用热路径。
+    """
+
+    def __init__(self, prefix: str = "wifepicker"):
+        self.prefix = prefix
+        self._help: dict[str, tuple[str, str]] = {}
+        self._histograms: dict[str, dict[LabelKey, Histogram]] = {}
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._gauges: dict[str, dict[LabelKey, float]] = {}
+        self._collectors: list[Callable[["MetricsRegistry"], None]] = []
+        self.started_at = time.time()
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        series = self._histograms.setdefault(name, {})
+        key = _label_key(labels)
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = Histogram()
+        hist.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        series = self._counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def clear_gauge(self, name: str) -> None:
+        self._gauges.pop(name, None)
+
+    def add_collector(self, fn: Callable[["MetricsRegistry"], None]) -> None:
+        if fn not in self._collectors:
+            self._collectors.append(fn)
+
+    def remove_collector(self, fn: Callable[["MetricsRegistry"], None]) -> None:
+        if fn in self._collectors:
+            self._collectors.remove(fn)
+
+    def collect(self) -> None:
+        for fn in tuple(self._collectors):
+            try:
+                fn(self)
+            except Exception:
+                # 指标采集失败不能影响业务
+                pass
+
+    def histogram(self, name: str, **labels) -> Histogram | None:
+        return self._histograms.get(name, {}).get(_label_key(labels))
+
+    def histograms(self, name: str) -> dict[LabelKey, Histogram]:
+        return dict(self._histograms.get(name, {}))
+
+    def counters(self, name: str) -> dict[LabelKey, float]:
+        return dict(self._counters.get(name, {}))
+
+    def gauges(self, name: str) -> dict[LabelKey, float]:
+        return dict(self._gauges.get(name, {}))
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    async def timed_iter(
+        self, name: str, agen: AsyncIterator, **labels
+    ) -> AsyncIterator:
+        """包装 async generator，只统计处理器自身耗时（不含 yield 后消息发送的时间）。"""
+        elapsed = 0.0
+        status = "ok"
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = await agen.__anext__()
+                except StopAsyncIteration:
+                    elapsed += time.perf_counter() - start
+                    break
+                except BaseException:
+                    elapsed += time.perf_counter() - start
+                    status = "error"
+                    raise
+                elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            await agen.aclose()
+            self.observe(name, elapsed, **labels)
+            if status != "ok":
+                self.inc(name.removesuffix("_seconds") + "_errors_total", **labels)
+
+    def render_prometheus(self) -> str:
+        self.collect()
+        lines: list[str] = []
+
+        def header(name: str, default_kind: str) -> str:
+            full = f"{self.prefix}_{name}"
+            kind, help_text = self._help.get(name, (default_kind, name))
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        for name in sorted(self._histograms):
+            full = header(name, "histogram")
+            for key, hist in sorted(self._histograms[name].items()):
+                cumulative = 0
+                for bound, c in zip(hist.buckets, hist.counts):
+                    cumulative += c
+                    lines.append(
+                        f"{full}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {cumulative}"
+                    )
+                lines.append(
+                    f"{full}_bucket{_format_labels(key, (('le', '+Inf'),))} {hist.count}"
+                )
+                lines.append(f"{full}_sum{_format_labels(key)} {_format_value(hist.total)}")
+                lines.append(f"{full}_count{_format_labels(key)} {hist.count}")
+
+        for name in sorted(self._counters):
+            full = header(name, "counter")
+            for key, value in sorted(self._counters[name].items()):
+                lines.append(f"{full}{_format_labels(key)} {_format_value(value)}")
+
+        for name in sorted(self._gauges):
+            full = header(name, "gauge")
+            for key, value in sorted(self._gauges[name].items()):
+                lines.append(f"{full}{_format_labels(key)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """原子写入 Prometheus textfile（node_exporter textfile collector 可直接读取）。"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def snapshot(self) -> dict:
+        """JSON 友好的快照：直方图给出次数 / 总和 / p50 / p95 / 最大值（本地 HTTP 接口使用）。"""
+        self.collect()
+
+        def series(data: dict, fn) -> dict[str, list[dict]]:
+            return {
+                name: [{"labels": dict(key), **fn(value)} for key, value in sorted(items.items())]
+                for name, items in sorted(data.items())
+                if items
+            }
+
+        return {
+            "started_at": self.started_at,
+            "histograms": series(
+                self._histograms,
+                lambda h: {
+                    "count": h.count,
+                    "sum": h.total,
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "max": h.max,
+                },
+            ),
+            "counters": series(self._counters, lambda v: {"value": v}),
+            "gauges": series(self._gauges, lambda v: {"value": v}),
+        }
+
+    def summary_lines(self) -> list[str]:
+        """给管理员指令用的人类可读摘要。"""
+        self.collect()
+        lines: list[str] = []
+        for name in sorted(self._histograms):
+            series = self._histograms[name]
+            if not series:
+                continue
+            lines.append(f"[{name}]")
+            ordered = sorted(series.items(), key=lambda kv: kv[1].total, reverse=True)
+            for key, hist in ordered:
+                label = _summary_label(key)
+                lines.append(
+                    f"  {label}: n={hist.count} avg={hist.total / hist.count * 1000:.1f}ms "
+                    f"p95≤{hist.quantile(0.95) * 1000:.0f}ms max={hist.max * 1000:.0f}ms"
+                )
+        for name in sorted(self._counters):
+            series = self._counters[name]
+            if not series:
+                continue
+            lines.append(f"[{name}]")
+            for key, value in sorted(series.items()):
+                label = _summary_label(key)
+                lines.append(f"  {label}: {_format_value(value)}")
+        for name in sorted(self._gauges):
+            series = self._gauges[name]
+            if not series:
+                continue
+            if len(series) > 5:
+                # 按群的仪表盘（如池大小）只给汇总，避免刷屏
+                values = list(series.values())
+                lines.append(
+                    f"[{name}] series={len(values)} total={_format_value(sum(values))} "
+                    f"max={_format_value(max(values))}"
+                )
+                continue
+            lines.append(f"[{name}]")
+            for key, value in sorted(series.items()):
+                label = _summary_label(key)
+                lines.append(f"  {label}: {_format_value(value)}")
+        return lines
+
+
+# 进程内默认注册表：utils/core 中的无状态函数直接向这里上报
+metrics = MetricsRegistry()
+
+metrics.describe("command_seconds", "histogram", "Handler latency per plugin command")
+metrics.describe("onebot_call_seconds", "histogram", "OneBot call_action latency by action")
+metrics.describe("save_json_seconds", "histogram", "State write duration per file / shard kind / archive")
+metrics.describe("save_json_bytes_total", "counter", "Bytes written to disk per file / shard kind / archive")
+metrics.describe("save_json_last_bytes", "gauge", "Size of the last write per file / shard kind / archive")
+metrics.describe("html_render_seconds", "histogram", "html_render duration per template")
+metrics.describe("event_dedup_hits_total", "counter", "Duplicate events skipped per processing path")
+metrics.describe("event_dedup_entries", "gauge", "Events remembered by the de-dup set")
+metrics.describe("http_api_requests_total", "counter", "Local HTTP API requests by route and result (ok/not_modified/file)")
+metrics.describe("render_queue_wait_seconds", "histogram", "Time a render waited for a free slot per template")
+metrics.describe("render_coalesced_total", "counter", "Render requests served by an identical in-flight render")
+metrics.describe("render_encode_seconds", "histogram", "Crop and re-encode time of rendered images per template")
+metrics.describe("render_output_bytes_total", "counter", "Bytes of rendered images sent per template and format")
+metrics.describe("render_output_last_bytes", "gauge", "Size of the last rendered image per template")
+metrics.describe("render_shed_total", "counter", "Render requests answered with text instead, by reason")
+metrics.describe("render_queue", "gauge", "Render scheduler jobs by state (queued/running)")
+metrics.describe("active_pool_size", "gauge", "Active users tracked per group")
+metrics.describe("withdraw_tasks_pending", "gauge", "Pending auto-withdraw tasks")
+metrics.describe("state_entries", "gauge", "Entries held in plugin state by kind")
+metrics.describe("state_shards", "gauge", "Per-group state shards by kind (total/loaded/dirty)")
+metrics.describe("digest_render_seconds", "histogram", "Render time of scheduled daily digest images")
+metrics.describe("digest_sent_total", "counter", "Scheduled daily digests sent per result")
+metrics.describe("rate_limited_total", "counter", "Commands rejected by the per-user / per-group token buckets")
+metrics.describe("rate_limit_buckets", "gauge", "Token buckets currently remembered per level (idle ones expire)")
+
+
+def observe_write(file: str, seconds: float, nbytes: int) -> None:
+    """记录一次落盘的耗时与字节数：save_json、分片 flush、当日记录日期文件和归档写入共用。"""
+    metrics.observe("save_json_seconds", seconds, file=file)
+    metrics.inc("save_json_bytes_total", nbytes, file=file)
+    metrics.set_gauge("save_json_last_bytes", nbytes, file=file)
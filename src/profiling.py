@@ -0,0 +1,115 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+MIN_PROFILE_SECONDS = 1
+MAX_PROFILE_SECONDS = 300
+
+
+class ProfileBusyError(RuntimeError):
+    """已有剖析会话（本插件或其他工具）在运行。"""
+
+
+def _plugin_rows(stats: pstats.Stats, plugin_dir: str) -> list[tuple]:
+    rows = []
+    for (filename, lineno, func), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        if not filename.startswith(plugin_dir):
+            continue
+        rel = os.path.relpath(filename, plugin_dir)
+        rows.append((ct, tt, nc, f"{rel}:{lineno}({func})"))
+    rows.sort(reverse=True)
+    return rows
+
+
+async def run_profile(plugin, seconds: int) -> tuple[str, list[str]]:
+    """在事件循环线程上开启 cProfile + tracemalloc 采样 seconds 秒。
+
+    只在会话期间挂载 profiler，结束后立即卸载，平时没有任何额外开销。
+    返回 (报告文件路径, 摘要行)。
+    """
+    if getattr(plugin, "_profiling", False) or sys.getprofile() is not None:
+        raise ProfileBusyError("已有剖析会话在运行")
+
+    seconds = max(MIN_PROFILE_SECONDS, min(MAX_PROFILE_SECONDS, int(seconds)))
+    plugin_dir = os.path.abspath(plugin.curr_dir) + os.sep
+    started_tracemalloc = not tracemalloc.is_tracing()
+
+    plugin._profiling = True
+    profiler = cProfile.Profile()
+    try:
+        if started_tracemalloc:
+            tracemalloc.start(10)
+        mem_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        mem_after, mem_peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        plugin._profiling = False
+
+    stats = pstats.Stats(profiler)
+    rows = _plugin_rows(stats, plugin_dir)
+    alloc_stats = snapshot.filter_traces(
+        (tracemalloc.Filter(True, plugin_dir + "*"),)
+    ).statistics("lineno")
+
+    # --- 写完整报告 ---
+    out = io.StringIO()
+    out.write(f"# profile {datetime.now().isoformat(timespec='seconds')} ({elapsed:.1f}s)\n")
+    out.write(f"# total calls: {stats.total_calls}, total time: {stats.total_tt:.3f}s\n\n")
+    out.write("## 插件函数（按累计耗时）\n")
+    out.write(f"{'cumtime':>10} {'tottime':>10} {'ncalls':>8}  function\n")
+    for ct, tt, nc, name in rows[:50]:
+        out.write(f"{ct:10.4f} {tt:10.4f} {nc:8d}  {name}\n")
+
+    out.write("\n## 全局热点（按累计耗时，前 30）\n")
+    stats.stream = out
+    stats.sort_stats("cumulative").print_stats(30)
+
+    out.write("## 插件内存分配位置（前 30）\n")
+    for stat in alloc_stats[:30]:
+        frame = stat.traceback[0]
+        rel = os.path.relpath(frame.filename, plugin_dir)
+        out.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {rel}:{frame.lineno}\n")
+    out.write(
+        f"\n# traced memory: before={mem_before / 1024:.1f} KiB "
+        f"after={mem_after / 1024:.1f} KiB peak={mem_peak / 1024:.1f} KiB\n"
+    )
+
+    profile_dir = os.path.join(plugin.data_dir, "profiles")
+    os.makedirs(profile_dir, exist_ok=True)
+    report_path = os.path.join(
+        profile_dir, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt"
+    )
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write(out.getvalue())
+
+    # --- 简短摘要 ---
+    summary = [
+        f"采样 {elapsed:.1f}s，共 {stats.total_calls} 次调用，插件函数 {len(rows)} 个",
+        f"内存：{mem_before / 1024:.0f} → {mem_after / 1024:.0f} KiB（峰值 {mem_peak / 1024:.0f} KiB）",
+    ]
+    if rows:
+        summary.append("累计耗时 Top5：")
+        for ct, _tt, nc, name in rows[:5]:
+            summary.append(f"  {ct * 1000:.1f}ms ×{nc} {name}")
+    if alloc_stats:
+        summary.append("分配 Top3：")
+        for stat in alloc_stats[:3]:
+            frame = stat.traceback[0]
+            rel = os.path.relpath(frame.filename, plugin_dir)
+            summary.append(f"  {stat.size / 1024:.1f} KiB {rel}:{frame.lineno}")
+    return report_path, summary
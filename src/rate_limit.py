@@ -0,0 +1,156 @@
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from .metrics import metrics
+
+# 每个限流器最多记住的桶数，超出时淘汰最久没用的
+DEFAULT_MAX_BUCKETS = 8192
+# 未在默认表和 rate_limit_costs 中列出的指令（帮助、查询、管理指令等）不扣令牌
+DEFAULT_COMMAND_COST = 0.0
+DEFAULT_COMMAND_COSTS = {
+    "draw_wife": 1.0,
+    "show_graph": 5.0,
+    "rbq_ranking": 4.0,
+    "debug_graph": 8.0,
+    "batch_draw": 5.0,
+}
+
+
+class TokenBucketLimiter:
+    """按键分桶的令牌桶：容量 ``capacity``，每秒补充 ``refill_per_second`` 个令牌。
+
+    桶按最近使用顺序存放，补满所需时间内没被用过的桶与新桶等价，检查时从队头顺手删掉，
+    每次检查均摊 O(1)，不需要单独的清理任务。capacity 为 0 时不限流。
+    """
+
+    __slots__ = ("capacity", "refill_per_second", "max_buckets", "_buckets")
+
+    def __init__(
+        self,
+        capacity: float,
+        refill_per_second: float,
+        max_buckets: int = DEFAULT_MAX_BUCKETS,
+    ):
+        self.capacity = max(0.0, float(capacity))
+        self.refill_per_second = max(1e-6, float(refill_per_second))
+        self.max_buckets = max(1, int(max_buckets))
+        # {键: (剩余令牌, 上次更新时刻)}
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _expire(self, now: float) -> None:
+        idle = self.capacity / self.refill_per_second
+        buckets = self._buckets
+        while buckets:
+            _, ts = next(iter(buckets.values()))
+            if now - ts < idle:
+                break
+            buckets.popitem(last=False)
+
+    def _tokens(self, key: Hashable, now: float) -> float:
+        state = self._buckets.get(key)
+        if state is None:
+            return self.capacity
+        tokens, ts = state
+        return min(self.capacity, tokens + (now - ts) * self.refill_per_second)
+
+    def retry_after(self, key: Hashable, cost: float, now: float | None = None) -> float:
+        """令牌不足时返回需要等待的秒数，足够时返回 0（不扣令牌）。"""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        # 代价超过容量时按容量算，否则永远不会放行
+        missing = min(cost, self.capacity) - self._tokens(key, now)
+        return max(0.0, missing / self.refill_per_second)
+
+    def consume(self, key: Hashable, cost: float, now: float | None = None) -> None:
+        if not self.enabled:
+            return
+        now = time.monotonic() if now is None else now
+        tokens = max(0.0, self._tokens(key, now) - min(cost, self.capacity))
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def _limiter_from_config(plugin, prefix: str, capacity: int, per_minute: int) -> TokenBucketLimiter:
+    try:
+        capacity = max(0, int(plugin.config.get(f"{prefix}_capacity", capacity)))
+        per_minute = max(1, int(plugin.config.get(f"{prefix}_refill_per_minute", per_minute)))
+    except Exception:
+        pass
+    return TokenBucketLimiter(capacity, per_minute / 60)
+
+
+def build_rate_limiters(plugin) -> tuple[TokenBucketLimiter, TokenBucketLimiter]:
+    """按配置创建 (每人, 每群) 两级限流器。"""
+    return (
+        _limiter_from_config(plugin, "rate_limit_user", 10, 6),
+        _limiter_from_config(plugin, "rate_limit_group", 30, 20),
+    )
+
+
+def _parse_costs(raw: object) -> dict[str, float]:
+    """把 ``指令:代价`` 列表解析成 {指令: 代价}，未列出的指令用默认值。"""
+    costs = dict(DEFAULT_COMMAND_COSTS)
+    if not isinstance(raw, list):
+        return costs
+    for entry in raw:
+        action, sep, value = str(entry).replace("：", ":").partition(":")
+        if not sep:
+            continue
+        try:
+            costs[action.strip()] = max(0.0, float(value))
+        except ValueError:
+            continue
+    return costs
+
+
+def command_cost(plugin, action: str) -> float:
+    raw = plugin.config.get("rate_limit_costs", [])
+    cache_key = repr(raw)
+    cached = getattr(plugin, "_rate_limit_cost_cache", None)
+    if cached is None or cached[0] != cache_key:
+        cached = (cache_key, _parse_costs(raw))
+        plugin._rate_limit_cost_cache = cached
+    return cached[1].get(action, DEFAULT_COMMAND_COST)
+
+
+def check_rate_limit(plugin, action: str, event) -> float:
+    """按每人 / 每群令牌桶检查一次指令，放行时扣令牌并返回 0，否则返回需要等待的秒数。
+
+    两级都够才同时扣，被群限流时不会白白消耗个人的令牌。
+    """
+    cost = command_cost(plugin, action)
+    if cost <= 0:
+        return 0.0
+    user_limiter, group_limiter = plugin._rate_limiters
+    self_id = str(event.get_self_id())
+    group_id = str(event.get_group_id() or "")
+    user_key = (self_id, str(event.get_sender_id()))
+    group_key = (self_id, group_id)
+    now = time.monotonic()
+
+    wait = user_limiter.retry_after(user_key, cost, now)
+    scope = "user"
+    if group_id:
+        group_wait = group_limiter.retry_after(group_key, cost, now)
+        if group_wait > wait:
+            wait, scope = group_wait, "group"
+    if wait > 0:
+        metrics.inc("rate_limited_total", command=action, scope=scope)
+        return wait
+
+    user_limiter.consume(user_key, cost, now)
+    if group_id:
+        group_limiter.consume(group_key, cost, now)
+    return 0.0
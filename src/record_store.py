@@ -0,0 +1,345 @@
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Any, Iterable, Iterator
+
+from .relation_graph import RelationGraph
+
+# 记录标志位，与归档的 f 列一致
+FLAG_FORCED = 1
+FLAG_AUTO_SET = 2
+FLAG_BATCH = 4
+# 纯数字且能原样还原的 ID 存成 int（不超过 int64，无前导零），其余保持字符串
+_MAX_INT_ID_DIGITS = 18
+# 活跃时间按 uint32 秒存储
+_MAX_SECONDS = 2**32 - 1
+
+
+def compact_id(value: object) -> int | str:
+    if type(value) is int:
+        return value
+    text = str(value)
+    if (
+        text.isascii()
+        and text.isdigit()
+        and len(text) <= _MAX_INT_ID_DIGITS
+        and (text == "0" or text[0] != "0")
+    ):
+        return int(text)
+    return text
+
+
+def to_epoch(timestamp: object) -> int:
+    """旧版记录的 ISO 时间字符串或数字时间戳转为整数秒，无法解析时为 0。"""
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    try:
+        return int(datetime.fromisoformat(str(timestamp)).timestamp())
+    except Exception:
+        return 0
+
+
+class WifeRecord:
+    """一条抽取记录的紧凑表示：ID 为 int、时间为整数秒、强娶 / 自动设置合成一个位域。
+
+    落盘和导出仍用旧版 dict（``to_dict`` / ``from_dict``）；
+    ``get`` / ``[]`` 按旧字段名读取，归档里的 dict 与今天的记录可以交给同一段代码处理。
+    """
+
+    __slots__ = ("user_id", "wife_id", "wife_name", "timestamp", "flags", "target_name")
+
+    def __init__(
+        self,
+        user_id: object,
+        wife_id: object,
+        wife_name: str = "",
+        timestamp: int = 0,
+        flags: int = 0,
+        target_name: str = "",
+    ):
+        self.user_id = compact_id(user_id)
+        self.wife_id = compact_id(wife_id)
+        # 同一个人一天里常被多人抽到，名字字符串共用一份
+        self.wife_name = sys.intern(str(wife_name)) if wife_name else ""
+        self.timestamp = int(timestamp)
+        self.flags = flags
+        self.target_name = target_name
+
+    @classmethod
+    def from_dict(cls, record: dict[str, Any]) -> "WifeRecord":
+        flags = (
+            (FLAG_FORCED if record.get("forced") else 0)
+            | (FLAG_AUTO_SET if record.get("auto_set") else 0)
+            | (FLAG_BATCH if record.get("batch") else 0)
+        )
+        return cls(
+            record.get("user_id"),
+            record.get("wife_id"),
+            record.get("wife_name") or "",
+            to_epoch(record.get("timestamp")),
+            flags,
+            str(record.get("auto_set_target_name") or ""),
+        )
+
+    @property
+    def forced(self) -> bool:
+        return bool(self.flags & FLAG_FORCED)
+
+    @property
+    def auto_set(self) -> bool:
+        return bool(self.flags & FLAG_AUTO_SET)
+
+    @property
+    def batch(self) -> bool:
+        """由“全员分配”产生。"""
+        return bool(self.flags & FLAG_BATCH)
+
+    def time(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp)
+
+    def to_dict(self) -> dict[str, Any]:
+        record = {
+            "user_id": str(self.user_id),
+            "wife_id": str(self.wife_id),
+            "wife_name": self.wife_name,
+            "timestamp": self.time().isoformat(),
+        }
+        if self.flags & FLAG_FORCED:
+            record["forced"] = True
+        if self.flags & FLAG_AUTO_SET:
+            record["auto_set"] = True
+            record["auto_set_target_name"] = self.target_name
+        if self.flags & FLAG_BATCH:
+            record["batch"] = True
+        return record
+
+    # 兼容按 dict 读取记录的旧代码（每次构造一个 dict，热路径请直接用属性）
+    def __getitem__(self, key: str) -> Any:
+        return self.to_dict()[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.to_dict().get(key, default)
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def __repr__(self) -> str:
+        return f"WifeRecord({self.to_dict()!r})"
+
+
+class ActivityTable(MutableMapping):
+    """某群的活跃记录 {QQ号: 最近发言时间（秒）}，按 QQ 号排序存在两列 array 里。
+
+    - 每人 12 字节（int64 QQ 号 + uint32 秒），``dict[str, float]`` 每人约 200 字节；
+    - 查找 / 更新已有用户 O(log n)；新用户需要在数组中间插入，O(n) 但只是一次内存移动；
+    - 非纯数字的 ID（其他平台）放在一个小 dict 里；
+    - 对外是 ``{str: int}`` 的映射接口，落盘时用 ``to_dict`` 转回旧格式。
+    """
+
+    __slots__ = ("_uids", "_ts", "_extra")
+
+    def __init__(self):
+        self._uids = array("q")
+        self._ts = array("I")
+        self._extra: dict[str, int] = {}
+
+    @classmethod
+    def from_dict(cls, raw: Any) -> "ActivityTable":
+        table = cls()
+        if not isinstance(raw, dict):
+            return table
+        pairs = []
+        for uid, ts in raw.items():
+            try:
+                seconds = min(_MAX_SECONDS, max(0, int(ts)))
+            except (TypeError, ValueError):
+                continue
+            key = compact_id(uid)
+            if isinstance(key, int):
+                pairs.append((key, seconds))
+            else:
+                table._extra[key] = seconds
+        pairs.sort()
+        table._uids = array("q", [uid for uid, _ in pairs])
+        table._ts = array("I", [ts for _, ts in pairs])
+        return table
+
+    def to_dict(self) -> dict[str, int]:
+        data = {str(uid): ts for uid, ts in zip(self._uids, self._ts)}
+        data.update(self._extra)
+        return data
+
+    def _find(self, key: int) -> tuple[int, bool]:
+        uids = self._uids
+        i = bisect_left(uids, key)
+        return i, i < len(uids) and uids[i] == key
+
+    def __getitem__(self, uid: str) -> int:
+        key = compact_id(uid)
+        if isinstance(key, str):
+            return self._extra[key]
+        i, found = self._find(key)
+        if not found:
+            raise KeyError(uid)
+        return self._ts[i]
+
+    def get(self, uid: str, default: Any = None) -> Any:
+        try:
+            return self[uid]
+        except KeyError:
+            return default
+
+    def __setitem__(self, uid: str, ts: float) -> None:
+        seconds = min(_MAX_SECONDS, max(0, int(ts)))
+        key = compact_id(uid)
+        if isinstance(key, str):
+            self._extra[key] = seconds
+            return
+        i, found = self._find(key)
+        if found:
+            self._ts[i] = seconds
+        else:
+            self._uids.insert(i, key)
+            self._ts.insert(i, seconds)
+
+    def __delitem__(self, uid: str) -> None:
+        key = compact_id(uid)
+        if isinstance(key, str):
+            del self._extra[key]
+            return
+        i, found = self._find(key)
+        if not found:
+            raise KeyError(uid)
+        del self._uids[i]
+        del self._ts[i]
+
+    def __contains__(self, uid: object) -> bool:
+        key = compact_id(uid)
+        if isinstance(key, str):
+            return key in self._extra
+        return self._find(key)[1]
+
+    def __iter__(self) -> Iterator[str]:
+        for uid in self._uids:
+            yield str(uid)
+        yield from self._extra
+
+    def __len__(self) -> int:
+        return len(self._uids) + len(self._extra)
+
+    def items(self) -> Iterator[tuple[str, int]]:
+        # 直接按列遍历，避免逐个 key 二分查找
+        for uid, ts in zip(self._uids, self._ts):
+            yield str(uid), ts
+        yield from self._extra.items()
+
+    def values(self) -> Iterator[int]:
+        yield from self._ts
+        yield from self._extra.values()
+
+    def prune(self, cutoff: float) -> int:
+        """移除最近发言早于 cutoff 的人，返回移除人数（一次遍历重建两列）。"""
+        keep = [i for i, ts in enumerate(self._ts) if ts >= cutoff]
+        removed = len(self._uids) - len(keep)
+        if removed:
+            self._uids = array("q", [self._uids[i] for i in keep])
+            self._ts = array("I", [self._ts[i] for i in keep])
+        for uid in [uid for uid, ts in self._extra.items() if ts < cutoff]:
+            del self._extra[uid]
+            removed += 1
+        return removed
+
+
+class GroupRecords:
+    """某群当天的抽取记录，按抽取者 / 老婆建立索引。
+
+    - ``has_user`` / ``count_for``：O(1)
+    - ``for_user``：O(k)，k 为该用户今天的记录数
+    - ``remove_user``：O(k)
+    - 记录为 ``WifeRecord``，迭代顺序与插入顺序一致，``to_list()`` 得到与旧版相同的 list[dict] 结构
+    - ``graph``：关系分析，第一次访问时构建，之后随增删记录增量更新
+    - ``version``：每次增删记录加一，用作渲染缓存 / 合并的键
+    """
+
+    __slots__ = ("_records", "_by_user", "_by_wife", "_graph", "_version")
+
+    def __init__(self, records: Iterable[WifeRecord | dict[str, Any]] = ()):
+        # 记录对象本身作键（按身份哈希）的有序集合，索引里直接存记录，不再经过编号
+        self._records: dict[WifeRecord, None] = {}
+        self._by_user: dict[int | str, list[WifeRecord]] = {}
+        self._by_wife: dict[int | str, list[WifeRecord]] = {}
+        self._graph: RelationGraph | None = None
+        self._version = 0
+        for record in records:
+            self.add(record)
+
+    def add(self, record: WifeRecord | dict[str, Any]) -> None:
+        if not isinstance(record, WifeRecord):
+            record = WifeRecord.from_dict(record)
+        self._version += 1
+        self._records[record] = None
+        self._by_user.setdefault(record.user_id, []).append(record)
+        self._by_wife.setdefault(record.wife_id, []).append(record)
+        if self._graph is not None:
+            self._graph.add_record(record)
+
+    # 兼容旧代码里把记录当 list 使用的写法
+    append = add
+
+    def has_user(self, user_id: str) -> bool:
+        return compact_id(user_id) in self._by_user
+
+    def count_for(self, user_id: str) -> int:
+        return len(self._by_user.get(compact_id(user_id), ()))
+
+    def for_user(self, user_id: str) -> list[WifeRecord]:
+        return list(self._by_user.get(compact_id(user_id), ()))
+
+    def drawers_of(self, wife_id: str) -> list[WifeRecord]:
+        """今天把 wife_id 当老婆的记录。"""
+        return list(self._by_wife.get(compact_id(wife_id), ()))
+
+    def remove_user(self, user_id: str) -> list[WifeRecord]:
+        """删除某用户今天的全部记录并返回它们。"""
+        removed = self._by_user.pop(compact_id(user_id), [])
+        for record in removed:
+            del self._records[record]
+            wife_key = record.wife_id
+            drawers = self._by_wife.get(wife_key)
+            if drawers is not None:
+                # 同一个老婆今天通常只有几条记录，按身份线性删除即可
+                drawers[:] = [r for r in drawers if r is not record]
+                if not drawers:
+                    del self._by_wife[wife_key]
+            if self._graph is not None:
+                self._graph.remove_record(record)
+        if removed:
+            self._version += 1
+        return removed
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def graph(self) -> RelationGraph:
+        if self._graph is None:
+            self._graph = RelationGraph(self._records)
+        return self._graph
+
+    def users(self) -> Iterator[str]:
+        return (str(uid) for uid in self._by_user)
+
+    def to_list(self) -> list[dict[str, Any]]:
+        return [record.to_dict() for record in self._records]
+
+    def __iter__(self) -> Iterator[WifeRecord]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __bool__(self) -> bool:
+        return bool(self._records)
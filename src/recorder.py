@@ -0,0 +1,94 @@
+import gzip
+import hashlib
+import json
+import os
+import secrets
+import time
+from datetime import datetime
+
+from astrbot.api import logger
+
+# 每行一个事件：[时间戳, 群, 发送者, 动作, @对象, 标志位]
+FLAG_ADMIN = 1
+FLAG_WAKE = 2
+# 内存里攒够这么多条就立即写出一次，否则随定时 flush 写出
+RECORD_BUFFER_ROWS = 2000
+
+
+class EventRecorder:
+    """匿名事件录制：只记录元数据，用于按真实流量形态回放压测（见 tools/replay.py）。
+
+    - 群号、QQ 号经带盐哈希映射成稳定的数字 ID（盐保存在录制目录，不随文件分发），
+      同一个人在整份录制里 ID 不变，但无法还原；消息正文不落盘，只记录命中的指令动作。
+    - 每天一个 ``events-YYYYMMDD.jsonl.gz``，每次 flush 追加一个 gzip 成员，
+      gzip 读取时会把多个成员当作一个连续流。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._salt = self._load_salt()
+        self._buffer: list[str] = []
+
+    def _load_salt(self) -> bytes:
+        path = os.path.join(self.directory, "salt")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        salt = secrets.token_bytes(16)
+        with open(path, "wb") as f:
+            f.write(salt)
+        return salt
+
+    def anonymize(self, raw: str) -> int:
+        """带盐哈希直接算出匿名 ID，不缓存映射，内存占用与录制过的人数无关。"""
+        if not raw:
+            return 0
+        digest = hashlib.blake2b(raw.encode("utf-8"), key=self._salt, digest_size=6).digest()
+        # 保持为数字，回放时 int(群号) 等调用照常工作
+        return int.from_bytes(digest, "big") or 1
+
+    def record(
+        self,
+        group_id: str,
+        user_id: str,
+        action: str,
+        at: str = "",
+        *,
+        admin: bool = False,
+        wake: bool = False,
+    ) -> None:
+        flags = (FLAG_ADMIN if admin else 0) | (FLAG_WAKE if wake else 0)
+        row = [
+            round(time.time(), 3),
+            self.anonymize(group_id),
+            self.anonymize(user_id),
+            action,
+            self.anonymize(at),
+            flags,
+        ]
+        self._buffer.append(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+        if len(self._buffer) >= RECORD_BUFFER_ROWS:
+            self.flush()
+
+    def flush(self) -> int:
+        """把缓冲追加到当天的录制文件，返回写出的事件数。"""
+        if not self._buffer:
+            return 0
+        rows, self._buffer = self._buffer, []
+        path = os.path.join(self.directory, f"events-{datetime.now():%Y%m%d}.jsonl.gz")
+        try:
+            with gzip.open(path, "ab") as f:
+                f.write(("\n".join(rows) + "\n").encode("utf-8"))
+        except Exception as e:
+            logger.error(f"写入事件录制失败 {path}: {e}")
+            return 0
+        return len(rows)
+
+
+def iter_recording(path: str):
+    """逐行读取录制文件，产出 (时间戳, 群, 发送者, 动作, @对象, 标志位)。"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield tuple(json.loads(line))
@@ -0,0 +1,178 @@
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+if TYPE_CHECKING:
+    from .record_store import WifeRecord
+
+# 新增一条边时向前搜索的最大环长（>=3；长度 2 的环即双向奔赴，单独维护）
+MAX_CYCLE_LENGTH = 6
+# 单条边最多登记的新环数，防止极端稠密的图拖慢抽取
+MAX_CYCLES_PER_EDGE = 20
+
+
+class RelationGraph:
+    """某群当天“抽取者 → 老婆”关系的增量分析。
+
+    - 邻接集合：出边 / 入边，入度即“被多少人抽中”
+    - 双向奔赴：加边时检查反向边，O(1)
+    - 三角恋及更长的环：加边 u→w 时从 w 出发做有深度上限的 DFS 找回到 u 的路径
+    - 圈子（弱连通分量）：并查集；删边后标记失效，下次查询时重建
+
+    自动设置的“对方老婆”记录不算关系（否则每次抽取都会凭空多出一对双向奔赴）。
+    """
+
+    __slots__ = (
+        "_out", "_in", "_edge_count", "_names", "_mutual", "_cycles",
+        "_parent", "_size", "_uf_stale",
+    )
+
+    def __init__(self, records: Iterable["WifeRecord"] = ()):
+        self._out: dict[str, set[str]] = {}
+        self._in: dict[str, set[str]] = {}
+        self._edge_count: dict[tuple[str, str], int] = {}
+        self._names: dict[str, str] = {}
+        self._mutual: set[tuple[str, str]] = set()
+        self._cycles: set[tuple[str, ...]] = set()
+        self._parent: dict[str, str] = {}
+        self._size: dict[str, int] = {}
+        self._uf_stale = False
+        for record in records:
+            self.add_record(record)
+
+    # ---------- 记录事件 ----------
+    def add_record(self, record: "WifeRecord") -> None:
+        if record.auto_set:
+            return
+        user_id, wife_id = str(record.user_id), str(record.wife_id)
+        if record.wife_name:
+            self._names[wife_id] = record.wife_name
+        self._add_edge(user_id, wife_id)
+
+    def remove_record(self, record: "WifeRecord") -> None:
+        if record.auto_set:
+            return
+        self._remove_edge(str(record.user_id), str(record.wife_id))
+
+    # ---------- 边 ----------
+    def _add_edge(self, u: str, w: str) -> None:
+        edge = (u, w)
+        count = self._edge_count.get(edge, 0)
+        self._edge_count[edge] = count + 1
+        if count:
+            return  # 同一对重复抽到，结构不变
+
+        self._out.setdefault(u, set()).add(w)
+        self._in.setdefault(w, set()).add(u)
+        self._in.setdefault(u, set())
+        self._out.setdefault(w, set())
+        if not self._uf_stale:
+            self._union(u, w)
+        if u == w:
+            return
+        if u in self._out[w]:
+            self._mutual.add((u, w) if u < w else (w, u))
+        for path in self._paths_back(w, u):
+            self._cycles.add(_canonical_cycle((u, *path)))
+
+    def _remove_edge(self, u: str, w: str) -> None:
+        edge = (u, w)
+        count = self._edge_count.get(edge, 0)
+        if count > 1:
+            self._edge_count[edge] = count - 1
+            return
+        if not count:
+            return
+        del self._edge_count[edge]
+        self._out[u].discard(w)
+        self._in[w].discard(u)
+        self._mutual.discard((u, w) if u < w else (w, u))
+        if self._cycles:
+            self._cycles = {c for c in self._cycles if not _cycle_has_edge(c, u, w)}
+        for node in (u, w):
+            if not self._out[node] and not self._in[node]:
+                del self._out[node], self._in[node]
+        # 并查集不支持删除，下次查询圈子时重建
+        self._uf_stale = True
+
+    def _paths_back(self, start: str, target: str) -> Iterator[tuple[str, ...]]:
+        """产出 start → … → target 的简单路径（不含 target），长度受 MAX_CYCLE_LENGTH 限制。"""
+        found = 0
+        stack = [(start, (start,))]
+        while stack:
+            node, path = stack.pop()
+            for nxt in self._out.get(node, ()):
+                if nxt == target:
+                    if len(path) >= 2:  # 长度 2 的环由双向奔赴处理
+                        yield path
+                        found += 1
+                        if found >= MAX_CYCLES_PER_EDGE:
+                            return
+                elif nxt not in path and len(path) + 1 < MAX_CYCLE_LENGTH:
+                    stack.append((nxt, path + (nxt,)))
+
+    # ---------- 并查集 ----------
+    def _find(self, x: str) -> str:
+        parent = self._parent
+        root = parent.setdefault(x, x)
+        if root == x:
+            self._size.setdefault(x, 1)
+            return x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def _union(self, a: str, b: str) -> None:
+        ra, rb = self._find(a), self._find(b)
+        if ra == rb:
+            return
+        if self._size[ra] < self._size[rb]:
+            ra, rb = rb, ra
+        self._parent[rb] = ra
+        self._size[ra] += self._size.pop(rb)
+
+    def _rebuild_components(self) -> None:
+        self._parent.clear()
+        self._size.clear()
+        for u, wives in self._out.items():
+            self._find(u)
+            for w in wives:
+                self._union(u, w)
+        self._uf_stale = False
+
+    # ---------- 查询 ----------
+    def name(self, user_id: str) -> str:
+        return self._names.get(user_id) or f"用户({user_id})"
+
+    def most_wanted(self, limit: int = 3) -> list[tuple[str, int]]:
+        """被最多不同的人抽中的群友，只返回入度 >= 2 的。"""
+        ranked = [(w, len(us)) for w, us in self._in.items() if len(us) >= 2]
+        ranked.sort(key=lambda kv: kv[1], reverse=True)
+        return ranked[:limit]
+
+    def mutual_pairs(self) -> list[tuple[str, str]]:
+        return sorted(self._mutual)
+
+    def cycles(self, length: int | None = None) -> list[tuple[str, ...]]:
+        cycles = (c for c in self._cycles if length is None or len(c) == length)
+        return sorted(cycles, key=lambda c: (len(c), c))
+
+    def components(self) -> list[int]:
+        """各圈子（至少两人）的人数，从大到小。"""
+        if self._uf_stale:
+            self._rebuild_components()
+        return sorted((s for s in self._size.values() if s >= 2), reverse=True)
+
+    @property
+    def node_count(self) -> int:
+        return len(self._out)
+
+
+def _canonical_cycle(cycle: tuple[str, ...]) -> tuple[str, ...]:
+    i = cycle.index(min(cycle))
+    return cycle[i:] + cycle[:i]
+
+
+def _cycle_has_edge(cycle: tuple[str, ...], u: str, w: str) -> bool:
+    n = len(cycle)
+    return any(cycle[i] == u and cycle[(i + 1) % n] == w for i in range(n))
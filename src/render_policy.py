@@ -0,0 +1,178 @@
+import io
+import math
+import os
+import time
+
+from astrbot.api import logger
+
+try:
+    from PIL import Image, ImageChops
+except ImportError:  # pillow 是 AstrBot 的依赖，正常不会缺；缺失时跳过裁剪和转码
+    Image = None
+    ImageChops = None
+
+IMAGE_FORMATS = ("auto", "png", "jpeg", "webp")
+# 渲染服务的缩放档位及估算像素数用的倍率；倍率只是近似，偏差会被实际输出字节数校正
+SCALE_LEVELS = (("ultra", 3.0), ("high", 2.0), ("normal", 1.0))
+# 每像素字节数的初始估计（按最终输出算），之后用实际结果做指数平均
+DEFAULT_BYTES_PER_PIXEL = 0.35
+BPP_SMOOTHING = 0.3
+# 有损格式超出预算时每次降低的质量、最低质量
+QUALITY_STEP = 10
+MIN_QUALITY = 50
+# 与背景色差小于该值的像素视为空白（抗锯齿、阴影）
+CROP_TOLERANCE = 12
+CROP_PADDING = 24
+
+
+class RenderPolicy:
+    """图片输出策略：格式、质量、缩放档位与裁剪，来自配置。
+
+    - ``format``：auto 时先用 PNG，超出字节预算改用 JPEG 并逐步降低质量，仍超出则缩小尺寸。
+    - ``scale``：auto 时按模板的历史“每像素字节数”选择不超出预算的最高档位。
+    - ``target_bytes`` 为 0 表示不限大小。
+    """
+
+    __slots__ = ("format", "quality", "scale", "target_bytes", "crop")
+
+    def __init__(self, format="auto", quality=85, scale="auto", target_bytes=0, crop=True):
+        self.format = format
+        self.quality = quality
+        self.scale = scale
+        self.target_bytes = target_bytes
+        self.crop = crop
+
+    @classmethod
+    def from_config(cls, config) -> "RenderPolicy":
+        fmt = str(config.get("render_image_format", "auto")).lower()
+        if fmt == "jpg":
+            fmt = "jpeg"
+        scale = str(config.get("render_scale", "auto")).lower()
+        try:
+            quality = min(100, max(MIN_QUALITY, int(config.get("render_quality", 85))))
+        except Exception:
+            quality = 85
+        try:
+            target_bytes = max(0, int(config.get("render_target_kb", 1024))) * 1024
+        except Exception:
+            target_bytes = 1024 * 1024
+        return cls(
+            format=fmt if fmt in IMAGE_FORMATS else "auto",
+            quality=quality,
+            scale=scale if scale == "auto" or scale in dict(SCALE_LEVELS) else "auto",
+            target_bytes=target_bytes,
+            crop=bool(config.get("render_crop", True)),
+        )
+
+    def choose_scale(self, bytes_per_pixel: float, width: int, height: int) -> tuple[str, float]:
+        if self.scale != "auto":
+            return self.scale, dict(SCALE_LEVELS)[self.scale]
+        if not self.target_bytes:
+            return SCALE_LEVELS[0]
+        for level, factor in SCALE_LEVELS:
+            if width * height * factor * factor * bytes_per_pixel <= self.target_bytes:
+                return level, factor
+        return SCALE_LEVELS[-1]
+
+    def screenshot_options(self, level: str, width: int, height: int) -> dict:
+        # 始终让渲染服务输出无损 PNG，裁剪后再按策略编码，避免二次有损压缩
+        return {
+            "type": "png",
+            "quality": None,
+            "full_page": False,
+            "clip": {"x": 0, "y": 0, "width": width, "height": height},
+            "scale": "device",
+            "device_scale_factor_level": level,
+        }
+
+
+def _content_bbox(img) -> tuple[int, int, int, int] | None:
+    """以左上角像素为背景色，返回非空白内容的外接框（带少量留白）。"""
+    rgb = img.convert("RGB")
+    background = Image.new("RGB", rgb.size, rgb.getpixel((0, 0)))
+    diff = ImageChops.difference(rgb, background).convert("L")
+    bbox = diff.point(lambda v: 255 if v > CROP_TOLERANCE else 0).getbbox()
+    if bbox is None:
+        return None
+    left, top, right, bottom = bbox
+    return (
+        max(0, left - CROP_PADDING),
+        max(0, top - CROP_PADDING),
+        min(rgb.width, right + CROP_PADDING),
+        min(rgb.height, bottom + CROP_PADDING),
+    )
+
+
+def _encode(img, fmt: str, quality: int) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "png":
+        img.save(buf, "PNG")
+    elif fmt == "jpeg":
+        img.convert("RGB").save(buf, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        img.save(buf, "WEBP", quality=quality, method=4)
+    return buf.getvalue()
+
+
+def _shrink(img, data_len: int, budget: int):
+    scale = math.sqrt(budget / data_len) * 0.95
+    size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+    return img.resize(size, Image.LANCZOS)
+
+
+def _fit_budget(img, policy: RenderPolicy):
+    """按策略编码，返回 (数据, 格式, 质量, 尺寸)；尽量不超过字节预算。"""
+    budget = policy.target_bytes
+    lossy = "jpeg" if policy.format == "auto" else policy.format
+
+    if policy.format in ("auto", "png"):
+        data = _encode(img, "png", 0)
+        if not budget or len(data) <= budget:
+            return data, "png", None, img.size
+        if policy.format == "png":
+            img = _shrink(img, len(data), budget)
+            return _encode(img, "png", 0), "png", None, img.size
+
+    quality = policy.quality
+    data = _encode(img, lossy, quality)
+    while budget and len(data) > budget and quality - QUALITY_STEP >= MIN_QUALITY:
+        quality -= QUALITY_STEP
+        data = _encode(img, lossy, quality)
+    if budget and len(data) > budget:
+        img = _shrink(img, len(data), budget)
+        data = _encode(img, lossy, quality)
+    return data, lossy, quality, img.size
+
+
+def process_image(path: str, policy: RenderPolicy) -> tuple[str, dict]:
+    """裁剪并按策略重新编码渲染结果（同步，在线程里调用），返回 (新路径, 统计信息)。"""
+    raw_bytes = os.path.getsize(path)
+    info = {"raw_bytes": raw_bytes, "bytes": raw_bytes, "format": "png", "quality": None, "encode_seconds": 0.0}
+    if Image is None:
+        return path, info
+
+    start = time.perf_counter()
+    with Image.open(path) as src:
+        img = src.copy()
+    info["rendered_size"] = img.size
+    if policy.crop:
+        bbox = _content_bbox(img)
+        if bbox and bbox != (0, 0, img.width, img.height):
+            img = img.crop(bbox)
+    data, fmt, quality, size = _fit_budget(img, policy)
+    out_path = os.path.splitext(path)[0] + (".jpg" if fmt == "jpeg" else f".{fmt}")
+    with open(out_path, "wb") as f:
+        f.write(data)
+    if out_path != path:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.debug(f"删除渲染原图失败 {path}: {e}")
+    info.update(
+        bytes=len(data),
+        format=fmt,
+        quality=quality,
+        size=size,
+        encode_seconds=time.perf_counter() - start,
+    )
+    return out_path, info
@@ -0,0 +1,129 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+from .metrics import metrics
+
+# 优先级：数值越小越先执行
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class RenderScheduler:
+    """渲染调度：全局并发上限 + 优先级队列 + 相同请求合并。
+
+    - 同时最多 ``max_concurrency`` 个渲染在执行，其余按 (优先级, 提交顺序) 排队。
+    - 相同 key 的请求在排队或执行期间只会有一个任务，结果分发给所有等待者。
+    - 某个等待者被取消不会取消共享任务，其他等待者照常拿到结果。
+    """
+
+    def __init__(self, max_concurrency: int = 2):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._heap: list[tuple[int, int, Hashable]] = []
+        self._jobs: dict[Hashable, tuple[str, Callable[[], Awaitable[Any]], float]] = {}
+        self._futures: dict[Hashable, asyncio.Future] = {}
+        self._running: set[asyncio.Task] = set()
+        self._seq = itertools.count()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._heap)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    async def submit(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        *,
+        name: str = "render",
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Any:
+        fut = self._futures.get(key)
+        if fut is not None:
+            metrics.inc("render_coalesced_total", template=name)
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self._futures[key] = fut
+            self._jobs[key] = (name, factory, time.perf_counter())
+            heapq.heappush(self._heap, (priority, next(self._seq), key))
+            self._pump()
+        return await asyncio.shield(fut)
+
+    def _pump(self) -> None:
+        while self._heap and len(self._running) < self.max_concurrency:
+            _priority, _seq, key = heapq.heappop(self._heap)
+            task = asyncio.create_task(self._run(key))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, key: Hashable) -> None:
+        name, factory, enqueued_at = self._jobs.pop(key)
+        fut = self._futures[key]
+        metrics.observe("render_queue_wait_seconds", time.perf_counter() - enqueued_at, template=name)
+        try:
+            result = await factory()
+        except BaseException as e:
+            if not fut.done():
+                fut.set_exception(e)
+                # 没有等待者时避免 "exception was never retrieved" 警告
+                fut.exception()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        else:
+            if not fut.done():
+                fut.set_result(result)
+        finally:
+            self._futures.pop(key, None)
+            self._running.discard(asyncio.current_task())
+            self._pump()
+
+    def cancel_all(self) -> None:
+        for task in tuple(self._running):
+            task.cancel()
+        for fut in self._futures.values():
+            if not fut.done():
+                fut.cancel()
+        self._heap.clear()
+        self._jobs.clear()
+        self._futures.clear()
+
+
+class CircuitBreaker:
+    """渲染熔断：连续失败达到阈值后打开，冷却期内直接跳过渲染；冷却结束放行一次试探。
+
+    试探成功则恢复，失败则重新进入冷却。
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown_seconds: float = 60.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_seconds = max(0.0, float(cooldown_seconds))
+        self.failures = 0
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= self.failure_threshold
+
+    def allow(self) -> bool:
+        if not self.is_open:
+            return True
+        if self._probing or time.monotonic() < self._open_until:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.is_open:
+            self._open_until = time.monotonic() + self.cooldown_seconds
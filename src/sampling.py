@@ -0,0 +1,177 @@
+import math
+import random
+from typing import Iterable
+
+# 指数衰减的相对权重超过 2**REBASE_EXPONENT 时重建（防止浮点溢出 / 精度损失）
+REBASE_EXPONENT = 256.0
+
+
+class FenwickTree:
+    """非负浮点权重的树状数组：单点修改、前缀和、按前缀和定位都是 O(log n)。"""
+
+    __slots__ = ("_tree", "_values")
+
+    def __init__(self, values: Iterable[float] = ()):
+        self._values = [float(v) for v in values]
+        n = len(self._values)
+        tree = [0.0] * (n + 1)
+        # O(n) 建树
+        for i in range(1, n + 1):
+            tree[i] += self._values[i - 1]
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _prefix(self, i: int) -> float:
+        total = 0.0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def append(self, value: float) -> int:
+        """追加一个位置，返回它的下标。"""
+        i = len(self._values) + 1
+        self._values.append(float(value))
+        self._tree.append(float(value) + self._prefix(i - 1) - self._prefix(i - (i & -i)))
+        return i - 1
+
+    def get(self, index: int) -> float:
+        return self._values[index]
+
+    def set(self, index: int, value: float) -> None:
+        value = float(value)
+        delta = value - self._values[index]
+        if not delta:
+            return
+        self._values[index] = value
+        i, n = index + 1, len(self._values)
+        while i <= n:
+            self._tree[i] += delta
+            i += i & -i
+
+    def total(self) -> float:
+        return self._prefix(len(self._values))
+
+    def find(self, target: float) -> int:
+        """返回前缀和首次超过 target 的下标（0 <= target < total）。"""
+        n = len(self._values)
+        pos = 0
+        step = 1 << n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= n and self._tree[nxt] <= target:
+                pos = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        return min(pos, n - 1)
+
+
+class WeightedPool:
+    """按用户 id 索引的加权抽样池，权重修改与抽样均为 O(log n)。
+
+    移除的用户把权重置 0 并回收位置，下次加入的新用户复用该位置。
+    """
+
+    __slots__ = ("_tree", "_ids", "_index", "_free", "weighting", "origin")
+
+    def __init__(
+        self,
+        weights: dict[str, float] | None = None,
+        *,
+        weighting: "DrawWeighting | None" = None,
+        origin: float = 0.0,
+    ):
+        weights = weights or {}
+        self._ids: list[str | None] = list(weights)
+        self._index = {uid: i for i, uid in enumerate(self._ids)}
+        self._tree = FenwickTree(weights.values())
+        self._free: list[int] = []
+        # 构建时使用的权重曲线与时间基准，配置变化或需要重建时由调用方比较
+        self.weighting = weighting
+        self.origin = origin
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self._index
+
+    def weight(self, user_id: str) -> float:
+        i = self._index.get(user_id)
+        return 0.0 if i is None else self._tree.get(i)
+
+    def set(self, user_id: str, weight: float) -> None:
+        i = self._index.get(user_id)
+        if i is None:
+            if self._free:
+                i = self._free.pop()
+                self._ids[i] = user_id
+                self._tree.set(i, weight)
+            else:
+                i = self._tree.append(weight)
+                self._ids.append(user_id)
+            self._index[user_id] = i
+        else:
+            self._tree.set(i, weight)
+
+    def discard(self, user_id: str) -> None:
+        i = self._index.pop(user_id, None)
+        if i is None:
+            return
+        self._tree.set(i, 0.0)
+        self._ids[i] = None
+        self._free.append(i)
+
+    def sample(self, rng: random.Random | None = None) -> str | None:
+        total = self._tree.total()
+        if total <= 0:
+            return None
+        rng = rng or random
+        for _ in range(4):
+            i = self._tree.find(rng.random() * total)
+            # 浮点误差可能落到权重为 0 的位置上，重抽即可
+            if self._ids[i] is not None and self._tree.get(i) > 0:
+                return self._ids[i]
+        return None
+
+
+class DrawWeighting:
+    """抽取权重曲线。
+
+    - ``uniform``：等概率（默认，与旧版一致）
+    - ``recency``：按最后发言时间指数衰减，half_life 小时后权重减半。
+      所有人随时间衰减的倍数相同，因此只需存相对权重 2**((ts - origin) / half_life)，
+      时间流逝不需要更新任何权重，只有发言的人需要 O(log n) 更新。
+    - ``activity``：按发言次数增长，权重 = 次数 ** exponent（exponent < 1 时抑制刷屏）
+    """
+
+    __slots__ = ("mode", "half_life_seconds", "exponent")
+
+    MODES = ("uniform", "recency", "activity")
+
+    def __init__(self, mode: str = "uniform", half_life_hours: float = 72.0, exponent: float = 0.5):
+        self.mode = mode if mode in self.MODES else "uniform"
+        self.half_life_seconds = max(1.0, float(half_life_hours) * 3600)
+        self.exponent = max(0.0, float(exponent))
+
+    @property
+    def key(self) -> tuple:
+        return (self.mode, self.half_life_seconds, self.exponent)
+
+    def weight(self, last_active: float, count: int, origin: float) -> float:
+        if self.mode == "recency":
+            return math.pow(2.0, (last_active - origin) / self.half_life_seconds)
+        if self.mode == "activity":
+            return math.pow(max(1, count), self.exponent)
+        return 1.0
+
+    def needs_rebase(self, last_active: float, origin: float) -> bool:
+        return (
+            self.mode == "recency"
+            and (last_active - origin) / self.half_life_seconds > REBASE_EXPONENT
+        )
@@ -0,0 +1,342 @@
+import gzip
+import json
+import os
+import time
+from collections.abc import MutableMapping
+from typing import Any, Callable, Iterator
+from urllib.parse import quote, unquote
+
+from astrbot.api import logger
+
+from .metrics import observe_write
+from .record_store import GroupRecords
+
+_MISSING = object()
+
+
+def _shard_filename(key: str, compress: bool) -> str:
+    # 群号之外的键（如联盟、多账号前缀）可能含特殊字符，统一转义成安全文件名
+    return quote(key, safe="") + (".json.gz" if compress else ".json")
+
+
+def _dump_bytes(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ShardedStore(MutableMapping):
+    """按群分片的 JSON 状态：一个键（群）一个文件。
+
+    - 启动时只列目录，不解析任何分片；某个群第一次被访问时才加载它的分片。
+    - 直接修改嵌套结构后需调用 ``mark_dirty(key)``；``flush()`` 只重写脏分片。
+    - 可选 gzip 压缩；读取时两种格式都认，切换配置后下次写入会自动转换。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        compress: bool = False,
+        kind: str | None = None,
+        decode: Callable[[Any], Any] | None = None,
+        encode: Callable[[Any], Any] | None = None,
+    ):
+        self.directory = directory
+        self.compress = compress
+        self.kind = kind or os.path.basename(directory)
+        self._decode = decode
+        self._encode = encode
+        os.makedirs(directory, exist_ok=True)
+
+        self._keys: set[str] = self._scan()
+        self._loaded: dict[str, Any] = {}
+        self._last_access: dict[str, float] = {}
+        self._dirty: set[str] = set()
+        self._deleted: set[str] = set()
+
+    # ---------- 磁盘 ----------
+    def _scan(self) -> set[str]:
+        keys = set()
+        for name in os.listdir(self.directory):
+            if name.endswith(".json.gz"):
+                keys.add(unquote(name[: -len(".json.gz")]))
+            elif name.endswith(".json"):
+                keys.add(unquote(name[: -len(".json")]))
+        return keys
+
+    def _path(self, key: str, compress: bool) -> str:
+        return os.path.join(self.directory, _shard_filename(key, compress))
+
+    def _read(self, key: str) -> Any:
+        for compress in (self.compress, not self.compress):
+            path = self._path(key, compress)
+            if not os.path.exists(path):
+                continue
+            try:
+                opener = gzip.open if compress else open
+                with opener(path, "rb") as f:
+                    raw = json.loads(f.read().decode("utf-8"))
+            except Exception as e:
+                logger.error(f"读取分片失败 {path}: {e}")
+                return _MISSING
+            return self._decode(raw) if self._decode else raw
+        return _MISSING
+
+    def _remove_files(self, key: str) -> None:
+        for compress in (True, False):
+            path = self._path(key, compress)
+            if os.path.exists(path):
+                os.remove(path)
+
+    # ---------- Mapping 接口 ----------
+    def __getitem__(self, key: str) -> Any:
+        key = str(key)
+        value = self._loaded.get(key, _MISSING)
+        if value is _MISSING:
+            if key not in self._keys:
+                raise KeyError(key)
+            value = self._read(key)
+            if value is _MISSING:
+                self._keys.discard(key)
+                raise KeyError(key)
+            self._loaded[key] = value
+        self._last_access[key] = time.monotonic()
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        key = str(key)
+        self._keys.add(key)
+        self._loaded[key] = value
+        self._last_access[key] = time.monotonic()
+        self._deleted.discard(key)
+        self._dirty.add(key)
+
+    def __delitem__(self, key: str) -> None:
+        key = str(key)
+        if key not in self._keys:
+            raise KeyError(key)
+        self._keys.discard(key)
+        self._loaded.pop(key, None)
+        self._last_access.pop(key, None)
+        self._dirty.discard(key)
+        self._deleted.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        return str(key) in self._keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._keys))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self) -> None:
+        # 不逐个加载分片，直接标记删除
+        self._deleted.update(self._keys)
+        self._keys.clear()
+        self._loaded.clear()
+        self._last_access.clear()
+        self._dirty.clear()
+
+    # ---------- 分片管理 ----------
+    def mark_dirty(self, key: str) -> None:
+        key = str(key)
+        if key in self._keys:
+            self._dirty.add(key)
+
+    def is_loaded(self, key: str) -> bool:
+        return str(key) in self._loaded
+
+    def peek(self, key: str, default: Any = None) -> Any:
+        """读取分片但不放进内存缓存（导出等一次性遍历使用，内存占用不随群数增长）。"""
+        key = str(key)
+        value = self._loaded.get(key, _MISSING)
+        if value is _MISSING and key in self._keys:
+            value = self._read(key)
+        return default if value is _MISSING else value
+
+    def read_stored(self, key: str, default: Any = None) -> Any:
+        """只读磁盘上已保存的版本，不碰内存缓存，可以在线程里调用。"""
+        value = self._read(str(key))
+        return default if value is _MISSING else value
+
+    def loaded_items(self) -> list[tuple[str, Any]]:
+        """只返回已加载的分片，不触发磁盘读取（指标采集等场景使用）。"""
+        return list(self._loaded.items())
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty) + len(self._deleted)
+
+    def flush(self) -> int:
+        """写回脏分片并删除已移除的分片，返回写入字节数。"""
+        if not self._dirty and not self._deleted:
+            return 0
+        start = time.perf_counter()
+        written = 0
+        for key in tuple(self._deleted):
+            try:
+                self._remove_files(key)
+            except Exception as e:
+                logger.error(f"删除分片失败 {self.kind}/{key}: {e}")
+                continue
+            self._deleted.discard(key)
+
+        for key in tuple(self._dirty):
+            value = self._loaded.get(key, _MISSING)
+            if value is _MISSING:
+                self._dirty.discard(key)
+                continue
+            try:
+                payload = _dump_bytes(self._encode(value) if self._encode else value)
+                if self.compress:
+                    payload = gzip.compress(payload, compresslevel=6)
+                path = self._path(key, self.compress)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+                # 切换压缩配置后清掉另一种格式的旧文件
+                stale = self._path(key, not self.compress)
+                if os.path.exists(stale):
+                    os.remove(stale)
+            except Exception as e:
+                logger.error(f"保存分片失败 {self.kind}/{key}: {e}")
+                continue
+            written += len(payload)
+            self._dirty.discard(key)
+
+        observe_write(self.kind, time.perf_counter() - start, written)
+        return written
+
+    def evict(self, keys) -> int:
+        """把指定分片移出内存（有未保存修改的跳过），返回移出数量。"""
+        evicted = 0
+        for key in keys:
+            key = str(key)
+            if key in self._dirty or key not in self._loaded:
+                continue
+            del self._loaded[key]
+            self._last_access.pop(key, None)
+            evicted += 1
+        return evicted
+
+    def evict_idle(self, max_idle_seconds: float) -> int:
+        """把长时间未访问、且没有未保存修改的分片移出内存，返回移出数量。"""
+        deadline = time.monotonic() - max_idle_seconds
+        evicted = 0
+        for key, last in tuple(self._last_access.items()):
+            if last >= deadline or key in self._dirty:
+                continue
+            self._loaded.pop(key, None)
+            self._last_access.pop(key, None)
+            evicted += 1
+        return evicted
+
+    def migrate_from(self, legacy_path: str) -> int:
+        """把旧版单文件 JSON（{gid: ...}）拆成分片，完成后改名为 *.migrated，返回迁移的群数。"""
+        if not os.path.exists(legacy_path):
+            return 0
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"读取旧数据文件失败 {legacy_path}: {e}")
+            return 0
+        if not isinstance(data, dict):
+            return 0
+        for key, value in data.items():
+            self[key] = self._decode(value) if self._decode else value
+        self.flush()
+        os.replace(legacy_path, f"{legacy_path}.migrated")
+        logger.info(f"已将 {os.path.basename(legacy_path)} 迁移为 {len(data)} 个分片")
+        return len(data)
+
+
+class DailyRecords:
+    """当天的抽取记录：日期写在 meta 文件里，每个群一个分片。
+
+    内存里每个群是一个带索引的 ``GroupRecords``，落盘时仍是 ``{"records": [...]}``。
+
+    每个分片里也带上日期，换日时即使在写 meta 与删除旧分片之间崩溃，
+    重启后旧日期的分片也会被当作不存在，不会串到新的一天。
+    """
+
+    def __init__(self, directory: str, meta_path: str, *, compress: bool = False):
+        self.meta_path = meta_path
+        self.date = ""
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    self.date = str(json.load(f).get("date", ""))
+            except Exception as e:
+                logger.error(f"读取记录日期失败 {meta_path}: {e}")
+        self.groups = ShardedStore(
+            directory,
+            compress=compress,
+            kind="wife_records",
+            decode=self._decode_group,
+            encode=self._encode_group,
+        )
+
+    def _decode_group(self, raw: Any) -> GroupRecords:
+        if not isinstance(raw, dict):
+            return GroupRecords()
+        if raw.get("date", self.date) != self.date:
+            return GroupRecords()
+        return GroupRecords(raw.get("records", []))
+
+    def _encode_group(self, group: GroupRecords) -> dict:
+        return {"date": self.date, "records": group.to_list()}
+
+    def _write_meta(self) -> None:
+        start = time.perf_counter()
+        payload = json.dumps({"date": self.date}).encode("utf-8")
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, self.meta_path)
+        observe_write(os.path.basename(self.meta_path), time.perf_counter() - start, len(payload))
+
+    def group_records(self, group_id: str) -> GroupRecords:
+        """只读访问某群今天的记录，不存在时返回空记录（不会创建分片）。"""
+        return self.groups.get(str(group_id)) or GroupRecords()
+
+    def ensure_group(self, group_id: str) -> GroupRecords:
+        return self.groups.setdefault(str(group_id), GroupRecords())
+
+    def commit(self, group_id: str) -> None:
+        """标记某群记录已修改并立即落盘（只写这个群的分片）。"""
+        self.groups.mark_dirty(str(group_id))
+        self.groups.flush()
+
+    def reset(self, date: str) -> None:
+        self.groups.clear()
+        self.date = date
+        self._write_meta()
+        self.groups.flush()
+
+    def flush(self) -> int:
+        if not os.path.exists(self.meta_path):
+            self._write_meta()
+        return self.groups.flush()
+
+    def migrate_from(self, legacy_path: str) -> int:
+        if not os.path.exists(legacy_path):
+            return 0
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"读取旧数据文件失败 {legacy_path}: {e}")
+            return 0
+        if not isinstance(data, dict):
+            return 0
+        self.date = str(data.get("date", ""))
+        self._write_meta()
+        groups = data.get("groups", {}) or {}
+        for gid, group in groups.items():
+            self.groups[gid] = GroupRecords(group.get("records", []))
+        self.groups.flush()
+        os.replace(legacy_path, f"{legacy_path}.migrated")
+        logger.info(f"已将 {os.path.basename(legacy_path)} 迁移为 {len(groups)} 个分片")
+        return len(groups)
@@ -0,0 +1,313 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import date, datetime
+from typing import Callable, Iterable, Iterator
+
+from astrbot.api import logger
+
+from .archive import iter_dates
+from .core import ensure_today_records
+from .record_store import ActivityTable, to_epoch
+
+EXPORT_KINDS = ("activity", "records", "cooldowns", "rbq")
+CSV_FIELDS = (
+    "kind", "group_id", "user_id", "wife_id", "wife_name", "date", "ts", "forced", "auto_set", "batch",
+)
+# 写出时每攒够这么多行写一次文件；导入时每批应用并落盘一次
+EXPORT_CHUNK_ROWS = 1000
+IMPORT_BATCH_ROWS = 2000
+
+
+class TransferOptions:
+    """导出 / 导入指令参数，如 ``records,rbq group=123 from=2026-10-01 to=2026-10-19 csv gz``。"""
+
+    __slots__ = ("kinds", "groups", "start", "end", "fmt", "compress")
+
+    def __init__(self):
+        self.kinds: tuple[str, ...] = EXPORT_KINDS
+        self.groups: set[str] | None = None
+        self.start: date | None = None
+        self.end: date | None = None
+        self.fmt = "jsonl"
+        self.compress = False
+
+    @classmethod
+    def parse(cls, args: Iterable[str]) -> "TransferOptions":
+        opts = cls()
+        for arg in args:
+            key, sep, value = arg.partition("=")
+            if sep:
+                if key in ("group", "groups"):
+                    opts.groups = {g for g in value.replace("，", ",").split(",") if g}
+                elif key == "from":
+                    opts.start = date.fromisoformat(value)
+                elif key == "to":
+                    opts.end = date.fromisoformat(value)
+                else:
+                    raise ValueError(f"未知参数 {key}")
+            elif arg in ("csv", "jsonl"):
+                opts.fmt = arg
+            elif arg in ("gz", "gzip"):
+                opts.compress = True
+            elif all(k in EXPORT_KINDS for k in arg.split(",")):
+                opts.kinds = tuple(arg.split(","))
+            else:
+                raise ValueError(f"未知参数 {arg}")
+        return opts
+
+    def in_range(self, day: date) -> bool:
+        return (self.start is None or day >= self.start) and (self.end is None or day <= self.end)
+
+    def wants_group(self, group_id: str) -> bool:
+        return self.groups is None or group_id in self.groups
+
+
+def _ts_day(ts: object) -> date | None:
+    try:
+        if isinstance(ts, (int, float)):
+            return datetime.fromtimestamp(ts).date()
+        return datetime.fromisoformat(str(ts)).date()
+    except Exception:
+        return None
+
+
+# ---------- 导出 ----------
+def _snapshot_shards(store, opts: TransferOptions, copy: Callable) -> list[tuple[str, Callable]]:
+    """在事件循环里给分片拍快照：已加载的当场复制，未加载的留到线程里从磁盘读。"""
+    shards = []
+    for gid in sorted(store):
+        if not opts.wants_group(gid):
+            continue
+        if store.is_loaded(gid):
+            value = copy(store.peek(gid))
+            shards.append((gid, lambda value=value: value))
+        else:
+            shards.append((gid, lambda gid=gid: copy(store.read_stored(gid))))
+    return shards
+
+
+def iter_export_rows(plugin, opts: TransferOptions) -> Iterator[dict]:
+    """逐行产出要导出的数据。
+
+    本函数在事件循环里调用，先取好分片的键和内存中分片的副本，返回的生成器只读快照、
+    磁盘分片和归档，可以交给线程消费。未加载的分片不进入内存缓存，归档按天流式解压。
+    """
+    def copy_users(users) -> dict:
+        return dict(users) if users else {}
+
+    def copy_group(group) -> list[dict]:
+        return group.to_list() if group else []
+
+    shards = []
+    for kind, store in (
+        ("activity", plugin.active_users),
+        ("cooldowns", plugin.forced_records),
+        ("rbq", plugin.rbq_stats),
+    ):
+        if kind in opts.kinds:
+            shards.append((kind, _snapshot_shards(store, opts, copy_users)))
+    today_groups = []
+    today = plugin.records.date
+    if "records" in opts.kinds and today and opts.in_range(date.fromisoformat(today)):
+        today_groups = _snapshot_shards(plugin.records.groups, opts, copy_group)
+    return _iter_snapshot_rows(plugin.archive, opts, shards, today, today_groups)
+
+
+def _iter_snapshot_rows(archive, opts, shards, today, today_groups) -> Iterator[dict]:
+    for kind, snapshot in shards:
+        for gid, load in snapshot:
+            for uid, value in load().items():
+                for ts in value if isinstance(value, list) else (value,):
+                    day = _ts_day(ts)
+                    if day is not None and opts.in_range(day):
+                        yield {"kind": kind, "group_id": gid, "user_id": uid, "ts": ts}
+
+    if "records" not in opts.kinds:
+        return
+    months = archive.months()
+    if months:
+        first = date.fromisoformat(f"{months[0]}-01")
+        start = max(first, opts.start) if opts.start else first
+        end = opts.end or date.today()
+        for d in iter_dates(start, end):
+            day = d.isoformat()
+            for r in archive.iter_day(day, opts.groups):
+                yield _record_row(day, r["group_id"], r)
+    for gid, load in today_groups:
+        for r in load():
+            yield _record_row(today, gid, r)
+
+
+def _record_row(day: str, gid: str, r: dict) -> dict:
+    return {
+        "kind": "records",
+        "group_id": gid,
+        "user_id": str(r.get("user_id")),
+        "wife_id": str(r.get("wife_id")),
+        "wife_name": r.get("wife_name", ""),
+        "date": day,
+        "ts": r.get("timestamp"),
+        "forced": bool(r.get("forced")),
+        "auto_set": bool(r.get("auto_set")),
+        "batch": bool(r.get("batch")),
+    }
+
+
+def _open_text(path: str, mode: str, compress: bool):
+    if compress:
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def write_export(rows: Iterable[dict], path: str, *, fmt: str, compress: bool) -> int:
+    """把行流写入文件（按块写出），返回行数。先写临时文件，完成后再改名。"""
+    tmp_path = f"{path}.tmp"
+    count = 0
+    with _open_text(tmp_path, "w", compress) as f:
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        if fmt == "csv":
+            writer.writeheader()
+        for row in rows:
+            if fmt == "csv":
+                writer.writerow(row)
+            else:
+                buf.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+                buf.write("\n")
+            count += 1
+            if count % EXPORT_CHUNK_ROWS == 0:
+                f.write(buf.getvalue())
+                buf.seek(0)
+                buf.truncate()
+        f.write(buf.getvalue())
+    os.replace(tmp_path, path)
+    return count
+
+
+# ---------- 导入 ----------
+def iter_import_rows(path: str) -> Iterator[dict]:
+    """按扩展名识别 .jsonl / .csv（可带 .gz），逐行产出。"""
+    compress = path.endswith(".gz")
+    base = path[:-3] if compress else path
+    with _open_text(path, "r", compress) as f:
+        if base.endswith(".csv"):
+            for row in csv.DictReader(f):
+                row["forced"] = row.get("forced") == "True"
+                row["auto_set"] = row.get("auto_set") == "True"
+                row["batch"] = row.get("batch") == "True"
+                ts = row.get("ts", "")
+                try:
+                    row["ts"] = float(ts)
+                except ValueError:
+                    pass  # 当天记录的时间是 ISO 字符串
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _take(rows: Iterator[dict], n: int) -> list[dict]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= n:
+            break
+    return batch
+
+
+def _apply_batch(plugin, batch: list[dict], counts: dict[str, int]) -> dict[str, dict[str, list[dict]]]:
+    """把一批行应用到内存状态，返回要写入归档的历史记录 {日期: {群号: [记录]}}。"""
+    archive_days: dict[str, dict[str, list[dict]]] = {}
+    for row in batch:
+        kind, gid, uid = row.get("kind"), str(row.get("group_id")), str(row.get("user_id"))
+        if kind == "activity":
+            users = plugin.active_users.setdefault(gid, ActivityTable())
+            users[uid] = max(float(row["ts"]), users.get(uid, 0))
+            plugin.active_users.mark_dirty(gid)
+        elif kind == "cooldowns":
+            users = plugin.forced_records.setdefault(gid, {})
+            users[uid] = max(float(row["ts"]), users.get(uid, 0))
+            plugin.forced_records.mark_dirty(gid)
+        elif kind == "rbq":
+            timestamps = plugin.rbq_stats.setdefault(gid, {}).setdefault(uid, [])
+            if float(row["ts"]) not in timestamps:
+                timestamps.append(float(row["ts"]))
+                plugin.rbq_stats.mark_dirty(gid)
+        elif kind == "records":
+            record = {
+                "user_id": uid,
+                "wife_id": str(row.get("wife_id")),
+                "wife_name": row.get("wife_name", ""),
+                "timestamp": row.get("ts"),
+            }
+            if row.get("forced"):
+                record["forced"] = True
+            if row.get("auto_set"):
+                record["auto_set"] = True
+            if row.get("batch"):
+                record["batch"] = True
+            if row.get("date") == plugin.records.date:
+                group = plugin.records.ensure_group(gid)
+                if not any(
+                    str(r.wife_id) == record["wife_id"] and r.timestamp == to_epoch(record["timestamp"])
+                    for r in group.for_user(uid)
+                ):
+                    group.add(record)
+                    plugin.records.groups.mark_dirty(gid)
+            else:
+                archive_days.setdefault(row["date"], {}).setdefault(gid, []).append(record)
+        else:
+            counts["skipped"] = counts.get("skipped", 0) + 1
+            continue
+        counts[kind] = counts.get(kind, 0) + 1
+    return archive_days
+
+
+def _archive_batch(archive, archive_days: dict[str, dict[str, list[dict]]]) -> None:
+    # 历史记录写入归档；已存在的（同一人、同一老婆、同一时间）跳过，重复导入不会重复写
+    for day, groups in archive_days.items():
+        d = date.fromisoformat(day)
+        fresh: dict[str, list[dict]] = {}
+        for gid, records in groups.items():
+            existing = {
+                (r["user_id"], r["wife_id"], r["timestamp"])
+                for r in archive.iter_group_records(gid, d, d)
+            }
+            new = [
+                r for r in records
+                if (r["user_id"], r["wife_id"], to_epoch(r["timestamp"])) not in existing
+            ]
+            if new:
+                fresh[gid] = new
+        if fresh:
+            archive.archive_day(day, fresh)
+
+
+async def import_file(plugin, path: str) -> dict[str, int]:
+    """分批导入：在线程里读取解析一批，回到事件循环应用到状态并落盘，历史记录再到线程里写归档。"""
+    # 先完成可能待处理的换日，确保“今天”的记录进当日分片、其余进归档
+    ensure_today_records(plugin)
+    rows = iter_import_rows(path)
+    counts: dict[str, int] = {}
+    batches = 0
+    try:
+        while True:
+            batch = await asyncio.to_thread(_take, rows, IMPORT_BATCH_ROWS)
+            if not batch:
+                break
+            archive_days = _apply_batch(plugin, batch, counts)
+            if archive_days:
+                await asyncio.to_thread(_archive_batch, plugin.archive, archive_days)
+            for store in plugin._state_stores().values():
+                store.flush()
+            batches += 1
+    finally:
+        # 解析或应用出错时也关掉生成器，释放文件句柄
+        rows.close()
+    logger.info(f"[抽老婆] 从 {path} 导入完成，共 {batches} 批：{counts}")
+    return counts
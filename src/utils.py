@@ -1,10 +1,13 @@
 import os
 import json
 import re
+import time
 from astrbot.api import logger
 import astrbot.api.message_components as Comp
 from astrbot.api.event import AstrMessageEvent
 
+from .metrics import observe_write
+
 _CQ_AT_RE = re.compile(r"\[CQ:at,qq=(\d+)\]", re.IGNORECASE)
 _LOG_AT_RE = re.compile(r"\[At:(\d+)\]")
 _PLAIN_AT_RE = re.compile(r"[@＠](\d{5,12})")
@@ -20,6 +23,7 @@ def load_json(path: str, default: object):
         return default
 
 def save_json(path: str, data: dict, records_file: str = None, config: object = None):
+    start = time.perf_counter()
     try:
         # 只要保存的文件是 active_file，就强制执行清理
         if records_file and path == records_file:
@@ -51,8 +55,11 @@ def save_json(path: str, data: dict, records_file: str = None, config: object =
                 data.clear()
                 data.update(new_data)
 
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        payload = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(payload)
+
+        observe_write(os.path.basename(path), time.perf_counter() - start, len(payload))
     except Exception as e:
         logger.error(f"保存数据失败: {e}")
 
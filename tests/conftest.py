@@ -0,0 +1,60 @@
+"""测试按包加载插件模块（与 tools/bench_memory.py 相同的做法）。
+
+依赖 AstrBot 的模块（如 ``src/core.py``）在未安装 AstrBot 时跳过相关测试。
+"""
+
+import importlib
+import importlib.machinery
+import importlib.util
+import os
+import sys
+
+import pytest
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "wifepicker_tests"
+
+
+def load_plugin_module(name: str):
+    if PACKAGE not in sys.modules:
+        spec = importlib.machinery.ModuleSpec(PACKAGE, None, is_package=True)
+        spec.submodule_search_locations = [PLUGIN_DIR]
+        sys.modules[PACKAGE] = importlib.util.module_from_spec(spec)
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+
+@pytest.fixture(scope="session")
+def sampling():
+    return load_plugin_module("src.sampling")
+
+
+@pytest.fixture(scope="session")
+def astrbot(tmp_path_factory):
+    # AstrBot 导入时会在当前目录下创建 data/，测试时放到临时目录
+    os.environ.setdefault("ASTRBOT_ROOT", str(tmp_path_factory.mktemp("astrbot")))
+    return pytest.importorskip("astrbot")
+
+
+@pytest.fixture(scope="session")
+def onebot_api():
+    return load_plugin_module("onebot_api")
+
+
+@pytest.fixture(scope="session")
+def core(astrbot):
+    return load_plugin_module("src.core")
+
+
+@pytest.fixture(scope="session")
+def archive(astrbot):
+    return load_plugin_module("src.archive")
+
+
+@pytest.fixture(scope="session")
+def fake_onebot():
+    spec = importlib.util.spec_from_file_location(
+        "fake_onebot", os.path.join(PLUGIN_DIR, "tools", "fake_onebot.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
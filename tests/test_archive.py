@@ -0,0 +1,48 @@
+import os
+from datetime import date
+
+RECORD = {"user_id": "1", "wife_id": "2", "wife_name": "x", "timestamp": 1_790_000_000}
+
+
+def make_archive(archive, tmp_path, days):
+    store = archive.DrawArchive(str(tmp_path))
+    for day in days:
+        store.archive_day(day, {"100": {"records": [RECORD]}})
+    return store
+
+
+def test_prune_keeps_days_after_cutoff(archive, tmp_path):
+    store = make_archive(archive, tmp_path, ["2026-09-01", "2026-09-20"])
+    assert store.prune_before(date(2026, 9, 10)) == 1
+    assert sorted(os.listdir(tmp_path / "2026-09")) == ["20", "index.json"]
+    assert [r["date"] for r in store.iter_group_records("100", date(2026, 9, 1), date(2026, 9, 30))] == [
+        "2026-09-20"
+    ]
+
+
+def test_prune_with_corrupt_index_keeps_later_days(archive, tmp_path):
+    store = make_archive(archive, tmp_path, ["2026-09-01", "2026-09-20"])
+    (tmp_path / "2026-09" / "index.json").write_text("{broken", encoding="utf-8")
+    store.prune_before(date(2026, 9, 10))
+    # 索引读不出来时不能按“索引里没有群”把整个月份目录删掉
+    assert sorted(os.listdir(tmp_path / "2026-09")) == ["20", "index.json"]
+    assert os.listdir(tmp_path / "2026-09" / "20")
+
+
+def test_prune_removes_empty_month(archive, tmp_path):
+    store = make_archive(archive, tmp_path, ["2026-08-05", "2026-08-06", "2026-09-20"])
+    (tmp_path / "2026-08" / "index.json").write_text("", encoding="utf-8")
+    assert store.prune_before(date(2026, 9, 1)) == 2
+    assert sorted(os.listdir(tmp_path)) == ["2026-09"]
+    assert store.months() == ["2026-09"]
+
+
+def test_batch_flag_survives_archiving(archive, tmp_path):
+    store = archive.DrawArchive(str(tmp_path))
+    store.archive_day(
+        "2026-09-01",
+        {"100": {"records": [RECORD, {**RECORD, "user_id": "3", "batch": True}]}},
+    )
+    rows = {r["user_id"]: r for r in store.iter_group_records("100", date(2026, 9, 1), date(2026, 9, 1))}
+    assert rows["3"]["batch"] is True
+    assert "batch" not in rows["1"]
@@ -0,0 +1,151 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+GROUP = "100"
+MEMBERS = 6
+
+
+class Event:
+    """只带插件取成员列表时用到的两个接口。"""
+
+    def __init__(self, bot, platform: str = "aiocqhttp"):
+        self.bot = bot
+        self._platform = platform
+
+    def get_platform_name(self) -> str:
+        return self._platform
+
+
+def make_bot(fake_onebot, actions: dict | None = None, seed: int = 1):
+    return fake_onebot.FakeOneBot({GROUP: {"members": MEMBERS}}, actions, seed=seed)
+
+
+def make_plugin(cache_seconds: int = 300):
+    return SimpleNamespace(config={"member_cache_seconds": cache_seconds}, _member_cache={})
+
+
+def outcomes(bot, action: str) -> list[str]:
+    return [outcome for _start, name, _params, outcome in bot.calls if name == action]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+# ---------- 成员列表缓存 ----------
+def test_member_names_cached_within_ttl(core, fake_onebot):
+    bot = make_bot(fake_onebot)
+    plugin = make_plugin()
+    event = Event(bot)
+
+    names = run(core.group_member_names(plugin, event, GROUP))
+    assert len(names) == MEMBERS
+    # 有群名片用群名片，否则用昵称
+    first = bot.groups[GROUP]["members"][0]
+    second = bot.groups[GROUP]["members"][1]
+    assert names[str(first["user_id"])] == first["card"]
+    assert names[str(second["user_id"])] == second["nickname"]
+
+    assert run(core.group_member_names(plugin, event, GROUP)) is names
+    assert outcomes(bot, "get_group_member_list") == ["ok"]
+
+
+def test_member_names_refetched_after_ttl(core, fake_onebot):
+    bot = make_bot(fake_onebot)
+    plugin = make_plugin(cache_seconds=0)
+    event = Event(bot)
+    run(core.group_member_names(plugin, event, GROUP))
+    run(core.group_member_names(plugin, event, GROUP))
+    assert outcomes(bot, "get_group_member_list") == ["ok", "ok"]
+
+
+def test_member_names_other_platform_skips_call(core, fake_onebot):
+    bot = make_bot(fake_onebot)
+    assert run(core.group_member_names(make_plugin(), Event(bot, "qq_official"), GROUP)) is None
+    assert bot.calls == []
+
+
+# ---------- 响应形状 ----------
+def test_wrapped_member_list_is_unwrapped(core, fake_onebot):
+    bot = make_bot(fake_onebot, {"get_group_member_list": {"wrap_rate": 1}})
+    members = run(core.fetch_group_members(Event(bot), GROUP))
+    assert len(members) == MEMBERS
+    assert outcomes(bot, "get_group_member_list") == ["wrapped"]
+
+
+def test_malformed_member_list_is_not_cached(core, fake_onebot):
+    bot = make_bot(fake_onebot, {"get_group_member_list": {"malformed_rate": 0.5}}, seed=3)
+    plugin = make_plugin()
+    event = Event(bot)
+    results = [run(core.group_member_names(plugin, event, GROUP)) for _ in range(20)]
+    seen = outcomes(bot, "get_group_member_list")
+    # 畸形响应返回 None 且不写缓存，拿到正常列表后后续调用都命中缓存
+    assert "malformed" in seen and seen[-1] == "ok"
+    assert seen.count("malformed") == len(seen) - 1
+    assert all(r is None for r in results[: len(seen) - 1])
+    assert all(r is not None and len(r) == MEMBERS for r in results[len(seen) - 1 :])
+
+
+def test_failed_member_list_returns_empty(core, fake_onebot):
+    bot = make_bot(fake_onebot, {"get_group_member_list": {"error_rate": 1}})
+    assert run(core.fetch_group_members(Event(bot), GROUP)) == []
+    assert run(core.group_member_names(make_plugin(), Event(bot), GROUP)) is None
+    assert outcomes(bot, "get_group_member_list") == ["error", "error"]
+
+
+def test_wrapped_send_result_has_message_id(onebot_api, fake_onebot):
+    bot = make_bot(fake_onebot, {"send_group_msg": {"wrap_rate": 1}})
+    resp = run(bot.call_action("send_group_msg", group_id=int(GROUP), message="hi"))
+    assert resp == {"data": {"message_id": 1}}
+    assert onebot_api.extract_message_id(resp) == 1
+
+
+# ---------- 挂起 / 超时重试 ----------
+def test_hang_is_cancelled_by_timeout(core, fake_onebot):
+    bot = make_bot(fake_onebot, {"get_group_member_list": {"hang_rate": 1}})
+
+    async def call():
+        return await asyncio.wait_for(
+            core.call_onebot_action(bot, "get_group_member_list", group_id=int(GROUP)), 0.05
+        )
+
+    with pytest.raises(asyncio.TimeoutError):
+        run(call())
+    assert outcomes(bot, "get_group_member_list") == ["hang"]
+
+
+def test_retry_after_hang_succeeds(core, fake_onebot):
+    bot = make_bot(fake_onebot, {"get_group_member_list": {"hang_rate": 0.5}}, seed=5)
+
+    async def call_with_retry(attempts: int = 10):
+        for _ in range(attempts):
+            try:
+                return await asyncio.wait_for(
+                    core.call_onebot_action(bot, "get_group_member_list", group_id=int(GROUP)),
+                    0.05,
+                )
+            except asyncio.TimeoutError:
+                continue
+        return None
+
+    members = run(call_with_retry())
+    seen = outcomes(bot, "get_group_member_list")
+    assert members is not None and len(members) == MEMBERS
+    assert seen[-1] == "ok" and set(seen[:-1]) <= {"hang"}
+
+
+# ---------- 夹具统计 ----------
+def test_summary_and_withdraw_delays(fake_onebot):
+    bot = make_bot(fake_onebot)
+
+    async def send_and_withdraw():
+        resp = await bot.call_action("send_group_msg", group_id=int(GROUP), message="hi")
+        await bot.call_action("delete_msg", message_id=resp["message_id"])
+
+    run(send_and_withdraw())
+    summary = bot.summary()
+    assert summary["calls"] == {"send_group_msg": {"ok": 1}, "delete_msg": {"ok": 1}}
+    assert summary["sent"] == 1 and summary["withdrawn"] == 1
+    assert bot.withdraw_delays()[0] >= 0
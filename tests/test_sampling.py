@@ -0,0 +1,174 @@
+import random
+
+import pytest
+
+# 自由度 1..9 时 p = 0.001 的卡方临界值；随机数固定播种，结果可复现
+CHI2_CRITICAL_001 = {1: 10.83, 2: 13.82, 3: 16.27, 4: 18.47, 5: 20.52, 6: 22.46, 7: 24.32, 8: 26.12, 9: 27.88}
+DRAWS = 20000
+
+
+def chi_square(observed: dict, weights: dict) -> float:
+    total_weight = sum(weights.values())
+    n = sum(observed.values())
+    stat = 0.0
+    for key, weight in weights.items():
+        expected = n * weight / total_weight
+        stat += (observed.get(key, 0) - expected) ** 2 / expected
+    return stat
+
+
+def draw_counts(pool, seed: int, draws: int = DRAWS) -> dict:
+    rng = random.Random(seed)
+    counts: dict = {}
+    for _ in range(draws):
+        uid = pool.sample(rng)
+        counts[uid] = counts.get(uid, 0) + 1
+    return counts
+
+
+def naive_find(values: list[float], target: float) -> int:
+    acc = 0.0
+    for i, v in enumerate(values):
+        acc += v
+        if acc > target:
+            return i
+    return len(values) - 1
+
+
+# ---------- FenwickTree ----------
+def test_fenwick_empty(sampling):
+    tree = sampling.FenwickTree()
+    assert len(tree) == 0
+    assert tree.total() == 0.0
+    assert tree.append(2.5) == 0
+    assert tree.total() == 2.5
+    assert tree.find(0.0) == 0
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 7, 8, 9, 16, 17])
+def test_fenwick_find_matches_prefix_sums(sampling, n):
+    rng = random.Random(n)
+    values = [float(rng.randint(0, 5)) for _ in range(n)]
+    values[rng.randrange(n)] = 1.0  # 至少一个正权重
+    tree = sampling.FenwickTree(values)
+    assert tree.total() == sum(values)
+    acc = 0.0
+    for i, v in enumerate(values):
+        # 恰好落在前缀和边界上时属于下一个位置，边界前一点属于当前位置
+        if v:
+            assert tree.find(acc) == i
+            assert tree.find(acc + v - 0.5) == i
+        acc += v
+    for _ in range(200):
+        target = rng.random() * tree.total()
+        assert tree.find(target) == naive_find(values, target)
+
+
+def test_fenwick_find_skips_zero_weights(sampling):
+    tree = sampling.FenwickTree([0.0, 1.0, 0.0, 0.0, 2.0, 0.0])
+    assert tree.find(0.0) == 1
+    assert tree.find(0.999) == 1
+    assert tree.find(1.0) == 4
+    assert tree.find(2.999) == 4
+
+
+def test_fenwick_find_clamps_at_total(sampling):
+    tree = sampling.FenwickTree([1.0, 1.0, 1.0])
+    # 浮点误差可能让 target 等于甚至略超总和，仍返回合法下标
+    assert tree.find(3.0) == 2
+    assert tree.find(3.5) == 2
+
+
+def test_fenwick_set_and_append(sampling):
+    rng = random.Random(7)
+    values = [1.0] * 5
+    tree = sampling.FenwickTree(values)
+    for step in range(300):
+        if step % 10 == 0:
+            values.append(float(rng.randint(0, 4)))
+            assert tree.append(values[-1]) == len(values) - 1
+        i = rng.randrange(len(values))
+        values[i] = float(rng.choice([0, 0.5, 1, 3, 10]))
+        tree.set(i, values[i])
+        assert tree.get(i) == values[i]
+        assert tree.total() == pytest.approx(sum(values))
+        if tree.total() > 0:
+            target = rng.random() * tree.total()
+            assert tree.find(target) == naive_find(values, target)
+
+
+def test_fenwick_set_same_value_is_noop(sampling):
+    tree = sampling.FenwickTree([1.0, 2.0])
+    tree.set(1, 2.0)
+    assert tree.total() == 3.0
+    tree.set(0, 0.0)
+    assert tree.total() == 2.0
+    assert tree.find(0.0) == 1
+
+
+# ---------- WeightedPool ----------
+def test_pool_frequencies_follow_weights(sampling):
+    weights = {"a": 1.0, "b": 2.0, "c": 3.0, "d": 4.0, "e": 10.0}
+    counts = draw_counts(sampling.WeightedPool(weights), seed=1)
+    assert set(counts) == set(weights)
+    assert chi_square(counts, weights) < CHI2_CRITICAL_001[len(weights) - 1]
+
+
+def test_pool_updates_change_frequencies(sampling):
+    pool = sampling.WeightedPool({"a": 1.0, "b": 1.0, "c": 1.0})
+    pool.set("a", 6.0)
+    pool.discard("b")
+    pool.set("d", 3.0)  # 复用 b 的位置
+    weights = {"a": 6.0, "c": 1.0, "d": 3.0}
+    counts = draw_counts(pool, seed=2)
+    assert "b" not in counts
+    assert len(pool) == 3
+    assert chi_square(counts, weights) < CHI2_CRITICAL_001[len(weights) - 1]
+
+
+def test_pool_empty_or_zero_weight(sampling):
+    assert sampling.WeightedPool().sample(random.Random(0)) is None
+    pool = sampling.WeightedPool({"a": 0.0})
+    assert pool.sample(random.Random(0)) is None
+    pool.discard("a")
+    pool.discard("a")
+    assert len(pool) == 0
+
+
+# ---------- DrawWeighting ----------
+@pytest.mark.parametrize(
+    "mode, users",
+    [
+        ("uniform", [(0.0, 1), (0.0, 50), (0.0, 3)]),
+        # 最后发言分别早 0 / 1 / 2 个半衰期：权重 4:2:1
+        ("recency", [(2 * 3600.0, 1), (3600.0, 1), (0.0, 1)]),
+        # 发言次数 1 / 4 / 16，exponent 0.5：权重 1:2:4
+        ("activity", [(0.0, 1), (0.0, 4), (0.0, 16)]),
+    ],
+)
+def test_draw_weighting_frequencies(sampling, mode, users):
+    weighting = sampling.DrawWeighting(mode, half_life_hours=1, exponent=0.5)
+    weights = {
+        f"u{i}": weighting.weight(last_active, count, origin=0.0)
+        for i, (last_active, count) in enumerate(users)
+    }
+    counts = draw_counts(sampling.WeightedPool(weights, weighting=weighting), seed=3)
+    assert chi_square(counts, weights) < CHI2_CRITICAL_001[len(weights) - 1]
+
+
+def test_draw_weighting_recency_is_relative(sampling):
+    weighting = sampling.DrawWeighting("recency", half_life_hours=2)
+    # 相对权重只取决于时间差，与基准时刻无关
+    assert weighting.weight(7200.0, 1, 0.0) / weighting.weight(0.0, 1, 0.0) == pytest.approx(2.0)
+    assert weighting.weight(10 ** 6 + 7200.0, 1, 10 ** 6) == pytest.approx(2.0)
+    assert not weighting.needs_rebase(0.0, 0.0)
+    assert weighting.needs_rebase((sampling.REBASE_EXPONENT + 1) * 7200.0, 0.0)
+    assert not sampling.DrawWeighting("uniform").needs_rebase(10.0 ** 12, 0.0)
+
+
+def test_draw_weighting_unknown_mode_falls_back(sampling):
+    weighting = sampling.DrawWeighting("bogus", half_life_hours=0, exponent=-1)
+    assert weighting.mode == "uniform"
+    assert weighting.half_life_seconds == 1.0
+    assert weighting.exponent == 0.0
+    assert weighting.weight(123.0, 99, 0.0) == 1.0
@@ -0,0 +1,128 @@
+"""抽取路径基准：当天记录里已有的条数对单次抽取开销的影响。
+
+用法::
+
+    python tools/bench_draw.py --sizes 10,1000,100000 --ops 2000
+
+对同一个群分别预置 N 条当天记录，统计抽取时用到的几种操作的单次耗时（微秒）：
+``has_user`` / ``count_for``（是否抽过、今日次数）、``for_user``（查看自己的老婆）、
+``add + remove_user``（写入一条记录再删掉，强娶时的路径，保证 N 不变）。
+“旧版”一栏是 list[dict] 上的线性扫描写法，随 N 线性增长；GroupRecords 应与 N 无关。
+旧版在大 N 下很慢，重复次数按 N 缩减。不依赖 AstrBot。
+"""
+
+import argparse
+import importlib
+import importlib.machinery
+import importlib.util
+import os
+import random
+import sys
+import time
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "wifepicker_bench"
+
+
+def load_record_store():
+    spec = importlib.machinery.ModuleSpec(PACKAGE, None, is_package=True)
+    spec.submodule_search_locations = [PLUGIN_DIR]
+    sys.modules[PACKAGE] = importlib.util.module_from_spec(spec)
+    return importlib.import_module(f"{PACKAGE}.src.record_store")
+
+
+def make_records(n: int, seed: int) -> list[dict]:
+    """N 个不同的抽取者各一条记录（旧格式 dict）。"""
+    rng = random.Random(seed)
+    uids = rng.sample(range(10**8, 4 * 10**9), n)
+    return [
+        {
+            "user_id": str(uid),
+            "wife_id": str(rng.choice(uids)),
+            "wife_name": "群友",
+            "timestamp": 1_790_000_000 + i,
+        }
+        for i, uid in enumerate(uids)
+    ]
+
+
+def per_op_us(fn, args: list) -> float:
+    start = time.perf_counter()
+    for a in args:
+        fn(a)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def legacy_remove(records: list[dict], user_id: str) -> None:
+    records[:] = [r for r in records if r["user_id"] != user_id]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="当天记录规模对抽取开销的影响")
+    parser.add_argument("--sizes", default="10,1000,100000", help="预置的当天记录条数，逗号分隔")
+    parser.add_argument("--ops", type=int, default=2000, help="每种操作的重复次数")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    store = load_record_store()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    rng = random.Random(args.seed)
+
+    print(f"{'记录数':>8}  {'操作':<20}{'旧版 list(us)':>14}{'GroupRecords(us)':>18}")
+    for n in sizes:
+        raw = make_records(n, args.seed)
+        legacy = [dict(r) for r in raw]
+        group = store.GroupRecords(raw)
+        present = [r["user_id"] for r in raw]
+        # 一半查今天已抽过的人，一半查没抽过的人（没抽过时旧版要扫完整个列表）
+        lookups = [
+            rng.choice(present) if i % 2 else str(rng.randrange(5 * 10**9, 6 * 10**9))
+            for i in range(args.ops)
+        ]
+        # 旧版重复次数按规模缩减，保证大 N 下几秒内跑完
+        legacy_lookups = lookups[: max(20, min(args.ops, args.ops * 1000 // max(1, n)))]
+        fresh = [
+            {"user_id": str(7 * 10**9 + i), "wife_id": present[0], "wife_name": "x", "timestamp": 0}
+            for i in range(args.ops)
+        ]
+        legacy_fresh = fresh[: len(legacy_lookups)]
+
+        def legacy_add_remove(r: dict) -> None:
+            legacy.append(r)
+            legacy_remove(legacy, r["user_id"])
+
+        def group_add_remove(r: dict) -> None:
+            group.add(r)
+            group.remove_user(r["user_id"])
+
+        cases = [
+            (
+                "has_user",
+                lambda uid: any(r["user_id"] == uid for r in legacy),
+                group.has_user,
+            ),
+            (
+                "count_for",
+                lambda uid: sum(1 for r in legacy if r["user_id"] == uid),
+                group.count_for,
+            ),
+            (
+                "for_user",
+                lambda uid: [r for r in legacy if r["user_id"] == uid],
+                group.for_user,
+            ),
+        ]
+        for name, legacy_fn, group_fn in cases:
+            print(
+                f"{n:>8}  {name:<20}"
+                f"{per_op_us(legacy_fn, legacy_lookups):>14.2f}{per_op_us(group_fn, lookups):>18.2f}"
+            )
+        print(
+            f"{n:>8}  {'add + remove_user':<20}"
+            f"{per_op_us(legacy_add_remove, legacy_fresh):>14.2f}{per_op_us(group_add_remove, fresh):>18.2f}"
+        )
+        assert len(group) == n and len(legacy) == n
+
+
+if __name__ == "__main__":
+    main()
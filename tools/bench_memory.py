@@ -0,0 +1,109 @@
+"""内存基准：对比旧版 dict 结构与紧凑结构（WifeRecord / ActivityTable）在大量活跃用户下的占用。
+
+用法::
+
+    python tools/bench_memory.py --users 100000 --groups 200
+
+两种结构都由同一份旧格式 JSON 解码得到（即磁盘上的分片内容），用 tracemalloc 统计常驻内存。
+“旧版”一栏是旧代码加载分片后在内存里持有的东西：活跃记录是 ``{QQ号: 浮点时间戳}``，
+当天记录是 dict 列表外加按抽取者 / 老婆建立的字符串索引。不依赖 AstrBot。
+"""
+
+import argparse
+import gc
+import importlib
+import importlib.machinery
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "wifepicker_bench"
+
+
+def load_record_store():
+    spec = importlib.machinery.ModuleSpec(PACKAGE, None, is_package=True)
+    spec.submodule_search_locations = [PLUGIN_DIR]
+    sys.modules[PACKAGE] = importlib.util.module_from_spec(spec)
+    return importlib.import_module(f"{PACKAGE}.src.record_store")
+
+
+def make_fixtures(users: int, groups: int, seed: int) -> tuple[list[bytes], list[bytes]]:
+    """生成每个群的活跃分片与当天记录分片（旧格式 JSON 字节）。"""
+    rng = random.Random(seed)
+    now = time.time()
+    per_group = max(1, users // groups)
+    activity, records = [], []
+    for g in range(groups):
+        uids = [str(rng.randrange(10**8, 4 * 10**9)) for _ in range(per_group)]
+        activity.append(json.dumps({uid: now - rng.random() * 30 * 86400 for uid in uids}).encode())
+        day = []
+        for uid in uids:
+            wife = rng.choice(uids)
+            day.append({
+                "user_id": uid,
+                "wife_id": wife,
+                "wife_name": f"群友{wife[-4:]}",
+                "timestamp": datetime.fromtimestamp(now - rng.random() * 86400).isoformat(),
+            })
+        records.append(json.dumps({"date": "2026-10-19", "records": day}).encode())
+    return activity, records
+
+
+def legacy_group(records: list[dict]) -> tuple:
+    by_user: dict[str, list[int]] = {}
+    by_wife: dict[str, set[int]] = {}
+    indexed = dict(enumerate(records))
+    for rid, r in indexed.items():
+        by_user.setdefault(str(r.get("user_id")), []).append(rid)
+        by_wife.setdefault(str(r.get("wife_id")), set()).add(rid)
+    return indexed, by_user, by_wife
+
+
+def measure(build) -> tuple[int, float]:
+    # 先单独计时（tracemalloc 会显著拖慢分配），再统计常驻内存
+    gc.collect()
+    start = time.perf_counter()
+    kept = build()
+    elapsed = time.perf_counter() - start
+    del kept
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="活跃记录 / 当天记录的内存基准")
+    parser.add_argument("--users", type=int, default=100000, help="活跃用户总数（每人当天一条记录）")
+    parser.add_argument("--groups", type=int, default=200, help="群数")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    store = load_record_store()
+    activity, records = make_fixtures(args.users, args.groups, args.seed)
+
+    cases = [
+        ("活跃记录 / 旧版 dict", lambda: [json.loads(raw) for raw in activity]),
+        ("活跃记录 / ActivityTable", lambda: [store.ActivityTable.from_dict(json.loads(raw)) for raw in activity]),
+        ("当天记录 / 旧版 dict + 索引", lambda: [legacy_group(json.loads(raw)["records"]) for raw in records]),
+        ("当天记录 / GroupRecords", lambda: [store.GroupRecords(json.loads(raw)["records"]) for raw in records]),
+    ]
+    print(f"{args.users} 个活跃用户，{args.groups} 个群，每人当天一条记录")
+    print(f"{'结构':<28}{'内存(MB)':>10}{'每人(B)':>10}{'解码(ms)':>10}")
+    for name, build in cases:
+        size, elapsed = measure(build)
+        print(f"{name:<28}{size / 2**20:>10.1f}{size / args.users:>10.0f}{elapsed * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
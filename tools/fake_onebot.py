@@ -0,0 +1,327 @@
+"""本地假 OneBot v11（NapCat 替身）：群 / 成员夹具 + 可注入的延迟、错误、畸形响应。
+
+两种用法：
+
+1. 进程内：把 ``FakeOneBot`` 当作 ``event.bot`` 交给插件（tools/replay.py 就是这样用的），
+   插件经 ``event.bot.api.call_action`` 的所有调用都会落到这里，并记录在 ``calls`` 里，
+   可以直接统计成员缓存命中、撤回延迟等::
+
+       bot = FakeOneBot.from_file("fixtures.json", seed=1)
+       ...
+       print(bot.summary())
+
+2. 独立进程：作为反向 WebSocket 客户端连上 AstrBot 的 aiocqhttp 适配器，
+   从标准输入读 ``群号 QQ号 消息`` 推送群消息事件，API 调用按夹具应答::
+
+       python tools/fake_onebot.py --fixtures fixtures.json --connect ws://127.0.0.1:6199/ws
+
+夹具格式（``actions`` 里 ``*`` 是默认值，按 action 名覆盖）::
+
+    {
+      "self_id": "10000",
+      "groups": {
+        "123456": {"name": "测试群", "members": 50},
+        "654321": {"members": [{"user_id": 1001, "nickname": "甲", "card": "", "role": "owner"}]}
+      },
+      "actions": {
+        "*": {"latency_ms": 20, "jitter_ms": 10},
+        "get_group_member_list": {"latency_ms": 300, "error_rate": 0.1, "wrap_rate": 0.5},
+        "send_group_msg": {"hang_rate": 0.01}
+      }
+    }
+
+``members`` 为整数时自动生成这么多个成员。故障按 ``seed`` 随机，结果可复现。
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+
+# 挂起的调用睡这么久，足够触发调用方的任何超时
+HANG_SECONDS = 3600
+
+
+class FakeActionFailed(Exception):
+    """模拟协议端返回 status=failed（aiocqhttp 里对应 ActionFailed）。"""
+
+    def __init__(self, action: str, retcode: int = 100):
+        super().__init__(f"{action} failed, retcode={retcode}")
+        self.retcode = retcode
+
+
+class ActionProfile:
+    """单个 action 的延迟与故障注入参数，概率取值 0~1。
+
+    - ``error_rate``：抛出 FakeActionFailed；
+    - ``hang_rate``：一直不返回，用于测超时；
+    - ``wrap_rate``：把结果包成 ``{"data": ...}``（部分协议端 / 适配器版本的形状）；
+    - ``malformed_rate``：返回 None / 字符串等插件必须容忍的垃圾数据。
+    """
+
+    __slots__ = ("latency_ms", "jitter_ms", "error_rate", "hang_rate", "wrap_rate", "malformed_rate")
+
+    def __init__(
+        self,
+        latency_ms=0.0,
+        jitter_ms=0.0,
+        error_rate=0.0,
+        hang_rate=0.0,
+        wrap_rate=0.0,
+        malformed_rate=0.0,
+    ):
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.error_rate = float(error_rate)
+        self.hang_rate = float(hang_rate)
+        self.wrap_rate = float(wrap_rate)
+        self.malformed_rate = float(malformed_rate)
+
+    def merged(self, overrides: dict) -> "ActionProfile":
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update({k: v for k, v in overrides.items() if k in self.__slots__})
+        return ActionProfile(**values)
+
+
+def _generate_members(group_id: str, count: int) -> list[dict]:
+    base = int(group_id) % 100000 * 1000 + 100000000
+    members = []
+    for i in range(count):
+        uid = base + i
+        members.append({
+            "user_id": uid,
+            "nickname": f"成员{uid}",
+            "card": f"群名片{i}" if i % 3 == 0 else "",
+            "role": "owner" if i == 0 else "member",
+        })
+    return members
+
+
+class FakeOneBot:
+    """进程内的假协议端，同时充当 ``event.bot`` 与 ``event.bot.api``。"""
+
+    def __init__(
+        self,
+        groups: dict[str, dict] | None = None,
+        actions: dict[str, dict] | None = None,
+        *,
+        self_id: str = "10000",
+        seed: int | None = None,
+    ):
+        self.api = self
+        self.self_id = str(self_id)
+        self.groups: dict[str, dict] = {}
+        for gid, group in (groups or {}).items():
+            self.add_group(gid, group.get("members", []), name=group.get("name"))
+        actions = dict(actions or {})
+        self._default = ActionProfile().merged(actions.pop("*", {}))
+        self._profiles = {name: self._default.merged(cfg) for name, cfg in actions.items()}
+        self._rng = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        # (发起时刻, action, 参数, 结果)，结果为 ok / wrapped / malformed / error / hang
+        self.calls: list[tuple[float, str, dict, str]] = []
+        # {message_id: 发送时刻}，用于计算撤回延迟
+        self.sent: dict[int, float] = {}
+        self.deleted: dict[int, float] = {}
+
+    @classmethod
+    def from_file(cls, path: str, *, seed: int | None = None) -> "FakeOneBot":
+        with open(path, encoding="utf-8") as f:
+            fixtures = json.load(f)
+        return cls(
+            fixtures.get("groups"),
+            fixtures.get("actions"),
+            self_id=fixtures.get("self_id", "10000"),
+            seed=seed,
+        )
+
+    def add_group(self, group_id, members, *, name: str | None = None) -> None:
+        gid = str(group_id)
+        if isinstance(members, int):
+            members = _generate_members(gid, members)
+        self.groups[gid] = {"name": name or f"群{gid}", "members": list(members)}
+
+    def profile(self, action: str) -> ActionProfile:
+        return self._profiles.get(action, self._default)
+
+    # ---------- OneBot API ----------
+    async def call_action(self, action: str, **params):
+        profile = self.profile(action)
+        start = time.monotonic()
+        roll = self._rng.random()
+        delay = profile.latency_ms + profile.jitter_ms * self._rng.random()
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+        if roll < profile.hang_rate:
+            self.calls.append((start, action, params, "hang"))
+            await asyncio.sleep(HANG_SECONDS)
+        roll -= profile.hang_rate
+        if roll < profile.error_rate:
+            self.calls.append((start, action, params, "error"))
+            raise FakeActionFailed(action)
+        roll -= profile.error_rate
+        if roll < profile.malformed_rate:
+            self.calls.append((start, action, params, "malformed"))
+            return self._rng.choice([None, "", "ok", {"retcode": 0}])
+
+        result = self._handle(action, params)
+        if self._rng.random() < profile.wrap_rate:
+            self.calls.append((start, action, params, "wrapped"))
+            return {"data": result}
+        self.calls.append((start, action, params, "ok"))
+        return result
+
+    def _handle(self, action: str, params: dict):
+        gid = str(params.get("group_id", ""))
+        group = self.groups.get(gid)
+        if action == "get_group_member_list":
+            # 每次返回新列表，避免调用方改动夹具
+            return [dict(m) for m in group["members"]] if group else []
+        if action == "get_group_member_info":
+            uid = int(params.get("user_id", 0))
+            for member in group["members"] if group else ():
+                if int(member["user_id"]) == uid:
+                    return dict(member)
+            return {}
+        if action == "get_group_info":
+            if not group:
+                return {}
+            return {
+                "group_id": int(gid),
+                "group_name": group["name"],
+                "member_count": len(group["members"]),
+            }
+        if action == "get_login_info":
+            return {"user_id": int(self.self_id), "nickname": "假机器人"}
+        if action in ("send_group_msg", "send_private_msg", "send_msg"):
+            message_id = next(self._message_ids)
+            self.sent[message_id] = time.monotonic()
+            return {"message_id": message_id}
+        if action == "delete_msg":
+            message_id = int(params.get("message_id", 0))
+            self.deleted[message_id] = time.monotonic()
+            return None
+        return {}
+
+    # ---------- 统计 ----------
+    def withdraw_delays(self) -> list[float]:
+        """已撤回消息从发送到撤回的秒数。"""
+        return [self.deleted[mid] - sent for mid, sent in self.sent.items() if mid in self.deleted]
+
+    def summary(self) -> dict:
+        by_action: dict[str, dict[str, int]] = {}
+        for _start, action, _params, outcome in self.calls:
+            counts = by_action.setdefault(action, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+        delays = sorted(self.withdraw_delays())
+        return {
+            "calls": by_action,
+            "sent": len(self.sent),
+            "withdrawn": len(delays),
+            "withdraw_delay_max": round(delays[-1], 3) if delays else None,
+        }
+
+
+# ---------- 反向 WebSocket 模式 ----------
+def _ok(data, echo) -> dict:
+    return {"status": "ok", "retcode": 0, "data": data, "echo": echo}
+
+
+async def _serve_ws(bot: FakeOneBot, url: str, token: str | None) -> None:
+    import aiohttp
+
+    headers = {"X-Self-ID": bot.self_id, "X-Client-Role": "Universal"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(url, headers=headers, heartbeat=30) as ws:
+            print(f"已连接 {url}，输入“群号 QQ号 消息”发送群消息，Ctrl-D 退出", file=sys.stderr)
+
+            async def answer(payload: dict) -> None:
+                echo = payload.get("echo")
+                try:
+                    data = await bot.call_action(payload.get("action", ""), **(payload.get("params") or {}))
+                except FakeActionFailed as e:
+                    reply = {"status": "failed", "retcode": e.retcode, "data": None, "echo": echo}
+                else:
+                    reply = _ok(data, echo)
+                await ws.send_json(reply)
+
+            async def reader() -> None:
+                pending = set()
+                async for msg in ws:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        continue
+                    payload = json.loads(msg.data)
+                    if "action" in payload:
+                        # 并发应答，注入的延迟 / 挂起不会阻塞其他调用
+                        task = asyncio.create_task(answer(payload))
+                        pending.add(task)
+                        task.add_done_callback(pending.discard)
+
+            async def writer() -> None:
+                message_ids = itertools.count(1)
+                loop = asyncio.get_running_loop()
+                while True:
+                    line = await loop.run_in_executor(None, sys.stdin.readline)
+                    if not line:
+                        return
+                    parts = line.strip().split(maxsplit=2)
+                    if len(parts) < 3:
+                        continue
+                    group_id, user_id, text = parts
+                    await ws.send_json(_group_message_event(bot, group_id, user_id, text, next(message_ids)))
+
+            read_task = asyncio.create_task(reader())
+            await writer()
+            await ws.close()
+            await read_task
+
+
+def _group_message_event(bot: FakeOneBot, group_id: str, user_id: str, text: str, message_id: int) -> dict:
+    nickname = f"成员{user_id}"
+    for member in bot.groups.get(str(group_id), {}).get("members", ()):
+        if str(member["user_id"]) == str(user_id):
+            nickname = member.get("nickname") or nickname
+            break
+    return {
+        "time": int(time.time()),
+        "self_id": int(bot.self_id),
+        "post_type": "message",
+        "message_type": "group",
+        "sub_type": "normal",
+        "message_id": message_id,
+        "group_id": int(group_id),
+        "user_id": int(user_id),
+        "message": [{"type": "text", "data": {"text": text}}],
+        "raw_message": text,
+        "font": 0,
+        "sender": {"user_id": int(user_id), "nickname": nickname, "card": "", "role": "member"},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地假 OneBot v11（反向 WebSocket）")
+    parser.add_argument("--fixtures", help="夹具 JSON 文件")
+    parser.add_argument("--connect", default="ws://127.0.0.1:6199/ws", help="AstrBot 反向 WebSocket 地址")
+    parser.add_argument("--token", help="AstrBot 配置的 access token")
+    parser.add_argument("--seed", type=int, help="故障注入的随机种子")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        bot = FakeOneBot.from_file(args.fixtures, seed=args.seed)
+    else:
+        bot = FakeOneBot({"123456": {"members": 20}}, seed=args.seed)
+    try:
+        asyncio.run(_serve_ws(bot, args.connect, args.token))
+    finally:
+        print(json.dumps(bot.summary(), ensure_ascii=False, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""事件回放：把 event_record_enabled 录下的真实流量喂给插件，统计各处理函数耗时与状态写入量。
+
+用法（需在装有 AstrBot 的环境中运行）::
+
+    python tools/replay.py data/plugin_data/random_wife/recordings/events-20261019.jsonl.gz \
+        --speed 60 --render-ms 300 --config '{"daily_limit": 3}'
+
+- ``--speed 0``（默认）：按顺序尽快逐条处理，结果可复现，适合比较两个版本；
+- ``--speed N``：按录制时的时间间隔的 1/N 回放，同一时刻的事件并发处理，能复现零点抽老婆高峰；
+- 协议端用 tools/fake_onebot.py，群成员列表由录制中出现过的人组成，``--onebot-faults`` 可注入延迟 / 错误 / 畸形响应；
+- 渲染服务是桩：固定耗时 ``--render-ms`` 并输出一张空白小图。
+
+数据目录使用临时目录，不会碰到正式数据。
+"""
+
+import argparse
+import asyncio
+import importlib
+import importlib.machinery
+import importlib.util
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+from fake_onebot import FakeOneBot
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "wifepicker_replay"
+# 1x1 白色 PNG
+_BLANK_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010802000000907753"
+    "de0000000c4944415408d763f8ffff3f0005fe02fea7d6a4f40000000049454e44ae426082"
+)
+
+
+def load_plugin_package():
+    """把插件目录当作包导入（插件内部使用相对导入）。"""
+    spec = importlib.machinery.ModuleSpec(PACKAGE, None, is_package=True)
+    spec.submodule_search_locations = [PLUGIN_DIR]
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.main")
+
+
+class ReplayContext:
+    _config = {}
+
+    def get_config(self, *args, **kwargs):
+        return {}
+
+
+class ReplayEvent:
+    """只实现插件用到的 AstrMessageEvent 接口。"""
+
+    _message_ids = itertools.count(1)
+
+    def __init__(self, bot, text, group_id, user_id, at, admin, wake, comp):
+        self.bot = bot
+        self.message_str = text
+        self.is_at_or_wake_command = wake
+        self._group_id, self._user_id, self._admin = group_id, user_id, admin
+        chain = [comp.At(qq=at)] if at else []
+        self.message_obj = types.SimpleNamespace(
+            message=chain, message_id=str(next(self._message_ids))
+        )
+
+    def get_group_id(self):
+        return self._group_id
+
+    def get_sender_id(self):
+        return self._user_id
+
+    def get_self_id(self):
+        return "10000"
+
+    def get_sender_name(self):
+        return f"用户{self._user_id}"
+
+    def get_platform_name(self):
+        return "aiocqhttp"
+
+    def is_private_chat(self):
+        return not self._group_id
+
+    def is_admin(self):
+        return self._admin
+
+    def plain_result(self, text):
+        return ("plain", text)
+
+    def chain_result(self, chain):
+        return ("chain", chain)
+
+    def image_result(self, path):
+        return ("image", path)
+
+    def stop_event(self):
+        pass
+
+    async def send(self, message):
+        pass
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def replay(args) -> None:
+    main = load_plugin_package()
+    recorder = importlib.import_module(f"{PACKAGE}.src.recorder")
+    constants = importlib.import_module(f"{PACKAGE}.src.constants")
+    maintenance = importlib.import_module(f"{PACKAGE}.src.maintenance")
+    metrics = importlib.import_module(f"{PACKAGE}.src.metrics").metrics
+    import astrbot.api.message_components as Comp
+
+    rows = [row for path in args.recordings for row in recorder.iter_recording(path)]
+    rows.sort(key=lambda row: row[0])
+    if not rows:
+        print("录制为空")
+        return
+
+    members: dict[str, set[str]] = {}
+    for _ts, gid, uid, _action, at, _flags in rows:
+        if gid:
+            members.setdefault(str(gid), set()).add(str(uid))
+            if at:
+                members[str(gid)].add(str(at))
+    keywords: dict[str, str] = {}
+    for route in constants._DEFAULT_KEYWORD_ROUTES:
+        keywords.setdefault(route.action, route.keyword)
+
+    config = {"keyword_trigger_enabled": True, "daily_limit": 1}
+    config.update(json.loads(args.config or "{}"))
+    # 录制 / 本地接口 / 自动撤回在回放时都关闭
+    config.update(event_record_enabled=False, http_api_port=0, auto_withdraw_enabled=False)
+    plugin = main.RandomWifePlugin(ReplayContext(), config)
+    await plugin.initialize()
+
+    async def fake_render(tmpl, data, return_url=True, options=None):
+        await asyncio.sleep(args.render_ms / 1000)
+        # 渲染耗时由 --render-ms 模拟，输出一张小图即可，避免桩本身的编码开销干扰统计
+        fd, path = tempfile.mkstemp(suffix=".png")
+        os.close(fd)
+        with open(path, "wb") as f:
+            f.write(_BLANK_PNG)
+        return path
+
+    async def fake_text_to_image(text, return_url=True):
+        return "replay://text"
+
+    plugin.html_render = fake_render
+    plugin.text_to_image = fake_text_to_image
+    actions = {"*": {"latency_ms": args.onebot_ms}}
+    if args.onebot_faults:
+        actions.update(json.loads(args.onebot_faults))
+    bot = FakeOneBot(
+        {gid: {"members": [{"user_id": int(uid), "nickname": f"用户{uid}", "card": ""} for uid in uids]}
+         for gid, uids in members.items()},
+        actions,
+        seed=0,
+    )
+
+    latencies: dict[str, list[float]] = {}
+
+    async def timed(name, coro_or_gen):
+        start = time.perf_counter()
+        if hasattr(coro_or_gen, "__aiter__"):
+            async for _ in coro_or_gen:
+                pass
+        else:
+            await coro_or_gen
+        latencies.setdefault(name, []).append(time.perf_counter() - start)
+
+    async def handle(row) -> None:
+        _ts, gid, uid, action, at, flags = row
+        wake = bool(flags & recorder.FLAG_WAKE)
+        text = keywords.get(action, "聊天消息") if action else "聊天消息"
+        event = ReplayEvent(
+            bot, text, str(gid) if gid else "", str(uid), str(at) if at else "",
+            bool(flags & recorder.FLAG_ADMIN), wake, Comp,
+        )
+        await timed("track_active", plugin.track_active(event))
+        if not action:
+            return
+        if wake:
+            # @filter.command 直接进入 _run_action
+            await timed(action, plugin._run_action(action, event))
+        else:
+            await timed(action, plugin.keyword_trigger(event))
+
+    before = {key: value for key, value in metrics.counters("save_json_bytes_total").items()}
+    t0, wall_start = rows[0][0], time.perf_counter()
+    if args.speed <= 0:
+        for row in rows:
+            await handle(row)
+    else:
+        tasks = []
+        for row in rows:
+            delay = (row[0] - t0) / args.speed - (time.perf_counter() - wall_start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(handle(row)))
+        await asyncio.gather(*tasks)
+    maintenance.flush_state(plugin)
+    wall = time.perf_counter() - wall_start
+    await plugin.terminate()
+
+    span = rows[-1][0] - t0
+    print(f"回放 {len(rows)} 条事件（录制跨度 {span:.0f}s，{len(members)} 个群），用时 {wall:.2f}s")
+    print(f"{'处理函数':<16}{'次数':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for name, values in sorted(latencies.items(), key=lambda kv: -sum(kv[1])):
+        values.sort()
+        print(
+            f"{name:<16}{len(values):>8}"
+            f"{percentile(values, 0.5) * 1000:>10.2f}{percentile(values, 0.95) * 1000:>10.2f}"
+            f"{percentile(values, 0.99) * 1000:>10.2f}{values[-1] * 1000:>10.2f}"
+        )
+    print("状态写入量：")
+    total = 0
+    for key, value in sorted(metrics.counters("save_json_bytes_total").items()):
+        written = value - before.get(key, 0)
+        total += written
+        print(f"  {dict(key).get('file', '-')}: {written / 1024:.1f} KB")
+    print(f"  合计: {total / 1024:.1f} KB")
+    print("协议端调用：")
+    for action, outcomes in sorted(bot.summary()["calls"].items()):
+        print(f"  {action}: " + ", ".join(f"{k}={v}" for k, v in sorted(outcomes.items())))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="回放 event_record_enabled 录制的事件")
+    parser.add_argument("recordings", nargs="+", help="录制文件（events-*.jsonl.gz）")
+    parser.add_argument("--speed", type=float, default=0, help="回放倍速，0 为尽快逐条处理")
+    parser.add_argument("--render-ms", type=float, default=300, help="渲染桩的固定耗时（毫秒）")
+    parser.add_argument("--onebot-ms", type=float, default=20, help="协议端桩的固定耗时（毫秒）")
+    parser.add_argument(
+        "--onebot-faults",
+        help='协议端故障注入，格式同 fake_onebot 夹具的 actions，如 \'{"get_group_member_list": {"error_rate": 0.2}}\'',
+    )
+    parser.add_argument("--config", help="覆盖插件配置的 JSON")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="wifepicker-replay-")
+    os.environ["ASTRBOT_ROOT"] = root
+    try:
+        asyncio.run(replay(args))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,25 @@
 from __future__ import annotations
 
-from typing import Any, MutableSequence
+from typing import Any, Protocol
+
+
+class RecordSink(Protocol):
+    """Minimal record-store interface needed here (see ``src/record_store.py``)."""
+
+    def has_user(self, user_id: str) -> bool: ...
+
+    def append(self, record: dict[str, Any]) -> None: ...
 
 
 def maybe_add_other_half_record(
     *,
-    records: MutableSequence[dict[str, Any]],
+    records: RecordSink,
     user_id: str,
     user_name: str,
     wife_id: str,
     wife_name: str,
     enabled: bool,
-    timestamp: str,
+    timestamp: int,
 ) -> bool:
     """Auto set selected waifu's waifu to the original user.
 
@@ -23,8 +31,8 @@ def maybe_add_other_half_record(
     if not enabled:
         return False
 
-    # 对方已经有老婆（或已抽过）则不覆盖。
-    if any(str(r.get("user_id")) == str(wife_id) for r in records):
+    # 对方已经有老婆（或已抽过）则不覆盖。按抽取者索引查询，O(1)。
+    if records.has_user(str(wife_id)):
         return False
 
     records.append(
@@ -38,4 +46,3 @@ def maybe_add_other_half_record(
         }
     )
     return True
-